@@ -0,0 +1,274 @@
+import datetime
+import sys
+
+import versions
+
+# Doanh số theo ngày, tổng hợp sẵn trong bảng SalesDaily:
+#   (sale_date, dimension, dim_id) -> units, revenue, orders
+# dimension: 'all' (dim_id 0), 'book', 'category', 'seller' (id không rõ -> 0).
+# orders đếm số đơn khác nhau trong từng nhóm, nên một đơn có hai sách cùng thể loại
+# chỉ tính một đơn cho thể loại đó.
+# - Đặt hàng không ghi SalesDaily (dòng 'all' của hôm nay sẽ tuần tự hóa mọi lần
+#   thanh toán). refresh() tính lại từ Orders/OrderDetails các ngày còn có thể nhận
+#   đơn mới: từ ngày trước lần tính lại gần nhất (CatalogVersions('sales_rollup')) tới
+#   hôm nay, một INSERT ... SELECT mỗi chiều. Báo cáo gọi refresh() trước khi đọc (tối đa một lần mỗi
+#   ANALYTICS_REFRESH_INTERVAL giây), hoặc chạy python analytics.py refresh định kỳ.
+# - Hủy/trả hàng (thao tác admin) trừ/cộng lại đơn vào đúng ngày của nó, trừ các ngày
+#   lần refresh() sau sẽ tính lại (không để dòng dở dang làm sai mốc tính lại).
+# - refresh() và đổi trạng thái đơn cùng khóa dòng CatalogVersions('sales') trước
+#   khi đọc/ghi nên không chồng lên nhau.
+# Báo cáo chỉ đọc SalesDaily (vài nghìn dòng cho cả năm) rồi gom theo ngày/tuần/tháng
+# trong bộ nhớ, không quét Orders/OrderDetails. Lệnh rebuild tính lại toàn bộ khi cần.
+
+DIMENSIONS = ('all', 'book', 'category', 'seller')
+GRANULARITIES = ('day', 'week', 'month')
+# Đơn ở các trạng thái này không tính vào doanh số
+EXCLUDED_STATUSES = ('cancelled', 'returned')
+
+_KEY_COLUMNS = ('sale_date', 'dimension', 'dim_id')
+_VALUE_COLUMNS = ('units', 'revenue', 'orders')
+
+_np = None
+
+
+def _load_numpy():
+    # numpy là tùy chọn và chỉ import ở lần báo cáo đầu tiên
+    global _np
+    if _np is None:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = False
+    return _np
+
+
+def counts_as_sale(status):
+    return status not in EXCLUDED_STATUSES
+
+
+def _dimension_keys(book_id, category_id, seller_id):
+    return (('all', 0), ('book', book_id), ('category', category_id or 0), ('seller', seller_id or 0))
+
+
+def lock(cursor):
+    """Khóa SalesDaily tới hết transaction; gọi trước khi đọc Orders để không deadlock với refresh()"""
+    versions.bump(cursor, 'sales')
+
+
+def refresh_start(cursor):
+    """Ngày đầu tiên refresh() sẽ tính lại (None: chưa tính lần nào, refresh() tính toàn bộ)"""
+    ordinal = versions.current(cursor, 'sales_rollup')
+    if not ordinal:
+        return None
+    # Giữ cả ngày trước: đơn tạo sát nửa đêm có thể commit sau lần tính trước
+    return min(datetime.date.fromordinal(ordinal), datetime.date.today()) - datetime.timedelta(days=1)
+
+
+def record_order(cursor, storage, order_id, sign=1, before=None):
+    """Cộng (sign=1) hoặc trừ (sign=-1) một đơn vào SalesDaily, chỉ các ngày trước before
+    nếu có; caller đã gọi lock() và commit"""
+    cursor.execute(f"""
+        SELECT {storage.date_sql('o.created_at')}, d.book_id, b.category_id, b.seller_id,
+               d.quantity, d.quantity * d.price
+        FROM Orders o
+        JOIN OrderDetails d ON d.order_id = o.order_id
+        LEFT JOIN Books b ON b.book_id = d.book_id
+        WHERE o.order_id = ?
+    """, (order_id,))
+
+    totals = {}
+    for sale_date, book_id, category_id, seller_id, quantity, amount in cursor.fetchall():
+        if before is not None and _as_date(sale_date) >= before:
+            continue
+        for dimension, dim_id in _dimension_keys(book_id, category_id, seller_id):
+            units, revenue = totals.get((sale_date, dimension, dim_id), (0, 0))
+            totals[(sale_date, dimension, dim_id)] = (units + quantity, revenue + amount)
+    if not totals:
+        return 0
+
+    cursor.executemany(storage.increment_sql('SalesDaily', _KEY_COLUMNS, _VALUE_COLUMNS), [
+        (sale_date, dimension, dim_id, sign * units, sign * revenue, sign)
+        for (sale_date, dimension, dim_id), (units, revenue) in totals.items()
+    ])
+    return len(totals)
+
+
+def affects_sales(old_status, new_status):
+    return counts_as_sale(old_status) != counts_as_sale(new_status)
+
+
+def apply_status_change(cursor, storage, order_id, old_status, new_status):
+    """Cập nhật SalesDaily khi đơn chuyển giữa trạng thái tính/không tính doanh số"""
+    if not affects_sales(old_status, new_status):
+        return 0
+    start = refresh_start(cursor)
+    if start is None:
+        return 0
+    return record_order(cursor, storage, order_id, 1 if counts_as_sale(new_status) else -1, before=start)
+
+
+def refresh(cursor, storage):
+    """Tính lại các ngày có thể còn đơn chưa tổng hợp; trả về số dòng đã ghi, caller commit"""
+    lock(cursor)
+    return rebuild(cursor, storage, since=refresh_start(cursor))
+
+
+def rebuild(cursor, storage, since=None):
+    """Tính lại SalesDaily từ Orders/OrderDetails (một INSERT ... SELECT mỗi chiều), toàn bộ
+    hoặc chỉ các ngày từ since, rồi ghi mốc tính lại là hôm nay; trả về số dòng đã ghi.
+    Caller đã gọi lock() và commit"""
+    sale_date = storage.date_sql('o.created_at')
+    excluded = ', '.join('?' * len(EXCLUDED_STATUSES))
+    params = list(EXCLUDED_STATUSES)
+    since_sql = ""
+    if since is None:
+        cursor.execute("DELETE FROM SalesDaily")
+    else:
+        cursor.execute("DELETE FROM SalesDaily WHERE sale_date >= ?", (since,))
+        since_sql = " AND o.created_at >= ?"
+        params.append(datetime.datetime.combine(since, datetime.time()))
+    written = 0
+    for dimension, key_sql in (('all', None), ('book', 'd.book_id'),
+                               ('category', 'COALESCE(b.category_id, 0)'),
+                               ('seller', 'COALESCE(b.seller_id, 0)')):
+        # Không GROUP BY theo hằng số (SQLite hiểu là số thứ tự cột)
+        group_by = f"{sale_date}, {key_sql}" if key_sql else sale_date
+        cursor.execute(f"""
+            INSERT INTO SalesDaily (sale_date, dimension, dim_id, units, revenue, orders)
+            SELECT {sale_date}, '{dimension}', {key_sql or 0},
+                   SUM(d.quantity), SUM(d.quantity * d.price), COUNT(DISTINCT o.order_id)
+            FROM Orders o
+            JOIN OrderDetails d ON d.order_id = o.order_id
+            LEFT JOIN Books b ON b.book_id = d.book_id
+            WHERE o.status NOT IN ({excluded}){since_sql}
+            GROUP BY {group_by}
+        """, params)
+        written += cursor.rowcount
+    versions.store(cursor, 'sales_rollup', datetime.date.today().toordinal())
+    return written
+
+
+# ==================== BÁO CÁO ====================
+
+def load_window(cursor, dimension, date_from, date_to, dim_id=None):
+    """Các dòng (sale_date, dim_id, units, revenue, orders) của một chiều trong [date_from, date_to]"""
+    sql = """
+        SELECT sale_date, dim_id, units, revenue, orders
+        FROM SalesDaily
+        WHERE dimension = ? AND sale_date >= ? AND sale_date <= ?
+    """
+    params = [dimension, date_from, date_to]
+    if dim_id is not None:
+        sql += " AND dim_id = ?"
+        params.append(dim_id)
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def periods(date_from, date_to, granularity):
+    """Đầu mỗi kỳ trong khoảng, kể cả kỳ không có doanh số"""
+    result = []
+    current = period_start(date_from, granularity)
+    while current <= date_to:
+        result.append(current)
+        if granularity == 'month':
+            current = (current + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            current += datetime.timedelta(days=7 if granularity == 'week' else 1)
+    return result
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value[:10])
+    return value
+
+
+def aggregate(rows, date_from, date_to, granularity='day', top=None):
+    """Gom các dòng SalesDaily theo kỳ và theo dim_id.
+
+    Trả về (series [(kỳ, units, revenue, orders)], keys [(dim_id, units, revenue, orders)]
+    sắp theo doanh thu giảm dần, tối đa top khóa). Có numpy thì cộng dồn bằng np.add.at
+    trên cả mảng, không thì vòng lặp Python.
+    """
+    starts = periods(date_from, date_to, granularity)
+    period_index = {start: i for i, start in enumerate(starts)}
+    day_index = {}  # sale_date -> chỉ số kỳ, mỗi ngày chỉ tính một lần
+    key_index = {}
+    row_periods = []
+    row_keys = []
+    values = []
+    for sale_date, dim_id, units, revenue, orders in rows:
+        p = day_index.get(sale_date)
+        if p is None:
+            p = day_index[sale_date] = period_index[period_start(_as_date(sale_date), granularity)]
+        row_periods.append(p)
+        row_keys.append(key_index.setdefault(dim_id, len(key_index)))
+        values.append((units or 0, revenue or 0, orders or 0))
+    keys = list(key_index)
+
+    np = _load_numpy()
+    if np and values:
+        matrix = np.asarray(values, dtype=float)
+        series_totals = np.zeros((len(starts), 3))
+        np.add.at(series_totals, np.asarray(row_periods), matrix)
+        key_totals = np.zeros((len(keys), 3))
+        np.add.at(key_totals, np.asarray(row_keys), matrix)
+        series_totals = series_totals.tolist()
+        key_totals = key_totals.tolist()
+    else:
+        series_totals = [[0.0, 0.0, 0.0] for _ in starts]
+        key_totals = [[0.0, 0.0, 0.0] for _ in keys]
+        for p, k, (units, revenue, orders) in zip(row_periods, row_keys, values):
+            for totals, index in ((series_totals, p), (key_totals, k)):
+                totals[index][0] += units
+                totals[index][1] += float(revenue)
+                totals[index][2] += orders
+
+    series = [(start, int(units), revenue, int(orders))
+              for start, (units, revenue, orders) in zip(starts, series_totals)]
+    ranked = sorted(((dim_id, int(units), revenue, int(orders))
+                     for dim_id, (units, revenue, orders) in zip(keys, key_totals)),
+                    key=lambda item: (-item[2], item[0]))
+    return series, ranked[:top] if top else ranked
+
+
+if __name__ == '__main__':
+    # python analytics.py rebuild  -> tính lại toàn bộ SalesDaily từ Orders/OrderDetails
+    # python analytics.py refresh  -> chỉ tính lại các ngày gần nhất (chạy định kỳ, vd. cron)
+    from config import get_config
+    from storage import get_storage
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('rebuild', 'refresh'):
+        print('Cách dùng: python analytics.py rebuild|refresh')
+        sys.exit(1)
+
+    storage = get_storage(get_config())
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        storage.ensure_schema(conn)
+        if sys.argv[1] == 'rebuild':
+            lock(cursor)
+            count = rebuild(cursor, storage)
+        else:
+            count = refresh(cursor, storage)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    print(f'Đã tính lại doanh số theo ngày: {count} dòng.')
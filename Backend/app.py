@@ -1,58 +1,150 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, current_app, request, jsonify, send_from_directory, g, has_app_context
 from flask_cors import CORS
-import pyodbc
 import hashlib
 import jwt
 import datetime
 from functools import wraps
 import os
-from config import Config 
+import threading
+import time
+from config import Config, get_config
+from database import ConnectionPool
+from storage import get_storage
+from pagination import encode_cursor, decode_cursor, parse_limit, keyset_condition
+from search_index import SearchIndex, tokenize
+from cache import LRUCache
+from streaming import stream_rows, wants_ndjson
+from orders import (place_order, buyer_orders_page, orders_page, order_summary, order_row_to_dict,
+                    OrderError, ORDER_COLUMNS, ORDER_STATUSES)
+import ratings
+from stats import StatsSnapshot
+from revocation import RevocationList
+import uuid
+import images
+import upload_store
+import facets
+import analytics
+import recommend
+import similar
+import versions
+from werkzeug.security import safe_join
+from security import hash_password
 
-app = Flask(__name__)
-app.config.from_object(Config) 
-CORS(app)
+# Mọi route nằm trong blueprint này; create_app() tạo Flask app và đăng ký nó
+api = Blueprint('api', __name__)
+
+# Cấu hình đang dùng, create_app() gán lại theo config_name
+settings = Config
 
 # Thiết lập thư mục chứa file ảnh được upload
 UPLOAD_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 
 # ==================== DATABASE CONNECTION ====================
 
+# Tạo trong init_services(); chưa mở kết nối nào cho tới request đầu tiên
+storage = None
+db_pool = None
+
 def get_db_connection():
-    """Kết nối đến SQL Server (Sử dụng tên Server cứng để đảm bảo hoạt động)"""
+    """Mượn kết nối từ pool.
+
+    Trong một request, decorator và view dùng chung một kết nối (lưu ở g);
+    conn.close() khi đó không làm gì, kết nối được trả về pool ở teardown.
+    Ngoài request (script), conn.close() trả kết nối về pool ngay.
+    """
     try:
-        conn = pyodbc.connect(
-            'DRIVER={SQL Server};'
-            'SERVER=PHUCDEPTRAI\\PHUCNGUYENTRONG;' 
-            'DATABASE=BookStoreDBO;'
-            'Trusted_Connection=yes;'
-        )
-        conn.autocommit = False # Tắt autocommit để quản lý transaction
-        return conn
+        if has_app_context():
+            conn = g.get('db_conn')
+            if conn is None:
+                conn = db_pool.acquire()
+                conn.request_scoped = True
+                g.db_conn = conn
+            return conn
+        return db_pool.acquire()
     except Exception as e:
         print(f"Database connection error: {e}") 
         return None
 
+def release_db_connection(exc):
+    """Trả kết nối của request về pool (rollback nếu còn transaction dở)"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.release()
+
 # ==================== AUTHENTICATION DECORATOR ====================
 
+# (role, status) của người dùng theo user_id; TTL ngắn để thay đổi từ process
+# khác cũng có hiệu lực nhanh, khóa/mở khóa trong process này xóa ngay
+principal_cache = None
+
+def _load_principal(user_id):
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError('Không thể kết nối database!')
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT role, status FROM Users WHERE user_id = ?", (user_id,))
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else None, True
+    finally:
+        cursor.close()
+
+def get_principal(user_id):
+    """(role, status) của người dùng hoặc None nếu không tồn tại"""
+    return principal_cache.get_or_load(('user', user_id), lambda: _load_principal(user_id))
+
+def invalidate_principal(user_id):
+    principal_cache.delete(('user', user_id))
+
+# Token bị thu hồi trước hạn (đăng xuất, khóa tài khoản)
+# (snapshot trên đĩa được nạp ở lần kiểm tra đầu tiên)
+revocation_list = None
+
+def _authenticate(roles=None):
+    """Trả về (user_id, None) hoặc (None, response lỗi); roles: các vai trò được phép (None = mọi vai trò)"""
+    token = None
+    if 'Authorization' in request.headers:
+        parts = request.headers['Authorization'].split(' ')
+        if len(parts) == 2 and parts[0].lower() == 'bearer':
+            token = parts[1]
+
+    if not token:
+        return None, (jsonify({'message': 'Token is missing!'}), 401)
+
+    try:
+        data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+        current_user_id = data['user_id']
+    except:
+        return None, (jsonify({'message': 'Token is invalid!'}), 401)
+
+    if revocation_list.is_revoked(data):
+        return None, (jsonify({'message': 'Token has been revoked!'}), 401)
+    g.token_claims = data
+
+    try:
+        principal = get_principal(current_user_id)
+    except Exception as e:
+        print(f"Principal lookup error: {e}")
+        return None, (jsonify({'message': 'Không thể kết nối database!'}), 500)
+
+    if roles:
+        if not principal or principal[1] != 'active' or principal[0].lower() not in roles:
+            return None, (jsonify({'message': f"Yêu cầu quyền {'/'.join(roles)}!"}), 403)
+    else:
+        if not principal:
+            return None, (jsonify({'message': 'Token is invalid!'}), 401)
+        if principal[1] != 'active':
+            return None, (jsonify({'message': 'Tài khoản đã bị khóa!'}), 403)
+
+    return current_user_id, None
+
 def token_required(f):
-    """Decorator: Kiểm tra JWT token hợp lệ"""
+    """Decorator: Kiểm tra JWT token hợp lệ và tài khoản còn hoạt động"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            parts = request.headers['Authorization'].split(' ')
-            if len(parts) == 2 and parts[0].lower() == 'bearer':
-                token = parts[1]
-        
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-        
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user_id = data['user_id']
-        except:
-            return jsonify({'message': 'Token is invalid!'}), 401
-        
+        current_user_id, error = _authenticate()
+        if error:
+            return error
         return f(current_user_id, *args, **kwargs)
     return decorated
 
@@ -60,64 +152,115 @@ def admin_required(f):
     """Decorator: Kiểm tra JWT token và quyền ADMIN"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            parts = request.headers['Authorization'].split(' ')
-            if len(parts) == 2 and parts[0].lower() == 'bearer':
-                token = parts[1]
-
-        if not token:
-            return jsonify({'message': 'Token is missing!'}), 401
-
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user_id = data['user_id']
-        except:
-            return jsonify({'message': 'Token is invalid!'}), 401
-
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'message': 'Không thể kết nối database!'}), 500
-
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT role, status FROM Users WHERE user_id = ?", (current_user_id,))
-            row = cursor.fetchone()
-            if not row or row[1] != 'active' or row[0].lower() != 'admin':
-                return jsonify({'message': 'Yêu cầu quyền admin!'}), 403
-        finally:
-            if cursor:
-                cursor.close()
-            if conn:
-                conn.close()
+        current_user_id, error = _authenticate(roles=('admin',))
+        if error:
+            return error
+        return f(current_user_id, *args, **kwargs)
+    return decorated
 
+def seller_required(f):
+    """Decorator: Kiểm tra JWT token và quyền người bán (seller hoặc admin)"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        current_user_id, error = _authenticate(roles=('seller', 'admin'))
+        if error:
+            return error
         return f(current_user_id, *args, **kwargs)
     return decorated
 
 # ==================== UTILITY FUNCTIONS ====================
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def generate_token(user_id):
+    now = datetime.datetime.now(datetime.timezone.utc)
     token = jwt.encode({
         'user_id': user_id,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-    }, app.config['SECRET_KEY'], algorithm="HS256")
+        'jti': uuid.uuid4().hex,
+        'iat': now.timestamp(),  # giữ phần lẻ của giây, so với mốc khóa tài khoản (revocation.py)
+        'exp': now + datetime.timedelta(hours=settings.JWT_EXPIRATION_HOURS)
+    }, current_app.config['SECRET_KEY'], algorithm="HS256")
     return token
 
 # ==================== STATIC FILE ROUTE ====================
 
-@app.route('/api/uploads/<path:filename>')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+image_variants = None
+
+@api.route('/api/uploads/<path:filename>')
 def uploaded_file(filename):
-    """Phục vụ file ảnh tĩnh từ thư mục uploads"""
-    if not os.path.isdir(UPLOAD_DIRECTORY):
-        os.makedirs(UPLOAD_DIRECTORY)
-        
-    return send_from_directory(UPLOAD_DIRECTORY, filename)
+    """Phục vụ file ảnh tĩnh từ thư mục uploads.
+
+    ?size=grid|detail|admin trả về bản thu nhỏ; ?format=webp|jpeg|png|auto
+    chọn định dạng (auto: WebP nếu trình duyệt hỗ trợ).
+    """
+    size = request.args.get('size')
+    requested_format = request.args.get('format')
+    response = None
+    if size and images.available():
+        source_path = safe_join(UPLOAD_DIRECTORY, filename)
+        if source_path is None or not os.path.isfile(source_path):
+            return jsonify({'message': 'Không tìm thấy ảnh!'}), 404
+        try:
+            fmt = images.choose_format(filename, requested_format,
+                                       'image/webp' in request.accept_mimetypes)
+            rel_path = image_variants.get(source_path, filename, size, fmt) if fmt else None
+            if rel_path is not None:
+                response = send_from_directory(settings.IMAGE_CACHE_FOLDER, rel_path,
+                                               mimetype=images.OUTPUT_FORMATS[fmt][2])
+        except images.VariantError as e:
+            return jsonify({'message': str(e)}), 400
+        except Exception as e:
+            # Ảnh hỏng/không đọc được: trả về ảnh gốc
+            print(f"Image variant error ({filename}): {e}")
+    
+    if response is None:
+        response = send_from_directory(UPLOAD_DIRECTORY, filename)
+    if size and requested_format == 'auto':
+        response.vary.add('Accept')
+    if upload_store.is_hashed_name(os.path.basename(filename)):
+        # Tên theo hash nội dung: nội dung không bao giờ đổi
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+@api.route('/api/uploads', methods=['POST'])
+@seller_required
+def upload_file(current_user_id):
+    """Tải ảnh lên, lưu theo hash nội dung.
+
+    Nhận multipart (trường 'file') hoặc body thô (Content-Type: image/*);
+    trả về image_url để gán cho sách.
+    """
+    if request.mimetype == 'multipart/form-data':
+        file = request.files.get('file')
+        if not file:
+            return jsonify({'message': 'Thiếu file ảnh!'}), 400
+        stream = file.stream
+    elif request.mimetype.startswith('image/'):
+        stream = request.stream
+    else:
+        return jsonify({'message': 'Content-Type phải là multipart/form-data hoặc image/*!'}), 400
+    
+    try:
+        filename, size, existed = upload_store.store_stream(
+            stream, UPLOAD_DIRECTORY, settings.ALLOWED_EXTENSIONS, settings.MAX_CONTENT_LENGTH)
+    except upload_store.UploadError as e:
+        return jsonify({'message': e.message}), e.status
+    except Exception as e:
+        print(f"Upload error: {e}")
+        return jsonify({'message': 'Có lỗi xảy ra!'}), 500
+    
+    return jsonify({
+        'message': 'Tải ảnh thành công!',
+        'image_url': filename,
+        'size': size,
+        'deduplicated': existed
+    }), 200 if existed else 201
 
 # ==================== AUTHENTICATION ROUTES ====================
 
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
     """Đăng ký tài khoản mới"""
     conn = None
@@ -149,6 +292,7 @@ def register():
         """, (fullname, email, phone, hashed_password))
         
         conn.commit()
+        admin_stats_snapshot.add('users')
         
         return jsonify({'message': 'Đăng ký thành công!'}), 201
         
@@ -163,7 +307,7 @@ def register():
         if conn:
             conn.close()
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     """Đăng nhập"""
     conn = None
@@ -220,106 +364,593 @@ def login():
         if conn:
             conn.close()
 
+@api.route('/api/auth/logout', methods=['POST'])
+@token_required
+def logout(current_user_id):
+    """Đăng xuất: thu hồi token hiện tại cho tới khi nó hết hạn"""
+    claims = g.token_claims
+    if claims.get('jti'):
+        revocation_list.revoke(claims['jti'], claims['exp'])
+    return jsonify({'message': 'Đăng xuất thành công!'}), 200
+
+# ==================== BOOK HELPERS ====================
+
+# sort_by -> (cột sắp xếp, chiều, cột có thể NULL); book_id luôn là khóa phụ
+BOOK_SORTS = {
+    'created_at': ('b.created_at', 'DESC', False),
+    'price_asc': ('b.price', 'ASC', False),
+    'price_desc': ('b.price', 'DESC', False),
+    'rating': ('b.rating', 'DESC', True),
+    'name': ('b.title', 'ASC', False),
+}
+
+BOOK_LIST_COLUMNS = """
+    b.book_id, b.title, b.author, b.price, b.old_price,
+    b.description, b.stock, b.rating, b.image_url, c.category_name,
+    b.isbn, b.condition, b.publisher, b.publish_year, b.created_at
+"""
+
+def book_row_to_dict(book):
+    """Chuyển một dòng BOOK_LIST_COLUMNS thành dict trả về cho client"""
+    return {
+        'id': book[0],
+        'title': book[1],
+        'author': book[2],
+        'price': float(book[3]) if book[3] else 0,
+        'old_price': float(book[4]) if book[4] else 0,
+        'description': book[5],
+        'stock': book[6],
+        'rating': float(book[7]) if book[7] else 0.0,
+        'image_url': book[8],
+        'category': book[9],
+        'isbn': book[10],
+        'condition': book[11],
+        'publisher': book[12],
+        'publish_year': book[13]
+    }
+
+def book_filter_sql(args, exclude=()):
+    """Điều kiện lọc (ngoài tìm kiếm) từ query string: trả về (sql ' AND ...', params).
+
+    exclude: tên tham số bỏ qua (facet tự lọc các tham số này)
+    """
+    sql = ""
+    params = []
+    
+    isbn = args.get('isbn')
+    author = args.get('author')
+    category = args.get('category') if 'category' not in exclude else None
+    min_price = args.get('min_price')
+    max_price = args.get('max_price')
+    condition = args.get('condition') if 'condition' not in exclude else None
+    
+    if isbn:
+        sql += " AND b.isbn = ?"
+        params.append(isbn)
+        
+    if author:
+        sql += " AND b.author LIKE ?"
+        params.append(f'%{author}%')
+    
+    if category:
+        sql += " AND c.category_name = ?"
+        params.append(category)
+    
+    if min_price:
+        sql += " AND b.price >= ?"
+        params.append(float(min_price))
+    
+    if max_price:
+        sql += " AND b.price <= ?"
+        params.append(float(max_price))
+    
+    if condition:
+        sql += " AND b.condition = ?"
+        params.append(condition)
+    
+    return sql, params
+
+def id_list_sql(column, ids):
+    """Điều kiện ' AND column IN (?, ?, ...)' cho danh sách id"""
+    return f" AND {column} IN ({', '.join('?' * len(ids))})", list(ids)
+
+# ==================== CATALOG VERSIONS ====================
+
+# Phiên bản dùng chung trong DB (versions.py), mỗi worker đọc lại tối đa một lần
+# mỗi CATALOG_VERSION_CHECK_INTERVAL giây
+_catalog_db_versions = {}  # namespace -> (version, time.monotonic() lúc đọc)
+
+def catalog_db_version(namespace, cursor=None):
+    """Phiên bản mới nhất của namespace trong DB (có thể trễ tối đa một chu kỳ kiểm tra).
+    Không truyền cursor thì chỉ mượn kết nối của request khi thật sự cần đọc DB."""
+    cached = _catalog_db_versions.get(namespace)
+    now = time.monotonic()
+    if cached and now - cached[1] < settings.CATALOG_VERSION_CHECK_INTERVAL:
+        return cached[0]
+    if cursor is None:
+        conn = get_db_connection()
+        if not conn:
+            return cached[0] if cached else 0
+        own_cursor = conn.cursor()
+        try:
+            version = versions.current(own_cursor, namespace)
+        finally:
+            own_cursor.close()
+    else:
+        version = versions.current(cursor, namespace)
+    _catalog_db_versions[namespace] = (version, now)
+    return version
+
+def note_catalog_version(namespace, version):
+    """Worker vừa ghi (đã commit) thấy ngay phiên bản mới, không chờ hết chu kỳ kiểm tra"""
+    cached = _catalog_db_versions.get(namespace)
+    if not cached or version > cached[0]:
+        _catalog_db_versions[namespace] = (version, time.monotonic())
+
+# ==================== SEARCH INDEX ====================
+
+search_index = SearchIndex()
+_search_index_lock = threading.Lock()
+
+SEARCH_INDEX_COLUMNS = "book_id, title, author, isbn, publisher, description"
+
+def _search_document(row):
+    return {
+        'book_id': row[0], 'title': row[1], 'author': row[2],
+        'isbn': row[3], 'publisher': row[4], 'description': row[5],
+    }
+
+def load_search_index():
+    """Xây chỉ mục tìm kiếm từ toàn bộ sách đã duyệt"""
+    conn = db_pool.acquire()
+    cursor = conn.cursor()
+    try:
+        # Đọc phiên bản trước: thay đổi commit trong lúc xây sẽ được áp dụng lại ở lần đồng bộ sau
+        version = versions.current(cursor, 'books')
+        cursor.execute(f"SELECT {SEARCH_INDEX_COLUMNS} FROM Books WHERE status = 'approved'")
+        rows = cursor.fetchall()
+        search_index.build(_search_document(row) for row in rows)
+        search_index.version = version
+        print(f"Search index built: {len(search_index)} books")
+    finally:
+        cursor.close()
+        conn.close()
+
+def ensure_search_index(cursor):
+    """Chỉ mục được xây khi khởi động (nếu chưa có thì ở lần tìm kiếm đầu tiên), rồi theo kịp
+    các sách đã duyệt/ẩn/nhập ở bất kỳ worker nào (change_seq > phiên bản đã áp dụng)"""
+    if not search_index.ready:
+        with _search_index_lock:
+            if not search_index.ready:
+                load_search_index()
+    version = catalog_db_version('books', cursor)
+    if version > search_index.version:
+        with _search_index_lock:
+            if version > search_index.version:
+                cursor.execute(f"SELECT {SEARCH_INDEX_COLUMNS}, status FROM Books WHERE change_seq > ?",
+                               (search_index.version,))
+                for row in cursor.fetchall():
+                    if row[6] == 'approved':
+                        search_index.add(_search_document(row))
+                    else:
+                        search_index.remove(row[0])
+                search_index.version = version
+    return search_index
+
+# ==================== CATALOG CACHE ====================
+
+# Cache phản hồi của /api/books, /api/books/<id>, /api/categories và bản tóm tắt
+# giá/tồn kho từng sách (('book-summary', id)) cho /api/books/batch.
+# - Route ghi trong worker này xóa ngay các khóa liên quan (duyệt/ẩn sách, tạo thể loại,
+#   đánh giá, đặt hàng)
+# - Duyệt/ẩn/nhập sách, đánh giá và tạo thể loại còn tăng phiên bản trong DB (versions.py);
+#   worker khác thấy phiên bản mới sau tối đa CATALOG_VERSION_CHECK_INTERVAL giây và xóa
+#   các khóa tương ứng
+# - Đánh giá chỉ xóa chi tiết và các trang review (('reviews', id, ...)) của sách đó;
+#   điểm trung bình trong danh sách sách cũ tối đa CATALOG_CACHE_TTL
+# - Đặt hàng không tăng phiên bản (một dòng dùng chung sẽ tuần tự hóa mọi lần thanh toán):
+#   tồn kho trong cache của worker khác cũ tối đa CATALOG_CACHE_TTL, còn đặt hàng luôn
+#   kiểm tra tồn kho trên DB
+catalog_cache = None
+
+BOOK_QUERY_PARAMS = ('search', 'isbn', 'author', 'category', 'min_price', 'max_price',
+                     'condition', 'sort_by', 'limit', 'cursor')
+
+def normalize_book_args(args):
+    """Khóa cache cho bộ lọc: bỏ tham số rỗng/lạ, chuẩn hóa từ khóa và giá"""
+    items = []
+    for name in BOOK_QUERY_PARAMS:
+        value = (args.get(name) or '').strip()
+        if not value:
+            continue
+        if name == 'search':
+            value = ' '.join(tokenize(value))
+        elif name in ('min_price', 'max_price'):
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        items.append((name, value))
+    return tuple(items)
+
+def invalidate_books(*book_ids):
+    """Xóa cache chi tiết các sách đã đổi và mọi danh sách sách"""
+    for book_id in book_ids:
+        catalog_cache.delete(('book', book_id))
+        catalog_cache.delete(('book-summary', book_id))
+    catalog_cache.delete_namespace('books')
+    changed = set(book_ids)
+    catalog_cache.delete_namespace('reviews', lambda key: key[1] in changed)
+
+def invalidate_reviews(*book_ids):
+    """Xóa cache chi tiết và các trang review của sách vừa có đánh giá mới.
+    Danh sách sách (điểm trung bình) không bị xóa, cũ tối đa CATALOG_CACHE_TTL"""
+    for book_id in book_ids:
+        catalog_cache.delete(('book', book_id))
+    changed = set(book_ids)
+    catalog_cache.delete_namespace('reviews', lambda key: key[1] in changed)
+
+def invalidate_categories():
+    catalog_cache.delete(('categories',))
+
+_catalog_cache_versions = {}  # namespace -> phiên bản DB mà cache của worker này đã theo kịp
+_catalog_cache_lock = threading.Lock()
+
+def sync_catalog_cache(namespace):
+    """Xóa các khóa cache mà worker khác đã làm cũ (phiên bản DB của namespace đã tăng)"""
+    try:
+        version = catalog_db_version(namespace)
+        applied = _catalog_cache_versions.get(namespace)
+        if applied is not None and version <= applied:
+            return
+        with _catalog_cache_lock:
+            applied = _catalog_cache_versions.get(namespace)
+            if applied is None:
+                # Lần đầu chỉ ghi nhận: mọi giá trị trong cache đều nạp sau lần đọc này
+                _catalog_cache_versions[namespace] = version
+            elif version > applied:
+                if namespace == 'books':
+                    cursor = get_db_connection().cursor()
+                    try:
+                        cursor.execute("SELECT book_id FROM Books WHERE change_seq > ?", (applied,))
+                        invalidate_books(*[row[0] for row in cursor.fetchall()])
+                    finally:
+                        cursor.close()
+                elif namespace == 'reviews':
+                    cursor = get_db_connection().cursor()
+                    try:
+                        cursor.execute("SELECT DISTINCT book_id FROM Reviews WHERE change_seq > ?", (applied,))
+                        invalidate_reviews(*[row[0] for row in cursor.fetchall()])
+                    finally:
+                        cursor.close()
+                else:
+                    invalidate_categories()
+                _catalog_cache_versions[namespace] = version
+    except Exception as e:
+        print(f"Catalog cache sync error: {e}")
+
+def catalog_entry(loader):
+    """(payload, status, etag) để lưu cache; ETag là hash của nội dung nên mọi worker
+    (và sau khi khởi động lại) cho cùng một ETag với cùng dữ liệu"""
+    payload, status = loader()
+    etag = None
+    if status == 200:
+        etag = hashlib.blake2b(current_app.json.dumps(payload).encode(), digest_size=16).hexdigest()
+    return (payload, status, etag), status == 200
+
+def catalog_response(version_namespace, key, loader):
+    """Phản hồi GET cho danh mục: 304 nếu client đã có bản mới nhất (bản trong cache thì không đụng DB)"""
+    sync_catalog_cache(version_namespace)
+    payload, status, etag = catalog_cache.get_or_load(key, lambda: catalog_entry(loader))
+    if status != 200:
+        response = jsonify(payload)
+        response.status_code = status
+        return response
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={settings.CATALOG_MAX_AGE}, must-revalidate'
+    return response
+
 # ==================== BOOK ROUTES (KHÔNG ĐỔI) ====================
 
-@app.route('/api/books', methods=['GET'])
+@api.route('/api/books', methods=['GET'])
 def get_books():
-    """Lấy danh sách sách với tìm kiếm và lọc nâng cao"""
+    """Lấy danh sách sách với tìm kiếm, lọc nâng cao và phân trang keyset"""
+    args = request.args
+    return catalog_response('books', ('books', normalize_book_args(args)), lambda: _load_books(args))
+
+def _load_books(args):
     conn = None
     cursor = None
     try:
         # Lấy parameters
-        category = request.args.get('category')
-        search = request.args.get('search')
-        isbn = request.args.get('isbn')
-        author = request.args.get('author')
-        min_price = request.args.get('min_price')
-        max_price = request.args.get('max_price')
-        condition = request.args.get('condition')
-        sort_by = request.args.get('sort_by', 'created_at')
+        search = (args.get('search') or '').strip()
+        sort_by = args.get('sort_by') or ('relevance' if search else 'created_at')
+        if sort_by not in BOOK_SORTS and not (sort_by == 'relevance' and search):
+            sort_by = 'created_at'
+        
+        try:
+            limit = parse_limit(args.get('limit'), settings.BOOKS_PAGE_SIZE, settings.BOOKS_PAGE_MAX)
+            cursor_token = args.get('cursor')
+            after = decode_cursor(cursor_token, sort_by) if cursor_token else None
+        except ValueError as e:
+            return {'message': f'Tham số phân trang không hợp lệ: {e}'}, 400
         
         conn = get_db_connection()
         if not conn:
-            return jsonify({'message': 'Không thể kết nối database!'}), 500
+            return {'message': 'Không thể kết nối database!'}, 500
         
         cursor = conn.cursor()
         
-        query = """
-            SELECT b.book_id, b.title, b.author, b.price, b.old_price, 
-                   b.description, b.stock, b.rating, b.image_url, c.category_name,
-                   b.isbn, b.condition, b.publisher, b.publish_year
+        filter_sql, params = book_filter_sql(args)
+        
+        # Tìm kiếm lấy từ chỉ mục trong bộ nhớ, DB chỉ nạp các id khớp
+        if search and sort_by == 'relevance':
+            hit_ids = [book_id for book_id, _ in ensure_search_index(cursor).search(search, settings.SEARCH_MAX_HITS)]
+            if not hit_ids:
+                return {'books': [], 'next_cursor': None}, 200
+            return _search_page(cursor, hit_ids, filter_sql, params, after, limit)
+        
+        # Sắp xếp khác: tìm kiếm chỉ là bộ lọc, không cắt ở SEARCH_MAX_HITS
+        hit_ids = None
+        if search:
+            hit_ids = ensure_search_index(cursor).match_ids(search)
+            if not hit_ids:
+                return {'books': [], 'next_cursor': None}, 200
+        
+        sort_column, sort_direction, sort_nullable = BOOK_SORTS[sort_by]
+        
+        query = f"""
+            SELECT {BOOK_LIST_COLUMNS}
             FROM Books b
             LEFT JOIN Categories c ON b.category_id = c.category_id
             WHERE b.status = 'approved'
-        """
+        """ + filter_sql
+        
+        # Ít kết quả: lọc bằng IN (...); nhiều: duyệt theo thứ tự sắp xếp và lọc khi đọc
+        scan_ids = None
+        if hit_ids is not None:
+            if len(hit_ids) <= settings.SEARCH_ID_LIST_MAX:
+                in_sql, in_params = id_list_sql('b.book_id', sorted(hit_ids))
+                query += in_sql
+                params.extend(in_params)
+            else:
+                scan_ids = hit_ids
+        
+        # Trang tiếp theo: chỉ lấy các dòng đứng sau dòng cuối của trang trước
+        if after:
+            value_param = storage.datetime_param() if sort_by == 'created_at' else '?'
+            keyset_sql, keyset_params = keyset_condition(
+                sort_column, 'b.book_id', sort_direction, after[0], after[1],
+                nullable=sort_nullable, value_param=value_param)
+            query += " AND " + keyset_sql
+            params.extend(keyset_params)
+        
+        query += f" ORDER BY {sort_column} {sort_direction}, b.book_id {sort_direction}"
+        if scan_ids is None:
+            query += storage.limit_clause()
+            params.append(limit + 1)  # lấy dư một dòng để biết còn trang sau
+            cursor.execute(query, params)
+            books = cursor.fetchall()
+        else:
+            cursor.execute(query, params)
+            books = []
+            while len(books) <= limit:
+                rows = cursor.fetchmany(settings.STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                books.extend(row for row in rows if row[0] in scan_ids)
+        
+        next_cursor = None
+        if len(books) > limit:
+            books = books[:limit]
+            last = books[-1]
+            sort_values = {
+                'created_at': last[14],
+                'price_asc': last[3],
+                'price_desc': last[3],
+                'rating': last[7],
+                'name': last[1],
+            }
+            next_cursor = encode_cursor(sort_by, sort_values[sort_by], last[0])
+        
+        books_list = [book_row_to_dict(book) for book in books]
         
-        params = []
+        return {'books': books_list, 'next_cursor': next_cursor}, 200
         
+    except Exception as e:
+        print(f"Get books error: {e}")
+        return {'message': 'Có lỗi xảy ra!'}, 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def _search_page(cursor, hit_ids, filter_sql, params, after, limit):
+    """Một trang kết quả theo độ liên quan; cursor lưu vị trí trong danh sách xếp hạng"""
+    ranked = hit_ids
+    if filter_sql:
+        # Lọc thêm bằng một truy vấn chỉ lấy id, rồi giữ nguyên thứ tự xếp hạng
+        in_sql, in_params = id_list_sql('b.book_id', hit_ids)
+        cursor.execute(f"""
+            SELECT b.book_id
+            FROM Books b
+            LEFT JOIN Categories c ON b.category_id = c.category_id
+            WHERE b.status = 'approved'
+        """ + filter_sql + in_sql, params + in_params)
+        allowed = {row[0] for row in cursor.fetchall()}
+        ranked = [book_id for book_id in hit_ids if book_id in allowed]
+    
+    offset = after[0] if after else 0
+    page_ids = ranked[offset:offset + limit]
+    next_cursor = None
+    if offset + limit < len(ranked):
+        next_cursor = encode_cursor('relevance', offset + limit, page_ids[-1])
+    if not page_ids:
+        return {'books': [], 'next_cursor': None}, 200
+    
+    in_sql, in_params = id_list_sql('b.book_id', page_ids)
+    cursor.execute(f"""
+        SELECT {BOOK_LIST_COLUMNS}
+        FROM Books b
+        LEFT JOIN Categories c ON b.category_id = c.category_id
+        WHERE b.status = 'approved'
+    """ + in_sql, in_params)
+    rows = {row[0]: row for row in cursor.fetchall()}
+    books_list = [book_row_to_dict(rows[book_id]) for book_id in page_ids if book_id in rows]
+    
+    return {'books': books_list, 'next_cursor': next_cursor}, 200
+
+@api.route('/api/books/facets', methods=['GET'])
+def get_book_facets():
+    """Số sách theo thể loại, tình trạng, khoảng giá và năm xuất bản cho bộ lọc hiện tại"""
+    args = request.args
+    return catalog_response('books', ('books', 'facets', normalize_book_args(args)),
+                            lambda: _load_book_facets(args))
+
+def _load_book_facets(args):
+    conn = None
+    cursor = None
+    try:
+        bounds = settings.FACET_PRICE_BOUNDS
+        search = (args.get('search') or '').strip()
+        
+        conn = get_db_connection()
+        if not conn:
+            return {'message': 'Không thể kết nối database!'}, 500
+        
+        cursor = conn.cursor()
+        
+        # Đếm trên mọi sách khớp từ khóa, không chỉ SEARCH_MAX_HITS kết quả đầu
+        hit_ids = None
         if search:
-            query += " AND (b.title LIKE ? OR b.author LIKE ? OR b.isbn LIKE ?)"
-            params.extend([f'%{search}%', f'%{search}%', f'%{search}%'])
+            hit_ids = sorted(ensure_search_index(cursor).match_ids(search))
+            if not hit_ids:
+                return facets.rollup([], bounds), 200
+        
+        # Thể loại/tình trạng được lọc trong facets.rollup() để đếm kiểu disjunctive
+        filter_sql, params = book_filter_sql(args, exclude=('category', 'condition'))
+        bucket_sql = facets.price_bucket_sql('b.price', bounds)
+        select_sql = f"""
+            SELECT c.category_name, b.condition, {bucket_sql}, b.publish_year, COUNT(*)
+            FROM Books b
+            LEFT JOIN Categories c ON b.category_id = c.category_id
+            WHERE b.status = 'approved'
+        """ + filter_sql
+        group_sql = f"""
+            GROUP BY c.category_name, b.condition, {bucket_sql}, b.publish_year
+        """
         
-        if isbn:
-            query += " AND b.isbn = ?"
-            params.append(isbn)
-            
-        if author:
-            query += " AND b.author LIKE ?"
-            params.append(f'%{author}%')
-        
-        if category:
-            query += " AND c.category_name = ?"
-            params.append(category)
-        
-        if min_price:
-            query += " AND b.price >= ?"
-            params.append(float(min_price))
-        
-        if max_price:
-            query += " AND b.price <= ?"
-            params.append(float(max_price))
-        
-        if condition:
-            query += " AND b.condition = ?"
-            params.append(condition)
-        
-        if sort_by == 'price_asc':
-            query += " ORDER BY b.price ASC"
-        elif sort_by == 'price_desc':
-            query += " ORDER BY b.price DESC"
-        elif sort_by == 'rating':
-            query += " ORDER BY b.rating DESC"
-        elif sort_by == 'name':
-            query += " ORDER BY b.title ASC"
+        if hit_ids is None:
+            cursor.execute(select_sql + group_sql, params)
+            rows = cursor.fetchall()
         else:
-            query += " ORDER BY b.created_at DESC"
-        
-        cursor.execute(query, params)
-        books = cursor.fetchall()
-        
-        books_list = []
-        for book in books:
-            books_list.append({
-                'id': book[0],
-                'title': book[1],
-                'author': book[2],
-                'price': float(book[3]) if book[3] else 0,
-                'old_price': float(book[4]) if book[4] else 0,
-                'description': book[5],
-                'stock': book[6],
-                'rating': float(book[7]) if book[7] else 0.0,
-                'image_url': book[8],
-                'category': book[9],
-                'isbn': book[10] if len(book) > 10 else None,
-                'condition': book[11] if len(book) > 11 else 'new',
-                'publisher': book[12] if len(book) > 12 else None,
-                'publish_year': book[13] if len(book) > 13 else None
-            })
+            # Nhiều id thì chia lô IN (...); rollup() cộng dồn các nhóm trùng giữa các lô
+            rows = []
+            for start in range(0, len(hit_ids), settings.SEARCH_ID_LIST_MAX):
+                in_sql, in_params = id_list_sql('b.book_id', hit_ids[start:start + settings.SEARCH_ID_LIST_MAX])
+                cursor.execute(select_sql + in_sql + group_sql, params + in_params)
+                rows.extend(cursor.fetchall())
+        
+        return facets.rollup(rows, bounds,
+                             category=args.get('category'), condition=args.get('condition')), 200
+        
+    except ValueError:
+        return {'message': 'Tham số lọc không hợp lệ!'}, 400
+    except Exception as e:
+        print(f"Get book facets error: {e}")
+        return {'message': 'Có lỗi xảy ra!'}, 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+BOOK_SUMMARY_COLUMNS = "book_id, title, author, price, old_price, stock, image_url"
+
+def _book_summary(row):
+    return {
+        'id': row[0],
+        'title': row[1],
+        'author': row[2],
+        'price': float(row[3]) if row[3] else 0,
+        'old_price': float(row[4]) if row[4] else 0,
+        'stock': row[5],
+        'image_url': row[6]
+    }
+
+def parse_id_list(value, max_ids):
+    """'3,1,3' -> [3, 1] (giữ thứ tự, bỏ trùng); ValueError nếu không hợp lệ hoặc quá nhiều"""
+    ids = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        book_id = int(part)
+        if book_id <= 0:
+            raise ValueError(part)
+        if book_id not in ids:
+            ids.append(book_id)
+    if len(ids) > max_ids:
+        raise ValueError('too many ids')
+    return ids
+
+def cached_book_summaries(ids):
+    """Tóm tắt các sách đã có trong cache: trả về ({id: summary}, [id còn thiếu])"""
+    sync_catalog_cache('books')
+    found = {}
+    for book_id in ids:
+        summary = catalog_cache.get(('book-summary', book_id))
+        if summary is not None:
+            found[book_id] = summary
+    return found, [book_id for book_id in ids if book_id not in found]
+
+def fetch_book_summaries(cursor, ids, found):
+    """Lấy các sách đang bán trong ids bằng một truy vấn IN theo khóa chính, lưu cache và thêm vào found"""
+    generation = catalog_cache.generation('book-summary')
+    in_sql, params = id_list_sql('book_id', ids)
+    cursor.execute(f"SELECT {BOOK_SUMMARY_COLUMNS} FROM Books WHERE status = 'approved'" + in_sql, params)
+    for row in cursor.fetchall():
+        summary = _book_summary(row)
+        catalog_cache.set(('book-summary', summary['id']), summary, generation=generation)
+        found[summary['id']] = summary
+    return found
+
+@api.route('/api/books/batch', methods=['GET'])
+def get_books_batch():
+    """Giá, tồn kho hiện tại của nhiều sách trong một request (làm mới giỏ hàng, kiểm tra trước khi thanh toán).
+
+    ?ids=1,2,3 -> {'books': [...], 'unavailable': [id không tồn tại/chưa duyệt/đã ẩn]}
+    Sách có trong cache được trả ngay; các id còn lại lấy bằng một truy vấn IN theo khóa chính.
+    """
+    conn = None
+    cursor = None
+    try:
+        try:
+            ids = parse_id_list(request.args.get('ids'), settings.BOOK_BATCH_MAX_IDS)
+        except ValueError:
+            return jsonify({'message': f'ids phải là danh sách tối đa {settings.BOOK_BATCH_MAX_IDS} mã sách!'}), 400
+        
+        found, missing = cached_book_summaries(ids)
+        if missing:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'message': 'Không thể kết nối database!'}), 500
+            
+            cursor = conn.cursor()
+            fetch_book_summaries(cursor, missing, found)
         
-        return jsonify({'books': books_list}), 200
+        return jsonify({
+            'books': [found[book_id] for book_id in ids if book_id in found],
+            'unavailable': [book_id for book_id in ids if book_id not in found]
+        }), 200
         
     except Exception as e:
-        print(f"Get books error: {e}")
+        print(f"Get books batch error: {e}")
         return jsonify({'message': 'Có lỗi xảy ra!'}), 500
     finally:
         if cursor:
@@ -327,15 +958,186 @@ def get_books():
         if conn:
             conn.close()
 
-@app.route('/api/books/<int:book_id>', methods=['GET'])
+# ==================== RECOMMENDATIONS ====================
+
+co_purchase = None
+_co_purchase_lock = threading.Lock()
+
+def load_co_purchase():
+    """Cộng các đơn đang chờ vào bảng CoPurchase rồi nạp ma trận đồng mua"""
+    conn = db_pool.acquire()
+    cursor = conn.cursor()
+    try:
+        try:
+            folded = recommend.fold_queue(cursor, storage, settings.RECOMMEND_MAX_ORDER_LINES)
+            conn.commit()
+            if folded:
+                print(f"Co-purchase queue folded: {folded} orders")
+        except Exception as e:
+            # Vẫn nạp bảng hiện có; đơn còn trong hàng đợi sẽ được cộng ở lần sau
+            print(f"Co-purchase queue fold error: {e}")
+            conn.rollback()
+        cursor.execute("SELECT book_id, other_id, orders FROM CoPurchase")
+        co_purchase.build(cursor.fetchall())
+        print(f"Co-purchase index loaded: {len(co_purchase)} books")
+    finally:
+        cursor.close()
+        conn.close()
+
+_co_purchase_thread = None  # (pid, thread) của thread nạp lại
+
+def ensure_co_purchase_refresher():
+    """Khởi động thread nền của process này: nạp ngay nếu chưa có ma trận, rồi gộp hàng đợi
+    và nạp lại mỗi RECOMMEND_RELOAD_INTERVAL giây. Request không bao giờ tự gộp/nạp"""
+    global _co_purchase_thread
+    # Thread không sống qua fork(): mỗi worker tự khởi động thread của mình
+    if _co_purchase_thread is not None and _co_purchase_thread[0] == os.getpid():
+        return
+    with _co_purchase_lock:
+        if _co_purchase_thread is not None and _co_purchase_thread[0] == os.getpid():
+            return
+        thread = threading.Thread(target=_refresh_co_purchase, name='co-purchase-refresh', daemon=True)
+        _co_purchase_thread = (os.getpid(), thread)
+        thread.start()
+
+def _refresh_co_purchase():
+    delay = settings.RECOMMEND_RELOAD_INTERVAL if co_purchase.ready else 0
+    while True:
+        time.sleep(delay)
+        delay = settings.RECOMMEND_RELOAD_INTERVAL
+        try:
+            load_co_purchase()
+        except Exception as e:
+            print(f"Co-purchase index load error: {e}")
+
+@api.route('/api/books/<int:book_id>/also-bought', methods=['GET'])
+def get_also_bought(book_id):
+    """Sách hay được mua cùng book_id (top-K tính sẵn), chỉ gồm sách đang bán.
+    Danh sách rỗng cho tới khi thread nền nạp xong ma trận đồng mua"""
+    conn = None
+    cursor = None
+    try:
+        try:
+            limit = parse_limit(request.args.get('limit'), settings.RECOMMEND_DEFAULT_LIMIT, settings.RECOMMEND_TOP_K)
+        except ValueError:
+            return jsonify({'message': 'Tham số limit không hợp lệ!'}), 400
+        
+        ensure_co_purchase_refresher()
+        neighbor_ids = co_purchase.neighbors(book_id)
+        found, missing = cached_book_summaries(neighbor_ids)
+        if missing:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({'message': 'Không thể kết nối database!'}), 500
+            
+            cursor = conn.cursor()
+            fetch_book_summaries(cursor, missing, found)
+        
+        books_list = [found[other_id] for other_id in neighbor_ids if other_id in found][:limit]
+        return jsonify({'book_id': book_id, 'books': books_list}), 200
+        
+    except Exception as e:
+        print(f"Get also-bought error: {e}")
+        return jsonify({'message': 'Có lỗi xảy ra!'}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+similarity_model = None
+_similarity_lock = threading.Lock()
+
+def load_similarity_model():
+    """Xây model TF-IDF dùng khi duyệt/ẩn sách (warm_up; process không chạy warm_up thì
+    xây ở lần duyệt/ẩn đầu tiên)"""
+    conn = db_pool.acquire()
+    cursor = conn.cursor()
+    try:
+        with _similarity_lock:
+            similar.load(cursor, similarity_model)
+        print(f"Similarity model built: {len(similarity_model)} books")
+    finally:
+        cursor.close()
+        conn.close()
+
+def refresh_similar_books(conn, cursor, book_id):
+    """Cập nhật các dòng BookSimilar bị ảnh hưởng sau khi sách được duyệt/sửa/ẩn.
+    Chạy sau khi thao tác chính đã commit; model theo kịp mọi thay đổi trong DB (kể cả
+    của worker khác) trước khi tính. Lỗi ở đây chỉ được ghi log"""
+    try:
+        with _similarity_lock:
+            if not similarity_model.ready:
+                similar.load(cursor, similarity_model)
+                print(f"Similarity model built: {len(similarity_model)} books")
+            similar.catch_up(cursor, similarity_model)
+            similar.update_book(cursor, similarity_model, book_id,
+                                settings.SIMILAR_TOP_K, settings.SIMILAR_MIN_SCORE)
+        # Tăng phiên bản lần nữa cùng transaction với BookSimilar: /similar mà worker khác
+        # cache giữa hai lần commit cũng bị xóa
+        version = versions.mark_books(cursor, [book_id])
+        conn.commit()
+        note_catalog_version('books', version)
+    except Exception as e:
+        print(f"Similar books update error: {e}")
+        if not conn.autocommit:
+            conn.rollback()
+
+@api.route('/api/books/<int:book_id>/similar', methods=['GET'])
+def get_similar_books(book_id):
+    """Sách có nội dung gần giống nhất (top-K tính sẵn trong BookSimilar), kèm điểm cosine"""
+    args = request.args
+    key = ('books', 'similar', book_id, args.get('limit', ''))
+    return catalog_response('books', key, lambda: _load_similar_books(book_id, args))
+
+def _load_similar_books(book_id, args):
+    conn = None
+    cursor = None
+    try:
+        try:
+            limit = parse_limit(args.get('limit'), settings.SIMILAR_DEFAULT_LIMIT, settings.SIMILAR_TOP_K)
+        except ValueError:
+            return {'message': 'Tham số limit không hợp lệ!'}, 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return {'message': 'Không thể kết nối database!'}, 500
+        
+        cursor = conn.cursor()
+        cursor.execute("SELECT other_id, score FROM BookSimilar WHERE book_id = ?", (book_id,))
+        scores = dict(cursor.fetchall())
+        neighbor_ids = sorted(scores, key=lambda other_id: (-scores[other_id], other_id))
+        
+        found, missing = cached_book_summaries(neighbor_ids)
+        if missing:
+            fetch_book_summaries(cursor, missing, found)
+        
+        books_list = [dict(found[other_id], score=round(scores[other_id], 4))
+                      for other_id in neighbor_ids if other_id in found][:limit]
+        return {'book_id': book_id, 'books': books_list}, 200
+        
+    except Exception as e:
+        print(f"Get similar books error: {e}")
+        return {'message': 'Có lỗi xảy ra!'}, 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+@api.route('/api/books/<int:book_id>', methods=['GET'])
 def get_book_detail(book_id):
-    """Lấy chi tiết sách với reviews"""
+    """Lấy chi tiết sách kèm tóm tắt đánh giá"""
+    sync_catalog_cache('reviews')
+    return catalog_response('books', ('book', book_id), lambda: _load_book_detail(book_id))
+
+def _load_book_detail(book_id):
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         if not conn:
-            return jsonify({'message': 'Không thể kết nối database!'}), 500
+            return {'message': 'Không thể kết nối database!'}, 500
         
         cursor = conn.cursor()
         
@@ -343,7 +1145,8 @@ def get_book_detail(book_id):
             SELECT b.book_id, b.title, b.author, b.price, b.old_price,
                    b.description, b.stock, b.rating, b.image_url, 
                    c.category_name, u.fullname as seller_name,
-                   b.isbn, b.condition, b.publisher, b.publish_year
+                   b.isbn, b.condition, b.publisher, b.publish_year,
+                   b.rating_count, b.rating_1, b.rating_2, b.rating_3, b.rating_4, b.rating_5
             FROM Books b
             LEFT JOIN Categories c ON b.category_id = c.category_id
             LEFT JOIN Users u ON b.seller_id = u.user_id
@@ -353,26 +1156,13 @@ def get_book_detail(book_id):
         book = cursor.fetchone()
         
         if not book:
-            return jsonify({'message': 'Không tìm thấy sách!'}), 404
+            return {'message': 'Không tìm thấy sách!'}, 404
         
-        # Lấy reviews
-        cursor.execute("""
-            SELECT r.rating, r.comment, r.created_at, u.fullname
-            FROM Reviews r
-            LEFT JOIN Users u ON r.user_id = u.user_id
-            WHERE r.book_id = ?
-            ORDER BY r.created_at DESC
-        """, (book_id,))
-        
-        reviews = cursor.fetchall()
-        reviews_list = []
-        for review in reviews:
-            reviews_list.append({
-                'rating': float(review[0]) if review[0] else 0,
-                'comment': review[1],
-                'created_at': review[2].strftime('%Y-%m-%d %H:%M:%S') if review[2] else None,
-                'user_name': review[3]
-            })
+        # Tóm tắt đánh giá: số lượng/biểu đồ đã tổng hợp sẵn trên Books, chỉ lấy vài review mới nhất.
+        # Toàn bộ review phân trang qua /api/books/<id>/reviews.
+        latest = []
+        if book[15]:
+            latest, _ = _review_page(cursor, book_id, None, settings.REVIEW_SUMMARY_LATEST)
         
         book_detail = {
             'id': book[0],
@@ -390,21 +1180,105 @@ def get_book_detail(book_id):
             'condition': book[12] if len(book) > 12 else 'new',
             'publisher': book[13] if len(book) > 13 else None,
             'publish_year': book[14] if len(book) > 14 else None,
-            'reviews': reviews_list
+            'review_summary': {
+                'count': book[15],
+                'average': float(book[7]) if book[7] else 0.0,
+                'histogram': ratings.histogram(book[16:21]),
+                'latest': latest
+            }
         }
         
-        return jsonify(book_detail), 200
+        return book_detail, 200
         
     except Exception as e:
         print(f"Get book detail error: {e}")
-        return jsonify({'message': 'Có lỗi xảy ra!'}), 500
+        return {'message': 'Có lỗi xảy ra!'}, 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+REVIEW_COLUMNS = "r.review_id, r.rating, r.comment, r.created_at, u.fullname"
+
+def _review_row_to_dict(review):
+    return {
+        'id': review[0],
+        'rating': float(review[1]) if review[1] else 0,
+        'comment': review[2],
+        'created_at': review[3].strftime('%Y-%m-%d %H:%M:%S') if review[3] else None,
+        'user_name': review[4]
+    }
+
+def _review_page(cursor, book_id, after, limit):
+    """Một trang review mới nhất trước (created_at, review_id); trả về (reviews, next_cursor)"""
+    query = f"""
+        SELECT {REVIEW_COLUMNS}
+        FROM Reviews r
+        LEFT JOIN Users u ON r.user_id = u.user_id
+        WHERE r.book_id = ?
+    """
+    params = [book_id]
+    if after:
+        keyset_sql, keyset_params = keyset_condition(
+            'r.created_at', 'r.review_id', 'DESC', after[0], after[1],
+            value_param=storage.datetime_param())
+        query += " AND " + keyset_sql
+        params.extend(keyset_params)
+    query += " ORDER BY r.created_at DESC, r.review_id DESC" + storage.limit_clause()
+    params.append(limit + 1)
+    
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor('reviews', rows[-1][3], rows[-1][0])
+    return [_review_row_to_dict(row) for row in rows], next_cursor
+
+@api.route('/api/books/<int:book_id>/reviews', methods=['GET'])
+def get_book_reviews(book_id):
+    """Danh sách đánh giá của sách, mới nhất trước, phân trang keyset (?limit=&cursor=)"""
+    args = request.args
+    key = ('reviews', book_id, args.get('limit', ''), args.get('cursor', ''))
+    sync_catalog_cache('reviews')
+    return catalog_response('books', key, lambda: _load_book_reviews(book_id, args))
+
+def _load_book_reviews(book_id, args):
+    conn = None
+    cursor = None
+    try:
+        try:
+            limit = parse_limit(args.get('limit'), settings.REVIEWS_PAGE_SIZE, settings.REVIEWS_PAGE_MAX)
+            cursor_token = args.get('cursor')
+            after = decode_cursor(cursor_token, 'reviews') if cursor_token else None
+        except ValueError:
+            return {'message': 'Tham số phân trang không hợp lệ!'}, 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return {'message': 'Không thể kết nối database!'}, 500
+        
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT 1 FROM Books WHERE book_id = ? AND status = 'approved'", (book_id,))
+        if not cursor.fetchone():
+            return {'message': 'Không tìm thấy sách!'}, 404
+        
+        reviews_list, next_cursor = _review_page(cursor, book_id, after, limit)
+        
+        return {'reviews': reviews_list, 'next_cursor': next_cursor}, 200
+        
+    except Exception as e:
+        print(f"Get book reviews error: {e}")
+        return {'message': 'Có lỗi xảy ra!'}, 500
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
-@app.route('/api/books/<int:book_id>/review', methods=['POST'])
+@api.route('/api/books/<int:book_id>/review', methods=['POST'])
 @token_required
 def add_review(current_user_id, book_id):
     """Thêm đánh giá sách"""
@@ -418,25 +1292,30 @@ def add_review(current_user_id, book_id):
         if not rating:
             return jsonify({'message': 'Vui lòng đánh giá!'}), 400
         
+        rating = ratings.parse_rating(rating)
+        if rating is None:
+            return jsonify({'message': 'Điểm đánh giá phải từ 1 đến 5!'}), 400
+        
         conn = get_db_connection()
         if not conn:
             return jsonify({'message': 'Không thể kết nối database!'}), 500
         
         cursor = conn.cursor()
         
-        cursor.execute("""
-            INSERT INTO Reviews (book_id, user_id, rating, comment, created_at)
-            VALUES (?, ?, ?, ?, GETDATE())
-        """, (book_id, current_user_id, rating, comment))
+        # Cập nhật tổng hợp rating của sách (O(1), không quét lại Reviews)
+        if not ratings.apply_review(cursor, book_id, rating):
+            return jsonify({'message': 'Không tìm thấy sách!'}), 404
         
-        # Cập nhật rating trung bình của sách
+        # Dòng 'reviews' riêng: không khóa dòng 'books' dùng chung với duyệt/ẩn/nhập sách
+        version = versions.bump(cursor, 'reviews')
         cursor.execute("""
-            UPDATE Books
-            SET rating = (SELECT AVG(CAST(rating AS FLOAT)) FROM Reviews WHERE book_id = ?)
-            WHERE book_id = ?
-        """, (book_id, book_id))
+            INSERT INTO Reviews (book_id, user_id, rating, comment, change_seq, created_at)
+            VALUES (?, ?, ?, ?, ?, GETDATE())
+        """, (book_id, current_user_id, rating, comment, version))
         
         conn.commit()
+        note_catalog_version('reviews', version)
+        invalidate_reviews(book_id)
         
         return jsonify({'message': 'Đánh giá thành công!'}), 201
         
@@ -453,10 +1332,10 @@ def add_review(current_user_id, book_id):
 
 # ==================== ORDER ROUTES (ĐÃ KHÔI PHỤC LOGIC TRỪ TỒN KHO TẠI ĐÂY) ====================
 
-@app.route('/api/orders', methods=['POST'])
+@api.route('/api/orders', methods=['POST'])
 @token_required
 def create_order(current_user_id):
-    """Tạo đơn hàng mới: TRỪ TỒN KHO NGAY LẬP TỨC"""
+    """Tạo đơn hàng mới: kiểm tra giá/tồn kho và TRỪ TỒN KHO NGAY LẬP TỨC (set-based)"""
     conn = None
     cursor = None
     try:
@@ -468,7 +1347,7 @@ def create_order(current_user_id):
         payment_method = data.get('payment_method', 'COD')
         notes = data.get('notes', '')
         
-        if not items or not total or not shipping_address or not phone:
+        if not items or not shipping_address or not phone:
             return jsonify({'message': 'Thông tin đơn hàng không hợp lệ!'}), 400
         
         conn = get_db_connection()
@@ -477,37 +1356,29 @@ def create_order(current_user_id):
         
         cursor = conn.cursor()
         
-        # 1. Tạo order
-        cursor.execute("""
-            INSERT INTO Orders (buyer_id, total_amount, status, shipping_address, phone, payment_method, notes, created_at)
-            OUTPUT INSERTED.order_id
-            VALUES (?, ?, 'pending', ?, ?, ?, ?, GETDATE())
-        """, (current_user_id, total, shipping_address, phone, payment_method, notes))
-        
-        order_id = cursor.fetchone()[0]
-        
-        # 2. Thêm order details VÀ TRỪ TỒN KHO
-        for item in items:
-            # TRỪ TỒN KHO (NHƯ YÊU CẦU CŨ CỦA BẠN)
-            cursor.execute("""
-                UPDATE Books
-                SET stock = stock - ?
-                WHERE book_id = ?
-            """, (item['quantity'], item['book_id']))
-            
-            cursor.execute("""
-                INSERT INTO OrderDetails (order_id, book_id, quantity, price)
-                VALUES (?, ?, ?, ?)
-            """, (order_id, item['book_id'], item['quantity'], item['price']))
-            
+        order_id, order_total, quantities = place_order(
+            cursor, storage, current_user_id, items, total, shipping_address,
+            phone, payment_method, notes, max_lines=settings.ORDER_MAX_LINES)
+        # Chỉ xếp đơn vào hàng đợi đồng mua (recommend.fold_queue); doanh số theo ngày
+        # được báo cáo tự tính lại từ Orders (analytics.refresh), không ghi ở đây
+        recommend.record_order(cursor, order_id, quantities, settings.RECOMMEND_MAX_ORDER_LINES)
         
         conn.commit()
+        if co_purchase.ready:
+            co_purchase.add_order(quantities, settings.RECOMMEND_MAX_ORDER_LINES)
+        invalidate_books(*quantities)
+        admin_stats_snapshot.add('orders')
         
         return jsonify({
             'message': 'Đặt hàng thành công! Tồn kho đã được trừ.',
-            'order_id': order_id
+            'order_id': order_id,
+            'total': float(order_total)
         }), 201
         
+    except OrderError as e:
+        if conn and not conn.autocommit:
+            conn.rollback()
+        return jsonify({'message': e.message, **e.details}), e.status
     except Exception as e:
         if conn and not conn.autocommit:
             conn.rollback() # Hoàn tác giao dịch nếu có lỗi (ví dụ: tồn kho âm)
@@ -519,41 +1390,32 @@ def create_order(current_user_id):
         if conn:
             conn.close()
 
-@app.route('/api/orders/user', methods=['GET'])
+@api.route('/api/orders/user', methods=['GET'])
 @token_required
 def get_user_orders(current_user_id):
-    """Lấy danh sách đơn hàng của user"""
+    """Lấy danh sách đơn hàng của user, phân trang keyset (?limit=&cursor=&include=items)"""
     conn = None
     cursor = None
     try:
+        try:
+            limit = parse_limit(request.args.get('limit'), settings.ORDERS_PAGE_SIZE, settings.ORDERS_PAGE_MAX)
+            cursor_token = request.args.get('cursor')
+            after = decode_cursor(cursor_token, 'orders') if cursor_token else None
+        except ValueError:
+            return jsonify({'message': 'Tham số phân trang không hợp lệ!'}), 400
+        include_items = 'items' in (request.args.get('include') or '').split(',')
+        
         conn = get_db_connection()
         if not conn:
             return jsonify({'message': 'Không thể kết nối database!'}), 500
         
         cursor = conn.cursor()
         
-        cursor.execute("""
-            SELECT order_id, total_amount, status, shipping_address, phone, payment_method, created_at
-            FROM Orders
-            WHERE buyer_id = ?
-            ORDER BY created_at DESC
-        """, (current_user_id,))
-        
-        orders = cursor.fetchall()
-        
-        orders_list = []
-        for order in orders:
-            orders_list.append({
-                'order_id': order[0],
-                'total_amount': float(order[1]) if order[1] else 0,
-                'status': order[2],
-                'shipping_address': order[3],
-                'phone': order[4],
-                'payment_method': order[5],
-                'created_at': order[6].strftime('%Y-%m-%d %H:%M:%S') if order[6] else None
-            })
+        orders_list, next_after = buyer_orders_page(
+            cursor, storage, current_user_id, after, limit, include_items=include_items)
+        next_cursor = encode_cursor('orders', *next_after) if next_after else None
         
-        return jsonify({'orders': orders_list}), 200
+        return jsonify({'orders': orders_list, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         print(f"Get user orders error: {e}")
@@ -566,15 +1428,18 @@ def get_user_orders(current_user_id):
 
 # ==================== CATEGORY ROUTES ====================
 
-@app.route('/api/categories', methods=['GET'])
+@api.route('/api/categories', methods=['GET'])
 def get_categories():
     """Lấy danh sách danh mục"""
+    return catalog_response('categories', ('categories',), _load_categories)
+
+def _load_categories():
     conn = None
     cursor = None
     try:
         conn = get_db_connection()
         if not conn:
-            return jsonify({'message': 'Không thể kết nối database!'}), 500
+            return {'message': 'Không thể kết nối database!'}, 500
         
         cursor = conn.cursor()
         cursor.execute("SELECT category_id, category_name FROM Categories")
@@ -587,18 +1452,18 @@ def get_categories():
                 'name': cat[1]
             })
         
-        return jsonify({'categories': categories_list}), 200
+        return {'categories': categories_list}, 200
         
     except Exception as e:
         print(f"Get categories error: {e}")
-        return jsonify({'message': 'Có lỗi xảy ra!'}), 500
+        return {'message': 'Có lỗi xảy ra!'}, 500
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
-@app.route('/api/categories', methods=['POST'])
+@api.route('/api/categories', methods=['POST'])
 @admin_required
 def create_category(current_user_id):
     """CHỨC NĂNG TẠO THỂ LOẠI MỚI"""
@@ -625,17 +1490,17 @@ def create_category(current_user_id):
         if cursor.fetchone():
             return jsonify({'message': 'Thể loại đã tồn tại. Vui lòng chọn tên khác!'}), 400
 
-        # INSERT vào bảng Categories và lấy ID mới tạo (OUTPUT INSERTED)
+        # INSERT vào bảng Categories và lấy ID mới tạo
         # Giả định bảng Categories có cột description
-        cursor.execute("""
+        new_id = storage.insert_returning_id(cursor, """
             INSERT INTO Categories (category_name, description, created_at)
-            OUTPUT INSERTED.category_id
             VALUES (?, ?, GETDATE())
-        """, (category_name.strip(), description))
-
-        new_id = cursor.fetchone()[0]
+        """, (category_name.strip(), description), 'category_id')
+        version = versions.bump(cursor, 'categories')
         
         conn.commit()
+        note_catalog_version('categories', version)
+        invalidate_categories()
 
         return jsonify({
             'message': f'Thêm thể loại "{category_name}" thành công!',
@@ -656,72 +1521,66 @@ def create_category(current_user_id):
 # ==================== ADMIN ENDPOINTS (KHÔI PHỤC VỀ TRẠNG THÁI KHÔNG TRẢ HÀNG) ====================
 
 # ADMIN STATS
-@app.route('/api/admin/stats', methods=['GET'])
-@admin_required
-def admin_stats(current_user_id):
-    conn = None
-    cursor = None
+def load_admin_stats():
+    """Đếm lại toàn bộ số liệu dashboard từ DB (dùng khi đối chiếu định kỳ)"""
+    conn = db_pool.acquire()
+    cursor = conn.cursor()
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'message': 'Không thể kết nối database!'}), 500
-
-        cursor = conn.cursor()
         cursor.execute("SELECT COUNT(*) FROM Users")
         users_count = cursor.fetchone()[0]
         cursor.execute("SELECT COUNT(*) FROM Books")
         books_count = cursor.fetchone()[0]
         cursor.execute("SELECT COUNT(*) FROM Orders")
         orders_count = cursor.fetchone()[0]
-        cursor.execute("SELECT ISNULL(SUM(total_amount),0) FROM Orders WHERE status = 'delivered'") 
+        cursor.execute("SELECT COALESCE(SUM(total_amount),0) FROM Orders WHERE status = 'delivered'") 
         revenue = cursor.fetchone()[0]
-
-        return jsonify({
+        return {
             'users': users_count,
             'books': books_count,
             'orders': orders_count,
             'revenue': float(revenue) if revenue is not None else 0
-        }), 200
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+admin_stats_snapshot = None
 
+@api.route('/api/admin/stats', methods=['GET'])
+@admin_required
+def admin_stats(current_user_id):
+    """Số liệu dashboard từ snapshot trong bộ nhớ (computed_at: lần đối chiếu DB gần nhất)"""
+    try:
+        return jsonify(admin_stats_snapshot.get()), 200
     except Exception as e:
         print(f"Admin stats error: {e}")
         return jsonify({'message': 'Có lỗi xảy ra!'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
 
 # ADMIN LIST USERS
-@app.route('/api/admin/users', methods=['GET'])
+def _user_row_to_dict(r):
+    return {
+        'id': r[0], 'fullname': r[1], 'email': r[2], 'phone': r[3], 'role': r[4], 'status': r[5], 'created_at': r[6].strftime('%Y-%m-%d %H:%M:%S') if r[6] else None
+    }
+
+@api.route('/api/admin/users', methods=['GET'])
 @admin_required
 def admin_list_users(current_user_id):
-    conn = None
-    cursor = None
+    """Danh sách người dùng, stream theo lô (JSON hoặc ?format=ndjson)"""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({'message': 'Không thể kết nối database!'}), 500
+    cursor = conn.cursor()
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'message': 'Không thể kết nối database!'}), 500
-        cursor = conn.cursor()
         cursor.execute("SELECT user_id, fullname, email, phone, role, status, created_at FROM Users ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        users = []
-        for r in rows:
-            users.append({
-                'id': r[0], 'fullname': r[1], 'email': r[2], 'phone': r[3], 'role': r[4], 'status': r[5], 'created_at': r[6].strftime('%Y-%m-%d %H:%M:%S') if r[6] else None
-            })
-        return jsonify({'users': users}), 200
     except Exception as e:
+        cursor.close()
         print(f"Admin list users error: {e}")
         return jsonify({'message': 'Có lỗi xảy ra!'}), 500
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    return stream_rows(cursor, 'users', _user_row_to_dict,
+                       batch_size=settings.STREAM_BATCH_SIZE, ndjson=wants_ndjson(request))
 
 # ADMIN LOCK USER
-@app.route('/api/admin/users/lock/<int:user_id>', methods=['POST'])
+@api.route('/api/admin/users/lock/<int:user_id>', methods=['POST'])
 @admin_required
 def admin_lock_user(current_user_id, user_id):
     conn = None
@@ -733,6 +1592,8 @@ def admin_lock_user(current_user_id, user_id):
         cursor = conn.cursor()
         cursor.execute("UPDATE Users SET status = 'locked' WHERE user_id = ?", (user_id,))
         conn.commit()
+        invalidate_principal(user_id)
+        revocation_list.revoke_user(user_id)
         return jsonify({'message': 'User locked'}), 200
     except Exception as e:
         print(f"Lock user error: {e}")
@@ -746,7 +1607,7 @@ def admin_lock_user(current_user_id, user_id):
             conn.close()
 
 # ADMIN UNLOCK USER
-@app.route('/api/admin/users/unlock/<int:user_id>', methods=['POST'])
+@api.route('/api/admin/users/unlock/<int:user_id>', methods=['POST'])
 @admin_required
 def admin_unlock_user(current_user_id, user_id):
     conn = None
@@ -758,6 +1619,7 @@ def admin_unlock_user(current_user_id, user_id):
         cursor = conn.cursor()
         cursor.execute("UPDATE Users SET status = 'active' WHERE user_id = ?", (user_id,))
         conn.commit()
+        invalidate_principal(user_id)
         return jsonify({'message': 'User unlocked'}), 200
     except Exception as e:
         print(f"Unlock user error: {e}")
@@ -771,22 +1633,98 @@ def admin_unlock_user(current_user_id, user_id):
             conn.close()
 
 # ADMIN LIST ORDERS
-@app.route('/api/admin/orders', methods=['GET'])
+def order_filter_sql(args, exclude=()):
+    """Điều kiện lọc đơn hàng cho admin: trả về (sql ' AND ...', params); ValueError nếu tham số sai.
+
+    date_from/date_to dạng YYYY-MM-DD, date_to tính cả ngày đó.
+    exclude: tên tham số bỏ qua (số liệu theo trạng thái không lọc theo status)
+    """
+    sql = ""
+    params = []
+    
+    status = args.get('status') if 'status' not in exclude else None
+    buyer_id = args.get('buyer_id')
+    date_from = args.get('date_from')
+    date_to = args.get('date_to')
+    min_total = args.get('min_total')
+    max_total = args.get('max_total')
+    
+    if status:
+        if status not in ORDER_STATUSES:
+            raise ValueError(f'status không hợp lệ: {status}')
+        sql += " AND o.status = ?"
+        params.append(status)
+    
+    if buyer_id:
+        sql += " AND o.buyer_id = ?"
+        params.append(int(buyer_id))
+    
+    if date_from:
+        sql += " AND o.created_at >= ?"
+        params.append(datetime.datetime.combine(datetime.date.fromisoformat(date_from), datetime.time()))
+    
+    if date_to:
+        sql += " AND o.created_at < ?"
+        params.append(datetime.datetime.combine(datetime.date.fromisoformat(date_to), datetime.time())
+                      + datetime.timedelta(days=1))
+    
+    if min_total:
+        sql += " AND o.total_amount >= ?"
+        params.append(float(min_total))
+    
+    if max_total:
+        sql += " AND o.total_amount <= ?"
+        params.append(float(max_total))
+    
+    return sql, params
+
+@api.route('/api/admin/orders', methods=['GET'])
 @admin_required
 def admin_list_orders(current_user_id):
+    """Tìm đơn hàng theo status, buyer_id, date_from/date_to, min_total/max_total.
+
+    JSON: một trang theo keyset (?limit=&cursor=), trang đầu kèm summary số đơn/tổng
+    tiền theo trạng thái. ?format=ndjson: stream toàn bộ đơn khớp bộ lọc (xuất file).
+    """
     conn = None
     cursor = None
     try:
+        try:
+            filter_sql, params = order_filter_sql(request.args)
+            limit = parse_limit(request.args.get('limit'), settings.ADMIN_ORDERS_PAGE_SIZE,
+                                settings.ADMIN_ORDERS_PAGE_MAX)
+            cursor_token = request.args.get('cursor')
+            after = decode_cursor(cursor_token, 'admin-orders') if cursor_token else None
+        except ValueError:
+            return jsonify({'message': 'Tham số lọc không hợp lệ!'}), 400
+        
         conn = get_db_connection()
         if not conn:
             return jsonify({'message': 'Không thể kết nối database!'}), 500
+        
         cursor = conn.cursor()
-        cursor.execute("SELECT order_id, buyer_id, total_amount, status, created_at FROM Orders ORDER BY created_at DESC")
-        rows = cursor.fetchall()
-        orders = []
-        for r in rows:
-            orders.append({'order_id': r[0], 'buyer_id': r[1], 'total_amount': r[2], 'status': r[3], 'created_at': r[4].strftime('%Y-%m-%d %H:%M:%S') if r[4] else None})
-        return jsonify({'orders': orders}), 200
+        
+        if wants_ndjson(request):
+            cursor.execute(f"SELECT {ORDER_COLUMNS} FROM Orders o WHERE 1 = 1" + filter_sql
+                           + " ORDER BY o.created_at DESC, o.order_id DESC", params)
+            streamed, cursor = cursor, None  # stream_rows đóng cursor khi gửi xong
+            return stream_rows(streamed, 'orders', order_row_to_dict,
+                               batch_size=settings.STREAM_BATCH_SIZE, ndjson=True)
+        
+        orders_list, next_after = orders_page(cursor, storage, filter_sql, params, after, limit,
+                                              include_items='items' in (request.args.get('include') or '').split(','))
+        result = {
+            'orders': orders_list,
+            'next_cursor': encode_cursor('admin-orders', *next_after) if next_after else None
+        }
+        
+        if not after:
+            # Số liệu theo trạng thái bỏ qua bộ lọc status để vẫn thấy kích thước từng hàng đợi
+            summary_sql, summary_params = order_filter_sql(request.args, exclude=('status',))
+            result['summary'] = order_summary(cursor, summary_sql, summary_params)
+        
+        return jsonify(result), 200
+        
     except Exception as e:
         print(f"Admin list orders error: {e}")
         return jsonify({'message': 'Có lỗi xảy ra!'}), 500
@@ -796,8 +1734,170 @@ def admin_list_orders(current_user_id):
         if conn:
             conn.close()
 
+# ADMIN UPDATE ORDER STATUS
+@api.route('/api/admin/orders/<int:order_id>/status', methods=['POST'])
+@admin_required
+def admin_update_order_status(current_user_id, order_id):
+    """Đổi trạng thái đơn hàng; doanh số theo ngày và doanh thu dashboard cập nhật theo"""
+    conn = None
+    cursor = None
+    try:
+        data = request.get_json() or {}
+        new_status = data.get('status')
+        if new_status not in ORDER_STATUSES:
+            return jsonify({'message': 'Trạng thái không hợp lệ!'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'message': 'Không thể kết nối database!'}), 500
+        
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT status, total_amount FROM Orders WHERE order_id = ?", (order_id,))
+        order = cursor.fetchone()
+        if not order:
+            return jsonify({'message': 'Không tìm thấy đơn hàng!'}), 404
+        old_status, total_amount = order
+        if old_status == new_status:
+            return jsonify({'message': 'Order status unchanged', 'status': new_status}), 200
+        if analytics.affects_sales(old_status, new_status):
+            analytics.lock(cursor)  # trước khi ghi Orders, cùng thứ tự khóa với analytics.refresh
+        
+        # Điều kiện theo trạng thái cũ: hai admin đổi cùng lúc thì chỉ một người thắng
+        cursor.execute("UPDATE Orders SET status = ? WHERE order_id = ? AND status = ?",
+                       (new_status, order_id, old_status))
+        if cursor.rowcount != 1:
+            conn.rollback()
+            return jsonify({'message': 'Đơn hàng vừa được cập nhật, vui lòng tải lại!'}), 409
+        analytics.apply_status_change(cursor, storage, order_id, old_status, new_status)
+        
+        conn.commit()
+        
+        amount = float(total_amount or 0)
+        if old_status == 'delivered':
+            admin_stats_snapshot.add('revenue', -amount)
+        if new_status == 'delivered':
+            admin_stats_snapshot.add('revenue', amount)
+        
+        return jsonify({'message': 'Order status updated', 'status': new_status}), 200
+        
+    except Exception as e:
+        print(f"Admin update order status error: {e}")
+        if conn and not conn.autocommit:
+            conn.rollback()
+        return jsonify({'message': 'Có lỗi xảy ra!'}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+# ADMIN SALES ANALYTICS
+_sales_refreshed_at = None  # time.monotonic() của lần tính lại SalesDaily gần nhất trong worker này
+
+def refresh_sales_rollup(conn, cursor):
+    """Đưa các đơn mới vào SalesDaily trước khi báo cáo (tối đa một lần mỗi ANALYTICS_REFRESH_INTERVAL giây)"""
+    global _sales_refreshed_at
+    now = time.monotonic()
+    if _sales_refreshed_at is not None and now - _sales_refreshed_at < settings.ANALYTICS_REFRESH_INTERVAL:
+        return
+    try:
+        analytics.refresh(cursor, storage)
+        conn.commit()
+        _sales_refreshed_at = now
+    except Exception as e:
+        # Vẫn trả báo cáo từ dữ liệu đã tổng hợp
+        print(f"Sales rollup refresh error: {e}")
+        conn.rollback()
+
+ANALYTICS_LABELS = {
+    'book': "SELECT book_id, title FROM Books WHERE 1 = 1",
+    'category': "SELECT category_id, category_name FROM Categories WHERE 1 = 1",
+    'seller': "SELECT user_id, fullname FROM Users WHERE 1 = 1",
+}
+ANALYTICS_LABEL_COLUMNS = {'book': 'book_id', 'category': 'category_id', 'seller': 'user_id'}
+
+@api.route('/api/admin/analytics', methods=['GET'])
+@admin_required
+def admin_analytics(current_user_id):
+    """Doanh số theo kỳ từ bảng SalesDaily.
+
+    ?dimension=all|book|category|seller&id=&date_from=&date_to=&granularity=day|week|month&top=
+    series: units/revenue/orders từng kỳ (của một id nếu có id, không thì toàn cửa hàng);
+    top: các sách/thể loại/người bán có doanh thu cao nhất trong khoảng ngày.
+    """
+    conn = None
+    cursor = None
+    try:
+        try:
+            args = request.args
+            dimension = args.get('dimension') or 'all'
+            granularity = args.get('granularity') or 'day'
+            if dimension not in analytics.DIMENSIONS or granularity not in analytics.GRANULARITIES:
+                raise ValueError(dimension)
+            date_to = datetime.date.fromisoformat(args['date_to']) if args.get('date_to') else datetime.date.today()
+            date_from = (datetime.date.fromisoformat(args['date_from']) if args.get('date_from')
+                         else date_to - datetime.timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1))
+            if date_from > date_to or (date_to - date_from).days >= settings.ANALYTICS_MAX_DAYS:
+                raise ValueError('date range')
+            dim_id = int(args['id']) if args.get('id') and dimension != 'all' else None
+            top = parse_limit(args.get('top'), settings.ANALYTICS_TOP_DEFAULT, 100)
+        except (KeyError, ValueError):
+            return jsonify({'message': f'Tham số báo cáo không hợp lệ (tối đa {settings.ANALYTICS_MAX_DAYS} ngày)!'}), 400
+        
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({'message': 'Không thể kết nối database!'}), 500
+        
+        cursor = conn.cursor()
+        refresh_sales_rollup(conn, cursor)
+        
+        if dim_id is not None:
+            series_rows = analytics.load_window(cursor, dimension, date_from, date_to, dim_id)
+        else:
+            series_rows = analytics.load_window(cursor, 'all', date_from, date_to)
+        series, _ = analytics.aggregate(series_rows, date_from, date_to, granularity)
+        
+        result = {
+            'dimension': dimension,
+            'id': dim_id,
+            'granularity': granularity,
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+            'series': [{'period': start.isoformat(), 'units': units, 'revenue': revenue, 'orders': orders}
+                       for start, units, revenue, orders in series],
+            'totals': {
+                'units': sum(item[1] for item in series),
+                'revenue': sum(item[2] for item in series),
+                'orders': sum(item[3] for item in series)
+            }
+        }
+        
+        if dimension != 'all' and dim_id is None:
+            _, ranked = analytics.aggregate(analytics.load_window(cursor, dimension, date_from, date_to),
+                                            date_from, date_to, granularity, top=top)
+            labels = {}
+            ids = [item[0] for item in ranked if item[0]]
+            if ids:
+                in_sql, in_params = id_list_sql(ANALYTICS_LABEL_COLUMNS[dimension], ids)
+                cursor.execute(ANALYTICS_LABELS[dimension] + in_sql, in_params)
+                labels = dict(cursor.fetchall())
+            result['top'] = [{'id': key, 'name': labels.get(key), 'units': units, 'revenue': revenue, 'orders': orders}
+                             for key, units, revenue, orders in ranked]
+        
+        return jsonify(result), 200
+        
+    except Exception as e:
+        print(f"Admin analytics error: {e}")
+        return jsonify({'message': 'Có lỗi xảy ra!'}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
 # ADMIN APPROVE BOOK
-@app.route('/api/admin/books/approve/<int:book_id>', methods=['POST'])
+@api.route('/api/admin/books/approve/<int:book_id>', methods=['POST'])
 @admin_required
 def admin_approve_book(current_user_id, book_id):
     conn = None
@@ -808,7 +1908,12 @@ def admin_approve_book(current_user_id, book_id):
             return jsonify({'message': 'Không thể kết nối database!'}), 500
         cursor = conn.cursor()
         cursor.execute("UPDATE Books SET status = 'approved' WHERE book_id = ?", (book_id,))
+        version = versions.mark_books(cursor, [book_id])
         conn.commit()
+        # Chỉ mục tìm kiếm của mọi worker (kể cả worker này) tự theo kịp qua change_seq
+        note_catalog_version('books', version)
+        refresh_similar_books(conn, cursor, book_id)
+        invalidate_books(book_id)
         return jsonify({'message': 'Book approved'}), 200
     except Exception as e:
         print(f"Approve book error: {e}")
@@ -822,7 +1927,7 @@ def admin_approve_book(current_user_id, book_id):
             conn.close()
 
 # ADMIN HIDE BOOK
-@app.route('/api/admin/books/hide/<int:book_id>', methods=['POST'])
+@api.route('/api/admin/books/hide/<int:book_id>', methods=['POST'])
 @admin_required
 def admin_hide_book(current_user_id, book_id):
     conn = None
@@ -833,7 +1938,11 @@ def admin_hide_book(current_user_id, book_id):
             return jsonify({'message': 'Không thể kết nối database!'}), 500
         cursor = conn.cursor()
         cursor.execute("UPDATE Books SET status = 'hidden' WHERE book_id = ?", (book_id,))
+        version = versions.mark_books(cursor, [book_id])
         conn.commit()
+        note_catalog_version('books', version)
+        refresh_similar_books(conn, cursor, book_id)
+        invalidate_books(book_id)
         return jsonify({'message': 'Book hidden'}), 200
     except Exception as e:
         print(f"Hide book error: {e}")
@@ -847,12 +1956,130 @@ def admin_hide_book(current_user_id, book_id):
             conn.close()
 
 
+# ADMIN METRICS
+@api.route('/api/admin/metrics', methods=['GET'])
+@admin_required
+def admin_metrics(current_user_id):
+    """Số liệu vận hành của process hiện tại (pool kết nối...)"""
+    return jsonify({
+        'db_pool': db_pool.stats(),
+        'catalog_cache': catalog_cache.stats(),
+        'principal_cache': principal_cache.stats(),
+        'revocations': revocation_list.stats(),
+        'co_purchase': co_purchase.stats(),
+        'similarity_model': similarity_model.stats(),
+    }), 200
+
+
 # Lệnh confirm_order và return_order đã được XÓA hoàn toàn khỏi Backend.
 
 
+# ==================== APP FACTORY ====================
+
+def init_services(cfg):
+    """Tạo pool, cache... theo cấu hình. Không mở kết nối hay đọc file nào:
+    mọi thứ nặng (kết nối DB, chỉ mục tìm kiếm, snapshot thu hồi token, Pillow)
+    chỉ được nạp khi lần đầu cần đến"""
+    global settings, storage, db_pool, principal_cache, revocation_list
+    global image_variants, catalog_cache, admin_stats_snapshot, co_purchase, similarity_model
+
+    settings = cfg
+    storage = get_storage(cfg)
+    db_pool = ConnectionPool(
+        storage.connect,
+        max_size=cfg.DB_POOL_SIZE,
+        timeout=cfg.DB_POOL_TIMEOUT,
+        max_lifetime=cfg.DB_POOL_MAX_LIFETIME,
+        max_idle=cfg.DB_POOL_MAX_IDLE,
+        ping_interval=cfg.DB_POOL_PING_INTERVAL,
+    )
+    principal_cache = LRUCache(maxsize=cfg.PRINCIPAL_CACHE_SIZE, ttl=cfg.PRINCIPAL_CACHE_TTL)
+    revocation_list = RevocationList(cfg.REVOCATION_SNAPSHOT_PATH,
+                                     token_lifetime=cfg.JWT_EXPIRATION_HOURS * 3600)
+    image_variants = images.VariantStore(cfg.IMAGE_CACHE_FOLDER,
+                                         max_concurrency=cfg.IMAGE_RESIZE_CONCURRENCY)
+    catalog_cache = LRUCache(maxsize=cfg.CATALOG_CACHE_SIZE, ttl=cfg.CATALOG_CACHE_TTL)
+    admin_stats_snapshot = StatsSnapshot(load_admin_stats, interval=cfg.STATS_RECONCILE_INTERVAL)
+    co_purchase = recommend.CoPurchaseIndex(top_k=cfg.RECOMMEND_TOP_K)
+    similarity_model = similar.SimilarityModel()
+
+def create_app(config_name=None):
+    """Tạo Flask app theo config_name ('development', 'production', 'testing');
+    mặc định lấy từ biến môi trường FLASK_CONFIG"""
+    cfg = get_config(config_name)
+    init_services(cfg)
+
+    app = Flask(__name__)
+    app.config.from_object(cfg)
+    CORS(app)
+    app.register_blueprint(api)
+    app.teardown_appcontext(release_db_connection)
+
+    # Thiết lập thư mục chứa file ảnh được upload
+    os.makedirs(UPLOAD_DIRECTORY, exist_ok=True)
+    return app
+
+# ==================== WORKER LIFECYCLE ====================
+
+def migrate_schema():
+    """Tạo bảng/cột/chỉ mục còn thiếu (kèm backfill dữ liệu cho cột mới) trước khi phục vụ.
+    Chỉ chạy khi bật DB_AUTO_MIGRATE; mặc định schema được cập nhật bằng python storage.py init"""
+    if not settings.DB_AUTO_MIGRATE:
+        return
+    conn = db_pool.acquire()
+    try:
+        storage.ensure_schema(conn)
+    except Exception as e:
+        print(f"Schema migration error: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def warm_up():
+    """Chạy một lần trong process cha trước khi fork (serve.py, preload):
+    dữ liệu nạp ở đây được các worker dùng chung theo copy-on-write"""
+    migrate_schema()
+    try:
+        load_search_index()
+    except Exception as e:
+        print(f"Search index build error: {e}")
+    try:
+        load_co_purchase()
+    except Exception as e:
+        print(f"Co-purchase index load error: {e}")
+    try:
+        load_similarity_model()
+    except Exception as e:
+        print(f"Similarity model build error: {e}")
+    # Không để worker thừa hưởng socket DB của process cha
+    db_pool.close_all()
+
+def init_worker(app):
+    """Chạy trong mỗi worker ngay sau fork: pool riêng, nạp sẵn kết nối và cache"""
+    db_pool.reset_after_fork()
+    try:
+        revocation_list.load()
+    except Exception as e:
+        print(f"Revocation snapshot load error: {e}")
+    ensure_co_purchase_refresher()
+    # Đi qua đúng route thật để mở kết nối đầu tiên và điền cache trang đầu catalog
+    with app.test_client() as client:
+        for path in ('/api/books', '/api/categories'):
+            response = client.get(path)
+            if response.status_code != 200:
+                print(f"Warm-up {path}: HTTP {response.status_code}")
+
 # ==================== MAIN ====================
 
 if __name__ == '__main__':
-    if not os.path.exists(UPLOAD_DIRECTORY):
-        os.makedirs(UPLOAD_DIRECTORY)
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app = create_app()
+    migrate_schema()
+    try:
+        load_search_index()
+    except Exception as e:
+        print(f"Search index build error: {e}")
+    try:
+        load_similarity_model()
+    except Exception as e:
+        print(f"Similarity model build error: {e}")
+    app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import time
+
+# Benchmark đặt hàng: số đơn/giây với giỏ 1, 10 và 50 đầu sách.
+# Mặc định chạy trên SQLite tạm để đo được trên mọi máy:
+#   python bench_orders.py [số đơn mỗi cỡ giỏ]
+# Đặt DB_BACKEND=sqlserver (và các biến DB_*) để đo trên SQL Server.
+
+CART_SIZES = (1, 10, 50)
+
+
+def main():
+    orders_per_size = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    if os.getenv('DB_BACKEND', 'sqlite') == 'sqlite':
+        os.environ['DB_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    import app as bookstore
+    from security import hash_password
+
+    app = bookstore.create_app()
+    db_pool = bookstore.db_pool
+
+    conn = db_pool.acquire()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO Users (fullname, email, phone, password, role, status, created_at) "
+                   "VALUES ('Bench', 'bench@local', '0', ?, 'buyer', 'active', GETDATE())",
+                   (hash_password('bench'),))
+    cursor.executemany("INSERT INTO Books (title, author, price, stock, status, created_at) "
+                       "VALUES (?, 'Bench', ?, 1000000, 'approved', GETDATE())",
+                       [(f'Bench book {i}', 10000 + i) for i in range(max(CART_SIZES))])
+    conn.commit()
+    cursor.execute("SELECT book_id, price FROM Books WHERE author = 'Bench' ORDER BY book_id")
+    books = [(row[0], float(row[1])) for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+
+    client = app.test_client()
+    token = client.post('/api/auth/login', json={'email': 'bench@local', 'password': 'bench'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    for size in CART_SIZES:
+        items = [{'book_id': book_id, 'quantity': 1, 'price': price} for book_id, price in books[:size]]
+        body = {'items': items, 'total': sum(price for _, price in books[:size]),
+                'shipping_address': 'Bench', 'phone': '0'}
+        started = time.perf_counter()
+        for _ in range(orders_per_size):
+            response = client.post('/api/orders', json=body, headers=headers)
+            if response.status_code != 201:
+                print(f'Lỗi đặt hàng ({size} dòng): {response.status_code} {response.get_json()}')
+                return
+        elapsed = time.perf_counter() - started
+        print(f'{size:>3} dòng/đơn: {orders_per_size / elapsed:8.1f} đơn/giây')
+
+
+if __name__ == '__main__':
+    main()
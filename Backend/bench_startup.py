@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+# Đo thời gian khởi động của backend (mỗi phép đo chạy trong một process mới):
+#   python bench_startup.py [số lần chạy]
+#   - thời gian tới request đầu tiên: import app -> create_app() -> GET đầu tiên
+#   - chi phí import từng module (python -X importtime), xếp theo thời gian tích lũy
+# Mặc định dùng SQLite tạm để đo được trên mọi máy; đặt DB_BACKEND=sqlserver để
+# đo với SQL Server.
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_MODULES = 15
+
+FIRST_REQUEST_SCRIPT = """
+import time
+started = time.perf_counter()
+import app as bookstore
+imported = time.perf_counter()
+flask_app = bookstore.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get('/api/categories')
+finished = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print(imported - started, created - imported, finished - created)
+"""
+
+
+def run(args, env):
+    return subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def measure_first_request(env, runs):
+    samples = []
+    for _ in range(runs):
+        output = run(['-c', FIRST_REQUEST_SCRIPT], env).stdout.split()
+        samples.append([float(value) for value in output[-3:]])
+    samples.sort(key=sum)
+    return samples[len(samples) // 2]  # trung vị theo tổng thời gian
+
+
+def measure_imports(env):
+    """[(module, tự thân µs, tích lũy µs)] từ output của -X importtime"""
+    stderr = run(['-X', 'importtime', '-c', 'import app'], env).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    env = dict(os.environ)
+    if env.get('DB_BACKEND', 'sqlite') == 'sqlite':
+        env['DB_BACKEND'] = 'sqlite'
+        env['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+    import_s, create_s, request_s = measure_first_request(env, runs)
+    print(f'Tới request đầu tiên (trung vị {runs} lần): {(import_s + create_s + request_s) * 1000:.1f} ms')
+    print(f'  import app      {import_s * 1000:8.1f} ms')
+    print(f'  create_app()    {create_s * 1000:8.1f} ms')
+    print(f'  request đầu     {request_s * 1000:8.1f} ms  (mở kết nối DB, tạo schema nếu cần)')
+
+    rows = measure_imports(env)
+    local = {os.path.splitext(name)[0] for name in os.listdir(BACKEND_DIR) if name.endswith('.py')}
+    print(f'\nImport tích lũy lớn nhất (top {TOP_MODULES}):')
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[:TOP_MODULES]:
+        print(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+    print('\nModule của dự án:')
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2]):
+        if name in local:
+            print(f'  {cumulative_us / 1000:8.1f} ms  (tự thân {self_us / 1000:.1f} ms)  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Cache LRU + TTL trong bộ nhớ của process, an toàn đa luồng.
+# Khóa là tuple, phần tử đầu là namespace (vd. ('books', ...), ('book', 12)),
+# nhờ vậy có thể xóa chính xác theo khóa hoặc theo cả namespace.
+# Mỗi lần xóa tăng "thế hệ" của namespace: giá trị nạp xong sau một lần xóa xảy ra
+# trong lúc đang nạp có thể đã cũ nên không được lưu.
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Cache có giới hạn số phần tử (LRU) và thời gian sống (TTL)"""
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (hết hạn lúc, giá trị)
+        self._generations = {}      # namespace -> số lần bị xóa
+        self._epoch = 0             # số lần clear()
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+            'stale_loads': 0,
+        }
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self._counters['hits'] += 1
+            return value
+
+    def generation(self, namespace):
+        with self._lock:
+            return self._epoch, self._generations.get(namespace, 0)
+
+    def set(self, key, value, ttl=None, generation=None):
+        """Lưu giá trị; nếu có generation (lấy từ generation() trước khi nạp) mà namespace
+        đã bị xóa từ đó tới nay thì bỏ qua, trả về False"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key[0], 0)):
+                self._counters['stale_loads'] += 1
+                return False
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._counters['evictions'] += 1
+        return True
+
+    def get_or_load(self, key, loader):
+        """Read-through: trả giá trị trong cache hoặc gọi loader() rồi lưu lại.
+
+        loader trả về (giá trị, có_lưu_cache); lỗi hoặc kết quả tạm thời
+        không nên được lưu.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        generation = self.generation(key[0])
+        value, cacheable = loader()
+        if cacheable:
+            self.set(key, value, generation=generation)
+        return value
+
+    def delete(self, key):
+        with self._lock:
+            self._generations[key[0]] = self._generations.get(key[0], 0) + 1
+            if self._data.pop(key, None) is not None:
+                self._counters['invalidations'] += 1
+
+    def delete_namespace(self, namespace, match=None):
+        """Xóa mọi khóa có phần tử đầu là namespace (chỉ các khóa có match(key) đúng nếu có match)"""
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            keys = [key for key in self._data if key[0] == namespace and (match is None or match(key))]
+            for key in keys:
+                del self._data[key]
+            self._counters['invalidations'] += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._counters['invalidations'] += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data['size'] = len(self._data)
+            data['maxsize'] = self.maxsize
+        lookups = data['hits'] + data['misses']
+        data['hit_ratio'] = data['hits'] / lookups if lookups else 0.0
+        return data
+
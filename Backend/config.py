@@ -12,27 +12,127 @@ class Config:
     DB_NAME = os.getenv('DB_NAME', 'BookStoreDB')
     DB_USER = os.getenv('DB_USER', 'sa')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'your_password')
+    USE_WINDOWS_AUTH = os.getenv('USE_WINDOWS_AUTH', 'false').lower() == 'true'
+    DB_DRIVER = os.getenv('DB_DRIVER', 'SQL Server')  # vd. 'ODBC Driver 18 for SQL Server' trên Linux
     
     # Connection String
-    @staticmethod
-    def get_connection_string():
+    @classmethod
+    def get_connection_string(cls):
+        if cls.USE_WINDOWS_AUTH:
+            return (
+                f'DRIVER={{{cls.DB_DRIVER}}};'
+                f'SERVER={cls.DB_SERVER};'
+                f'DATABASE={cls.DB_NAME};'
+                f'Trusted_Connection=yes;'
+            )
         return (
-            f'DRIVER={{SQL Server}};'
-            f'SERVER={Config.DB_SERVER};'
-            f'DATABASE={Config.DB_NAME};'
-            f'UID={Config.DB_USER};'
-            f'PWD={Config.DB_PASSWORD};'
+            f'DRIVER={{{cls.DB_DRIVER}}};'
+            f'SERVER={cls.DB_SERVER};'
+            f'DATABASE={cls.DB_NAME};'
+            f'UID={cls.DB_USER};'
+            f'PWD={cls.DB_PASSWORD};'
             f'Trusted_Connection=no;'
         )
     
+    # Storage backend: 'sqlserver' (mặc định) hoặc 'sqlite' để chạy/benchmark trên Linux
+    DB_BACKEND = os.getenv('DB_BACKEND', 'sqlserver')
+    SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bookstore.db'))
+    
+    # Connection Pool
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))          # giây chờ tối đa khi pool đầy
+    DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))
+    DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))
+    DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', '30'))
+    # Tạo bảng/cột/chỉ mục còn thiếu khi khởi động app; tắt thì chạy tay python storage.py init
+    DB_AUTO_MIGRATE = os.getenv('DB_AUTO_MIGRATE', 'false').lower() == 'true'
+    
+    # Phân trang /api/books
+    BOOKS_PAGE_SIZE = 24
+    BOOKS_PAGE_MAX = 100
+    SEARCH_MAX_HITS = 1000  # số kết quả tối đa khi xếp theo độ liên quan
+    SEARCH_ID_LIST_MAX = 1000  # nhiều hơn thì sắp xếp khác lọc kết quả tìm kiếm khi duyệt DB thay vì IN (...)
+    # Ranh giới các khoảng giá của facet /api/books/facets (VND, tăng dần)
+    FACET_PRICE_BOUNDS = (50000, 100000, 200000, 500000)
+    # Số id tối đa mỗi lần gọi /api/books/batch
+    BOOK_BATCH_MAX_IDS = 100
+    # Đánh giá: /api/books/<id>/reviews và số review mới nhất kèm theo chi tiết sách
+    REVIEWS_PAGE_SIZE = 10
+    REVIEWS_PAGE_MAX = 50
+    REVIEW_SUMMARY_LATEST = 3
+    
+    # Lịch sử đơn hàng /api/orders/user
+    ORDERS_PAGE_SIZE = 20
+    ORDERS_PAGE_MAX = 100
+    
+    # Tìm kiếm đơn hàng cho admin /api/admin/orders
+    ADMIN_ORDERS_PAGE_SIZE = 50
+    ADMIN_ORDERS_PAGE_MAX = 500
+    
+    # Báo cáo doanh số /api/admin/analytics (đọc từ bảng SalesDaily)
+    ANALYTICS_DEFAULT_DAYS = 30
+    ANALYTICS_MAX_DAYS = 731
+    ANALYTICS_TOP_DEFAULT = 10
+    # Báo cáo tính lại các ngày gần nhất của SalesDaily tối đa một lần mỗi chừng này giây (0 = mỗi request)
+    ANALYTICS_REFRESH_INTERVAL = float(os.getenv('ANALYTICS_REFRESH_INTERVAL', '30'))
+    
+    # "Khách hàng cũng mua" /api/books/<id>/also-bought (xem recommend.py)
+    RECOMMEND_TOP_K = 20               # số hàng xóm tính sẵn cho mỗi sách
+    RECOMMEND_DEFAULT_LIMIT = 6
+    RECOMMEND_MAX_ORDER_LINES = 20     # đơn nhiều đầu sách hơn không tính cặp
+    RECOMMEND_RELOAD_INTERVAL = float(os.getenv('RECOMMEND_RELOAD_INTERVAL', '600'))  # giây giữa hai lần thread nền gộp hàng đợi/nạp lại
+    
+    # "Sách tương tự" /api/books/<id>/similar (TF-IDF, xem similar.py)
+    SIMILAR_TOP_K = 20
+    SIMILAR_DEFAULT_LIMIT = 6
+    SIMILAR_MIN_SCORE = 0.05           # cosine thấp hơn coi như không liên quan
+    SIMILAR_BATCH_SIZE = int(os.getenv('SIMILAR_BATCH_SIZE', '256'))  # số dòng mỗi phép nhân khi rebuild
+    
+    # Cache danh mục sách (/api/books, /api/books/<id>, /api/categories)
+    CATALOG_CACHE_SIZE = int(os.getenv('CATALOG_CACHE_SIZE', '2048'))
+    CATALOG_CACHE_TTL = float(os.getenv('CATALOG_CACHE_TTL', '300'))  # giây
+    CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', '0'))  # max-age của Cache-Control; 0 = luôn hỏi lại bằng ETag
+    # Chu kỳ (giây) đọc CatalogVersions để thấy thay đổi do worker khác ghi; 0 = mỗi request
+    CATALOG_VERSION_CHECK_INTERVAL = float(os.getenv('CATALOG_VERSION_CHECK_INTERVAL', '1'))
+    
+    # Số đầu sách tối đa mỗi đơn (giữ số tham số SQL dưới giới hạn 2100 của SQL Server)
+    ORDER_MAX_LINES = 100
+    
+    # Số dòng mỗi lô (một executemany + một commit) của import_catalog.py
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', '1000'))
+    
+    # Số dòng mỗi lần fetchmany() khi stream danh sách lớn
+    STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '500'))
+    
+    # Số liệu dashboard admin: chu kỳ (giây) đối chiếu lại với DB, 0 = tắt thread nền
+    STATS_RECONCILE_INTERVAL = float(os.getenv('STATS_RECONCILE_INTERVAL', '300'))
+    
     # JWT Configuration
     JWT_EXPIRATION_HOURS = 24
     
+    # Cache (role, status) người dùng cho token_required/admin_required
+    PRINCIPAL_CACHE_SIZE = int(os.getenv('PRINCIPAL_CACHE_SIZE', '10000'))
+    PRINCIPAL_CACHE_TTL = float(os.getenv('PRINCIPAL_CACHE_TTL', '30'))
+    
+    # Snapshot danh sách token bị thu hồi (đăng xuất/khóa tài khoản), dùng chung giữa các worker
+    REVOCATION_SNAPSHOT_PATH = os.getenv('REVOCATION_SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'revocations.json'))
+    
     # File Upload
     UPLOAD_FOLDER = 'uploads'
+    # Bản thu nhỏ/WebP của ảnh bìa, tạo khi có yêu cầu đầu tiên
+    IMAGE_CACHE_FOLDER = os.getenv('IMAGE_CACHE_FOLDER', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache'))
+    IMAGE_RESIZE_CONCURRENCY = int(os.getenv('IMAGE_RESIZE_CONCURRENCY', '2'))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     
+    # Chạy production (serve.py): số worker mặc định 2 x CPU + 1, mỗi worker nhiều thread
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', '0'))  # 0 = tự tính theo số CPU
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '30'))
+    WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30'))
+    WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', '0'))  # >0: tái tạo worker sau N request
+    
     # CORS
     CORS_ORIGINS = ['http://localhost:3000', 'http://127.0.0.1:5500']
 
@@ -67,4 +167,11 @@ config = {
     'production': ProductionConfig,
     'testing': TestingConfig,
     'default': DevelopmentConfig
-}
\ No newline at end of file
+}
+
+def get_config(name=None):
+    """Lớp cấu hình theo tên; mặc định lấy từ biến môi trường FLASK_CONFIG"""
+    name = name or os.getenv('FLASK_CONFIG', 'default')
+    if name not in config:
+        raise ValueError(f'Cấu hình không hợp lệ: {name}')
+    return config[name]
@@ -0,0 +1,276 @@
+import threading
+import time
+from collections import deque
+
+# Pool kết nối dùng chung cho toàn bộ process. Module này không phụ thuộc Flask
+# để các script (seed, import) cũng có thể mượn kết nối.
+
+
+class PoolTimeout(Exception):
+    """Hết thời gian chờ mượn kết nối từ pool"""
+
+
+class PooledConnection:
+    """Bọc kết nối DB-API: close() trả kết nối về pool thay vì đóng hẳn"""
+
+    def __init__(self, pool, raw):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, 'created_at', time.monotonic())
+        object.__setattr__(self, 'last_used', time.monotonic())
+        object.__setattr__(self, 'request_scoped', False)
+        object.__setattr__(self, 'checked_out', False)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __setattr__(self, name, value):
+        if name in ('last_used', 'request_scoped', 'checked_out'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._raw, name, value)
+
+    def close(self):
+        # Kết nối gắn với request chỉ được trả về pool khi request kết thúc
+        if self.request_scoped:
+            return
+        self.release()
+
+    def release(self):
+        if self.checked_out:
+            self._pool.release(self)
+
+
+class ConnectionPool:
+    """Pool kết nối có giới hạn, an toàn đa luồng.
+
+    - checkout/return qua acquire()/release()
+    - kiểm tra sức khỏe (SELECT 1) khi mượn kết nối đã nằm yên quá ping_interval
+    - loại bỏ kết nối sống quá max_lifetime hoặc nằm yên quá max_idle (khi mượn, và quét
+      toàn bộ kết nối rảnh khi trả về, tối đa một lần mỗi ping_interval giây)
+    - đóng kết nối thật luôn diễn ra ngoài lock
+    - thống kê thời gian chờ qua stats()
+    """
+
+    def __init__(self, connect, max_size=10, timeout=5.0, max_lifetime=1800.0,
+                 max_idle=300.0, ping_interval=30.0):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._next_eviction = 0.0
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'health_check_failures': 0,
+        }
+
+    # ---------- checkout / return ----------
+
+    def acquire(self, timeout=None):
+        """Mượn một kết nối; chờ tối đa `timeout` giây nếu pool đã đầy"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+        timed_out = False
+        expired = []
+
+        with self._cond:
+            while True:
+                conn = self._pop_idle_locked(expired)
+                if conn is not None:
+                    break
+                if self._size < self.max_size:
+                    # Giữ chỗ trước, kết nối thật được mở bên ngoài lock
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    timed_out = True
+                    break
+                waited = True
+                self._cond.wait(remaining)
+
+            if not timed_out:
+                wait_time = time.monotonic() - started
+                self._metrics['checkouts'] += 1
+                if waited:
+                    self._metrics['waits'] += 1
+                    self._metrics['wait_time_total'] += wait_time
+                    self._metrics['wait_time_max'] = max(self._metrics['wait_time_max'], wait_time)
+
+        for stale in expired:
+            self._close_raw(stale)
+        if timed_out:
+            raise PoolTimeout(f'Không mượn được kết nối sau {timeout:.1f}s')
+
+        if conn is None:
+            conn = self._open()
+        elif not self._is_healthy(conn):
+            self._close_raw(conn)
+            conn = self._open()
+
+        conn.checked_out = True
+        return conn
+
+    def release(self, conn, broken=False):
+        """Trả kết nối về pool; transaction dở dang sẽ bị rollback"""
+        conn.checked_out = False
+        conn.request_scoped = False
+        if not broken:
+            try:
+                if not conn.autocommit:
+                    conn.rollback()
+            except Exception:
+                broken = True
+
+        now = time.monotonic()
+        if broken or now - conn.created_at > self.max_lifetime:
+            self._close_raw(conn)
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            return
+
+        conn.last_used = now
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+            evict = now >= self._next_eviction
+        if evict:
+            self.evict_idle()
+
+    # ---------- bảo trì ----------
+
+    def evict_idle(self):
+        """Đóng các kết nối nằm yên quá max_idle hoặc quá max_lifetime"""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            self._next_eviction = now + self.ping_interval
+            keep = deque()
+            for conn in self._idle:
+                if now - conn.last_used > self.max_idle or now - conn.created_at > self.max_lifetime:
+                    expired.append(conn)
+                else:
+                    keep.append(conn)
+            self._idle = keep
+            self._size -= len(expired)
+            if expired:
+                self._cond.notify(len(expired))
+        for conn in expired:
+            self._close_raw(conn)
+        return len(expired)
+
+    def close_all(self):
+        """Đóng toàn bộ kết nối đang rảnh (vd. sau khi fork worker)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_raw(conn)
+
+    def reset_after_fork(self):
+        """Gọi trong process con sau fork(): bỏ (không đóng) các kết nối thừa hưởng
+        từ process cha vì socket của chúng vẫn thuộc về process cha"""
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._next_eviction = 0.0
+        for name in self._metrics:
+            self._metrics[name] = 0.0 if isinstance(self._metrics[name], float) else 0
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._metrics)
+            data['size'] = self._size
+            data['idle'] = len(self._idle)
+            data['in_use'] = self._size - len(self._idle)
+            data['max_size'] = self.max_size
+        data['wait_time_avg'] = data['wait_time_total'] / data['waits'] if data['waits'] else 0.0
+        return data
+
+    # ---------- nội bộ ----------
+
+    def _pop_idle_locked(self, expired):
+        """Lấy kết nối rảnh còn dùng được; kết nối hết hạn được đưa vào expired để caller
+        đóng sau khi nhả lock"""
+        now = time.monotonic()
+        while self._idle:
+            # LIFO: kết nối vừa dùng xong có khả năng còn "nóng" nhất
+            conn = self._idle.pop()
+            if now - conn.last_used > self.max_idle or now - conn.created_at > self.max_lifetime:
+                self._size -= 1
+                expired.append(conn)
+                continue
+            return conn
+        return None
+
+    def _open(self):
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._metrics['created'] += 1
+        return PooledConnection(self, raw)
+
+    def _is_healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.ping_interval:
+            return True
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            return True
+        except Exception:
+            with self._cond:
+                self._metrics['health_check_failures'] += 1
+            return False
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def _close_raw(self, conn):
+        try:
+            conn._raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._metrics['closed'] += 1
+
+
+def open_connection(cfg=None):
+    """Mở một kết nối riêng (không qua pool) cho script CLI như seed/import.
+
+    Không cần Flask; trả về None nếu không kết nối được.
+    """
+    from config import get_config
+    from storage import get_storage
+    try:
+        return get_storage(cfg or get_config()).connect()
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
@@ -0,0 +1,59 @@
+# Đếm facet cho /api/books/facets trong một truy vấn:
+#   SELECT category, condition, price_bucket, publish_year, COUNT(*) ... GROUP BY cả bốn
+# rồi cộng dồn từng facet trong Python. Số nhóm nhỏ (vài thể loại x vài tình
+# trạng x vài khoảng giá x số năm), nên cộng dồn gần như không tốn gì.
+#
+# Thể loại và tình trạng được đếm kiểu "disjunctive": bộ lọc của chính facet đó
+# không áp vào số đếm của nó (đang xem "Văn học" vẫn thấy "Kinh tế" có bao nhiêu
+# sách), nhưng vẫn áp vào các facet còn lại. Vì vậy hai bộ lọc này không đưa vào
+# SQL mà lọc trên các nhóm đã GROUP BY.
+
+FACET_NAMES = ('category', 'condition', 'price', 'publish_year')
+
+
+def price_bucket_sql(column, bounds):
+    """Biểu thức CASE trả về chỉ số khoảng giá (0..len(bounds)); bounds là số nguyên tăng dần"""
+    whens = " ".join(f"WHEN {column} < {int(bound)} THEN {i}" for i, bound in enumerate(bounds))
+    return f"CASE {whens} ELSE {len(bounds)} END"
+
+
+def price_buckets(bounds):
+    """[(nhãn, min, max)] theo thứ tự; max None là khoảng cuối không giới hạn"""
+    edges = [0] + [int(bound) for bound in bounds]
+    buckets = [(f"{low}-{high}", low, high) for low, high in zip(edges, edges[1:])]
+    buckets.append((f"{edges[-1]}+", edges[-1], None))
+    return buckets
+
+
+def rollup(rows, bounds, category=None, condition=None):
+    """rows: (category, condition, price_bucket, publish_year, count) đã GROUP BY"""
+    counts = {name: {} for name in FACET_NAMES}
+    total = 0
+    for row_category, row_condition, bucket, year, count in rows:
+        in_category = not category or row_category == category
+        in_condition = not condition or row_condition == condition
+        if in_condition and row_category is not None:
+            counts['category'][row_category] = counts['category'].get(row_category, 0) + count
+        if in_category and row_condition is not None:
+            counts['condition'][row_condition] = counts['condition'].get(row_condition, 0) + count
+        if in_category and in_condition:
+            total += count
+            counts['price'][bucket] = counts['price'].get(bucket, 0) + count
+            if year is not None:
+                counts['publish_year'][year] = counts['publish_year'].get(year, 0) + count
+
+    def by_count(facet):
+        return [{'value': value, 'count': n}
+                for value, n in sorted(counts[facet].items(), key=lambda item: (-item[1], str(item[0])))]
+
+    return {
+        'total': total,
+        'facets': {
+            'category': by_count('category'),
+            'condition': by_count('condition'),
+            'price': [{'value': label, 'min': low, 'max': high, 'count': counts['price'].get(i, 0)}
+                      for i, (label, low, high) in enumerate(price_buckets(bounds))],
+            'publish_year': [{'value': year, 'count': n}
+                             for year, n in sorted(counts['publish_year'].items(), reverse=True)],
+        },
+    }
@@ -0,0 +1,131 @@
+import os
+import threading
+
+# Ảnh bìa theo kích thước hiển thị: /api/uploads/<file>?size=grid&format=webp
+# Bản thu nhỏ được tạo ở lần yêu cầu đầu tiên rồi lưu trên đĩa; số ảnh resize
+# cùng lúc bị giới hạn bằng semaphore để không chiếm hết CPU/RAM của worker.
+# Pillow là tùy chọn: thiếu Pillow thì route trả về ảnh gốc như trước.
+
+_pil = None
+
+
+def _load_pil():
+    # Import Pillow ở lần resize đầu tiên (tốn ~50ms), không làm chậm lúc khởi động
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image, ImageOps
+            _pil = (Image, ImageOps)
+        except ImportError:
+            _pil = False
+    return _pil
+
+# Khung giới hạn (rộng, cao), lớn hơn kích thước CSS một chút để ảnh vẫn nét trên màn hình HiDPI
+VARIANT_SIZES = {
+    'grid': (300, 450),     # .book-image cao 300px
+    'detail': (600, 900),   # .book-detail-image cao 450px
+    'admin': (240, 320),    # .book-row img 120x160, .related-book img
+}
+
+# format -> (định dạng Pillow, đuôi file, mimetype)
+OUTPUT_FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp'),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg'),
+    'png': ('PNG', 'png', 'image/png'),
+}
+SOURCE_FORMATS = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.webp': 'webp'}
+
+SAVE_OPTIONS = {
+    'WEBP': {'quality': 75, 'method': 4},
+    'JPEG': {'quality': 82, 'optimize': True, 'progressive': True},
+    'PNG': {'optimize': True},
+}
+
+
+class VariantError(ValueError):
+    """Tham số size/format không hợp lệ"""
+
+
+def available():
+    return bool(_load_pil())
+
+
+def choose_format(filename, requested, accept_webp):
+    """Định dạng đầu ra: 'auto' chọn WebP nếu trình duyệt nhận, không thì giữ định dạng gốc"""
+    source = SOURCE_FORMATS.get(os.path.splitext(filename)[1].lower())
+    if source is None:
+        return None  # gif, svg... trả về file gốc
+    if requested in (None, '', 'original'):
+        return source
+    if requested == 'auto':
+        return 'webp' if accept_webp else source
+    if requested not in OUTPUT_FORMATS:
+        raise VariantError(f'format không hợp lệ: {requested}')
+    return requested
+
+
+class VariantStore:
+    """Tạo và lưu bản thu nhỏ trong cache_dir/<size>/"""
+
+    def __init__(self, cache_dir, max_concurrency=2, lock_stripes=64):
+        self.cache_dir = cache_dir
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        # Số lock cố định, chia theo hash đường dẫn: bộ nhớ không tăng theo số ảnh
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+
+    def _lock_for(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    def get(self, source_path, filename, size, fmt):
+        """Đường dẫn (tương đối với cache_dir) tới bản thu nhỏ, tạo nếu chưa có hoặc đã cũ.
+
+        Trả về None nếu bản thu nhỏ không nhỏ hơn ảnh gốc (ảnh gốc vốn đã nhỏ).
+        """
+        if size not in VARIANT_SIZES:
+            raise VariantError(f'size không hợp lệ: {size}')
+        pil_format, ext, _ = OUTPUT_FORMATS[fmt]
+        rel_path = os.path.join(size, f'{filename}.{ext}')
+        target = os.path.join(self.cache_dir, rel_path)
+
+        source = os.stat(source_path)
+        variant = self._fresh(target, source.st_mtime_ns)
+        if variant is None:
+            # Cùng bản thu nhỏ luôn vào cùng một lock: nhiều request cùng lúc chỉ resize một lần
+            with self._lock_for(target):
+                variant = self._fresh(target, source.st_mtime_ns)
+                if variant is None:
+                    with self._semaphore:
+                        self._render(source_path, target, VARIANT_SIZES[size], pil_format)
+                    variant = os.stat(target)
+        return rel_path if variant.st_size < source.st_size else None
+
+    @staticmethod
+    def _fresh(target, source_mtime):
+        """stat của bản thu nhỏ nếu đã có và mới hơn ảnh gốc"""
+        try:
+            variant = os.stat(target)
+        except FileNotFoundError:
+            return None
+        return variant if variant.st_mtime_ns >= source_mtime else None
+
+    @staticmethod
+    def _render(source_path, target, box, pil_format):
+        Image, ImageOps = _load_pil()
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with Image.open(source_path) as img:
+                img.draft('RGB', box)  # JPEG: giải mã thẳng ở độ phân giải thấp hơn, nhanh hơn nhiều
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail(box, Image.LANCZOS)
+                if pil_format == 'JPEG' and img.mode != 'RGB':
+                    img = img.convert('RGB')
+                img.save(tmp_path, pil_format, **SAVE_OPTIONS[pil_format])
+            os.replace(tmp_path, target)
+        except BaseException:
+            # Ảnh hỏng/lỗi encode: không để lại file .tmp dở dang
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
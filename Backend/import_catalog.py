@@ -0,0 +1,295 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import versions
+
+# Nhập danh mục sách số lượng lớn từ file CSV hoặc JSONL (mỗi dòng một object):
+#   python import_catalog.py sach.csv [--chunk-size 1000] [--seller email] [--status approved] [--restart]
+# Cột/khóa: title (bắt buộc), author, price, old_price, description, stock, rating,
+# image_url, category_name, isbn, condition, publisher, publish_year.
+# - Đọc file theo luồng, mỗi lô chunk_size dòng là một executemany (fast_executemany
+#   với pyodbc) và một commit
+# - Thể loại và sách đã có (theo ISBN; dòng không có ISBN thì theo tên sách) được tra trong
+#   các map nạp một lần lúc bắt đầu, không SELECT từng dòng
+# - Sau mỗi lô ghi checkpoint cạnh file nguồn; chạy lại cùng lệnh sẽ tiếp tục từ lô
+#   chưa commit. Lô bị chạy lại sau sự cố không tạo sách trùng vì đã có trong map.
+
+BOOK_COLUMNS = ('title', 'author', 'price', 'old_price', 'description', 'stock', 'rating',
+                'image_url', 'category_id', 'seller_id', 'isbn', 'condition', 'publisher',
+                'publish_year', 'status')
+
+INSERT_BOOK_SQL = (f"INSERT INTO Books ({', '.join(BOOK_COLUMNS)}, change_seq, created_at) "
+                   f"VALUES ({', '.join('?' * len(BOOK_COLUMNS))}, ?, GETDATE())")
+
+
+def read_records(path):
+    """Các dict sách trong file .csv hoặc .jsonl, đọc dần từng dòng"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            for record in csv.DictReader(f):
+                yield record
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _text(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _number(value, convert, default=None):
+    value = _text(value)
+    return convert(value) if value is not None else default
+
+
+def normalize_isbn(value):
+    """'978-1501175466' -> '9781501175466' (khóa so trùng)"""
+    value = _text(value)
+    return value.replace('-', '').replace(' ', '').upper() if value else None
+
+
+def _title_key(title):
+    return ' '.join(title.split()).casefold()
+
+
+class CatalogImporter:
+    """Chèn sách theo lô qua một kết nối; giữ map thể loại và khóa sách đã có trong bộ nhớ"""
+
+    def __init__(self, conn, seller_id=None, status='approved'):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        if hasattr(self.cursor, 'fast_executemany'):
+            self.cursor.fast_executemany = True  # pyodbc: gửi cả lô trong một lần
+        self.seller_id = seller_id
+        self.status = status
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = 0
+        self._categories = {}
+        self._isbns = set()
+        self._titles = set()
+        self._load_maps()
+
+    def _load_maps(self):
+        self.cursor.execute("SELECT category_id, category_name FROM Categories")
+        for category_id, name in self.cursor.fetchall():
+            self._categories.setdefault(name, category_id)
+        self.cursor.execute("SELECT isbn, title FROM Books")
+        for isbn, title in self.cursor.fetchall():
+            if normalize_isbn(isbn):
+                self._isbns.add(normalize_isbn(isbn))
+            if title:
+                self._titles.add(_title_key(title))
+
+    def _category_ids(self, names):
+        """Tạo các thể loại chưa có (một executemany) và trả về id của mọi tên"""
+        missing = sorted({name for name in names if name and name not in self._categories})
+        if missing:
+            self.cursor.executemany("INSERT INTO Categories (category_name, created_at) VALUES (?, GETDATE())",
+                                    [(name,) for name in missing])
+            self.cursor.execute(
+                f"SELECT category_id, category_name FROM Categories "
+                f"WHERE category_name IN ({', '.join('?' * len(missing))})", missing)
+            for category_id, name in self.cursor.fetchall():
+                self._categories.setdefault(name, category_id)
+        return self._categories
+
+    def _book_row(self, record, categories):
+        title = _text(record.get('title'))
+        if not title:
+            raise ValueError('thiếu title')
+        return (
+            title,
+            _text(record.get('author')),
+            _number(record.get('price'), float, 0),
+            _number(record.get('old_price'), float),
+            _text(record.get('description')),
+            _number(record.get('stock'), int, 0),
+            _number(record.get('rating'), float, 0),
+            _text(record.get('image_url')),
+            categories.get(_text(record.get('category_name'))),
+            self.seller_id,
+            _text(record.get('isbn')),
+            _text(record.get('condition')) or 'new',
+            _text(record.get('publisher')),
+            _number(record.get('publish_year'), int),
+            self.status,
+        )
+
+    def import_chunk(self, records, first_number=1):
+        """Chèn một lô (list dict) trong một transaction; trả về số sách đã thêm"""
+        categories = self._category_ids(_text(record.get('category_name')) for record in records)
+        rows = []
+        for number, record in enumerate(records, first_number):
+            try:
+                row = self._book_row(record, categories)
+            except (ValueError, TypeError) as e:
+                self.errors += 1
+                print(f"Bỏ qua dòng {number}: {e}")
+                continue
+            # Có ISBN thì so theo ISBN, không có thì theo tên sách
+            isbn = normalize_isbn(row[10])
+            title_key = _title_key(row[0])
+            if (isbn in self._isbns) if isbn else (title_key in self._titles):
+                self.skipped += 1
+                continue
+            if isbn:
+                self._isbns.add(isbn)
+            self._titles.add(title_key)
+            rows.append(row)
+
+        try:
+            if rows:
+                # Gắn version 'books' của lô để worker đang chạy đưa sách mới vào tìm kiếm
+                version = versions.bump(self.cursor, 'books')
+                self.cursor.executemany(INSERT_BOOK_SQL, [row + (version,) for row in rows])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.inserted += len(rows)
+        return len(rows)
+
+    def close(self):
+        self.cursor.close()
+
+
+def find_seller_id(conn, email=None):
+    """user_id của email (nếu có), không thì seller/admin đầu tiên"""
+    cursor = conn.cursor()
+    try:
+        if email:
+            cursor.execute("SELECT user_id FROM Users WHERE email = ?", (email,))
+        else:
+            cursor.execute("SELECT user_id FROM Users WHERE role IN ('seller', 'admin') ORDER BY user_id")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        cursor.close()
+
+
+def import_records(conn, records, seller_id=None, status='approved', chunk_size=1000,
+                   start=0, on_chunk=None):
+    """Nhập iterable các dict sách theo lô; bỏ qua start bản ghi đầu (tiếp tục sau sự cố).
+
+    on_chunk(số bản ghi đã xử lý, importer) được gọi sau mỗi lần commit.
+    Trả về importer (các đếm inserted/skipped/errors).
+    """
+    importer = CatalogImporter(conn, seller_id=seller_id, status=status)
+    try:
+        processed = 0
+        chunk = []
+        for record in records:
+            processed += 1
+            if processed <= start:
+                continue
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                importer.import_chunk(chunk, processed - len(chunk) + 1)
+                chunk = []
+                if on_chunk:
+                    on_chunk(processed, importer)
+        if chunk:
+            importer.import_chunk(chunk, processed - len(chunk) + 1)
+            if on_chunk:
+                on_chunk(processed, importer)
+    finally:
+        importer.close()
+    return importer
+
+
+# ==================== CHECKPOINT ====================
+
+def checkpoint_path(path):
+    return f'{path}.import-checkpoint.json'
+
+
+def _source_signature(path):
+    stat = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+
+def load_checkpoint(path):
+    """Số bản ghi đã commit của lần chạy trước với đúng file này (0 nếu không có hoặc file đã đổi)"""
+    try:
+        with open(checkpoint_path(path)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if {key: data.get(key) for key in ('source', 'size', 'mtime')} != _source_signature(path):
+        return 0
+    return data.get('records', 0)
+
+
+def save_checkpoint(path, records):
+    data = dict(_source_signature(path), records=records)
+    target = checkpoint_path(path)
+    tmp_path = f'{target}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, target)  # ghi nguyên tử, sự cố giữa chừng không để lại file dở
+
+
+def main(argv=None):
+    from config import get_config
+    from database import open_connection
+
+    cfg = get_config()
+    parser = argparse.ArgumentParser(description='Nhập danh mục sách từ file CSV/JSONL')
+    parser.add_argument('path', help='file .csv (có dòng tiêu đề) hoặc .jsonl')
+    parser.add_argument('--chunk-size', type=int, default=cfg.IMPORT_CHUNK_SIZE,
+                        help='số dòng mỗi lần commit')
+    parser.add_argument('--seller', help='email người bán gán cho sách (mặc định seller/admin đầu tiên)')
+    parser.add_argument('--status', default='approved', choices=('approved', 'pending'))
+    parser.add_argument('--restart', action='store_true', help='bỏ checkpoint, nhập lại từ đầu file')
+    args = parser.parse_args(argv)
+
+    start = 0 if args.restart else load_checkpoint(args.path)
+    if start:
+        print(f'Tiếp tục từ bản ghi {start + 1} (checkpoint của lần chạy trước).')
+
+    conn = open_connection()
+    if not conn:
+        print('Không thể kết nối database.')
+        return 1
+
+    started = time.perf_counter()
+
+    def report(processed, importer):
+        save_checkpoint(args.path, processed)
+        rate = (processed - start) / max(time.perf_counter() - started, 1e-9)
+        print(f'{processed} bản ghi: thêm {importer.inserted}, trùng {importer.skipped}, '
+              f'lỗi {importer.errors} - {rate:.0f} dòng/giây')
+
+    seller_id = find_seller_id(conn, args.seller)
+    if args.seller and seller_id is None:
+        print(f'Không tìm thấy người bán {args.seller}.')
+        conn.close()
+        return 1
+
+    try:
+        importer = import_records(conn, read_records(args.path),
+                                  seller_id=seller_id, status=args.status,
+                                  chunk_size=args.chunk_size, start=start, on_chunk=report)
+    finally:
+        conn.close()
+
+    if os.path.exists(checkpoint_path(args.path)):
+        os.remove(checkpoint_path(args.path))
+    elapsed = time.perf_counter() - started
+    print(f'Hoàn tất sau {elapsed:.1f}s: thêm {importer.inserted} sách, bỏ qua {importer.skipped} trùng, '
+          f'{importer.errors} dòng lỗi.')
+    print('Chạy python similar.py rebuild để cập nhật sách tương tự.')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,248 @@
+from decimal import Decimal, InvalidOperation
+
+from pagination import keyset_condition
+
+# Đặt hàng theo kiểu set-based: số câu lệnh SQL không phụ thuộc số dòng trong giỏ
+#   1. SELECT giá/tồn kho của mọi sách trong giỏ (một truy vấn IN)
+#   2. UPDATE trừ tồn kho có điều kiện cho mọi dòng (một câu lệnh)
+#   3. INSERT Orders
+#   4. INSERT OrderDetails nhiều dòng (chia lô để không vượt giới hạn tham số)
+
+# SQL Server cho tối đa 2100 tham số và 1000 dòng VALUES mỗi câu lệnh
+DETAIL_ROWS_PER_STATEMENT = 500
+PRICE_TOLERANCE = Decimal('0.01')
+
+
+class OrderError(Exception):
+    """Đơn hàng không hợp lệ; route trả về status kèm details cho client"""
+
+    def __init__(self, message, status=400, details=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.details = details or {}
+
+
+def _to_decimal(value):
+    try:
+        return Decimal(str(value)).quantize(PRICE_TOLERANCE)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def normalize_items(items, max_lines):
+    """Kiểm tra dữ liệu giỏ hàng, gộp các dòng trùng book_id.
+
+    Trả về {book_id: {'quantity': int, 'price': Decimal hoặc None}}
+    """
+    if not isinstance(items, list) or not items:
+        raise OrderError('Giỏ hàng trống!')
+
+    lines = {}
+    for item in items:
+        try:
+            book_id = int(item['book_id'])
+            quantity = int(item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise OrderError('Dữ liệu sản phẩm không hợp lệ!')
+        if quantity <= 0:
+            raise OrderError('Số lượng phải lớn hơn 0!')
+
+        price = _to_decimal(item['price']) if item.get('price') is not None else None
+        line = lines.setdefault(book_id, {'quantity': 0, 'price': price})
+        line['quantity'] += quantity
+
+    if len(lines) > max_lines:
+        raise OrderError(f'Đơn hàng tối đa {max_lines} đầu sách!')
+    return lines
+
+
+def _case_sql(book_ids):
+    """CASE book_id WHEN ? THEN ? ... END cho số lượng từng sách"""
+    return "CASE book_id " + " ".join("WHEN ? THEN ?" for _ in book_ids) + " END"
+
+
+def place_order(cursor, storage, buyer_id, items, client_total, shipping_address,
+                phone, payment_method, notes, max_lines=100):
+    """Kiểm tra và ghi đơn hàng trong transaction hiện tại.
+
+    Trả về (order_id, tổng tiền, {book_id: quantity}). Ném OrderError nếu
+    sách không bán, thiếu hàng hoặc giá/tổng tiền client gửi đã cũ; khi đó
+    caller phải rollback.
+    """
+    lines = normalize_items(items, max_lines)
+    book_ids = sorted(lines)
+    placeholders = ', '.join('?' * len(book_ids))
+
+    # 1. Giá và tồn kho hiện tại
+    cursor.execute(f"""
+        SELECT book_id, price, stock, status
+        FROM Books
+        WHERE book_id IN ({placeholders})
+    """, book_ids)
+    books = {row[0]: row for row in cursor.fetchall()}
+
+    unavailable = [book_id for book_id in book_ids
+                   if book_id not in books or books[book_id][3] != 'approved']
+    if unavailable:
+        raise OrderError('Một số sách không còn bán!', 400, {'unavailable': unavailable})
+
+    out_of_stock = [{'book_id': book_id, 'stock': books[book_id][2], 'requested': lines[book_id]['quantity']}
+                    for book_id in book_ids if books[book_id][2] < lines[book_id]['quantity']]
+    if out_of_stock:
+        raise OrderError('Không đủ hàng trong kho!', 409, {'out_of_stock': out_of_stock})
+
+    total = Decimal('0')
+    price_changed = []
+    for book_id in book_ids:
+        price = _to_decimal(books[book_id][1])
+        client_price = lines[book_id]['price']
+        if client_price is not None and abs(client_price - price) > PRICE_TOLERANCE:
+            price_changed.append({'book_id': book_id, 'price': float(price)})
+        lines[book_id]['price'] = price
+        total += price * lines[book_id]['quantity']
+    if price_changed:
+        raise OrderError('Giá sách đã thay đổi, vui lòng kiểm tra lại giỏ hàng!', 409,
+                         {'price_changed': price_changed})
+
+    if client_total is not None:
+        client_total = _to_decimal(client_total)
+        if client_total is None or abs(client_total - total) > PRICE_TOLERANCE:
+            raise OrderError('Tổng tiền không khớp!', 409, {'total': float(total)})
+
+    # 2. Trừ tồn kho có điều kiện: một dòng không đủ hàng thì rowcount thiếu -> hủy cả đơn
+    quantity_params = []
+    for book_id in book_ids:
+        quantity_params.extend([book_id, lines[book_id]['quantity']])
+    cursor.execute(f"""
+        UPDATE Books
+        SET stock = stock - {_case_sql(book_ids)}
+        WHERE book_id IN ({placeholders})
+          AND status = 'approved'
+          AND stock >= {_case_sql(book_ids)}
+    """, quantity_params + book_ids + quantity_params)
+    if cursor.rowcount != len(book_ids):
+        raise OrderError('Không đủ hàng trong kho!', 409)
+
+    # 3. Đơn hàng với tổng tiền tính ở server
+    order_id = storage.insert_returning_id(cursor, """
+        INSERT INTO Orders (buyer_id, total_amount, status, shipping_address, phone, payment_method, notes, created_at)
+        VALUES (?, ?, 'pending', ?, ?, ?, ?, GETDATE())
+    """, (buyer_id, total, shipping_address, phone, payment_method, notes), 'order_id')
+
+    # 4. Chi tiết đơn hàng, nhiều dòng mỗi câu lệnh
+    for start in range(0, len(book_ids), DETAIL_ROWS_PER_STATEMENT):
+        chunk = book_ids[start:start + DETAIL_ROWS_PER_STATEMENT]
+        params = []
+        for book_id in chunk:
+            params.extend([order_id, book_id, lines[book_id]['quantity'], lines[book_id]['price']])
+        cursor.execute(
+            "INSERT INTO OrderDetails (order_id, book_id, quantity, price) VALUES "
+            + ", ".join("(?, ?, ?, ?)" for _ in chunk),
+            params)
+
+    return order_id, total, {book_id: lines[book_id]['quantity'] for book_id in book_ids}
+
+
+# ==================== LỊCH SỬ ĐƠN HÀNG ====================
+
+ORDER_COLUMNS = ("o.order_id, o.total_amount, o.status, o.shipping_address, o.phone, "
+                 "o.payment_method, o.created_at, o.buyer_id")
+ORDER_STATUSES = ('pending', 'confirmed', 'shipping', 'delivered', 'cancelled', 'returned')
+
+
+def order_row_to_dict(order):
+    return {
+        'order_id': order[0],
+        'total_amount': float(order[1]) if order[1] else 0,
+        'status': order[2],
+        'shipping_address': order[3],
+        'phone': order[4],
+        'payment_method': order[5],
+        'created_at': order[6].strftime('%Y-%m-%d %H:%M:%S') if order[6] else None,
+        'buyer_id': order[7]
+    }
+
+
+def orders_page(cursor, storage, filter_sql, params, after, limit, include_items=False):
+    """Một trang đơn hàng khớp filter_sql (' AND ...'), mới nhất trước, theo keyset (created_at, order_id).
+
+    include_items: lấy luôn chi tiết đơn và tên sách trong cùng một truy vấn
+    (trang đơn hàng là bảng con, JOIN OrderDetails/Books rồi gom nhóm một lượt),
+    nên số truy vấn không tăng theo số đơn hay số dòng.
+    Trả về (orders, khóa của đơn cuối hoặc None nếu hết trang).
+    """
+    page_sql = f"SELECT {ORDER_COLUMNS} FROM Orders o WHERE 1 = 1" + filter_sql
+    params = list(params)
+    if after:
+        keyset_sql, keyset_params = keyset_condition(
+            'o.created_at', 'o.order_id', 'DESC', after[0], after[1],
+            value_param=storage.datetime_param())
+        page_sql += " AND " + keyset_sql
+        params.extend(keyset_params)
+    page_sql += " ORDER BY o.created_at DESC, o.order_id DESC" + storage.limit_clause()
+    params.append(limit + 1)  # lấy dư một đơn để biết còn trang sau
+
+    if not include_items:
+        cursor.execute(page_sql, params)
+        orders = [(row, None) for row in cursor.fetchall()]
+    else:
+        cursor.execute(f"""
+            SELECT o.*, d.book_id, d.quantity, d.price, b.title, b.image_url
+            FROM ({page_sql}) o
+            LEFT JOIN OrderDetails d ON d.order_id = o.order_id
+            LEFT JOIN Books b ON b.book_id = d.book_id
+            ORDER BY o.created_at DESC, o.order_id DESC, d.order_detail_id
+        """, params)
+        orders = []
+        for row in cursor.fetchall():
+            if not orders or orders[-1][0][0] != row[0]:
+                orders.append((row, []))
+            if row[8] is not None:
+                orders[-1][1].append({
+                    'book_id': row[8],
+                    'quantity': row[9],
+                    'price': float(row[10]) if row[10] else 0,
+                    'title': row[11],
+                    'image_url': row[12]
+                })
+
+    next_after = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        last = orders[-1][0]
+        next_after = (last[6], last[0])
+
+    result = []
+    for row, items in orders:
+        order = order_row_to_dict(row)
+        if items is not None:
+            order['items'] = items
+        result.append(order)
+    return result, next_after
+
+
+def buyer_orders_page(cursor, storage, buyer_id, after, limit, include_items=False):
+    """Một trang lịch sử đơn hàng của buyer (xem orders_page)"""
+    return orders_page(cursor, storage, " AND o.buyer_id = ?", [buyer_id], after, limit,
+                       include_items=include_items)
+
+
+def order_summary(cursor, filter_sql, params):
+    """Số đơn và tổng tiền theo trạng thái cho các đơn khớp filter_sql (một truy vấn GROUP BY).
+
+    revenue chỉ tính đơn đã giao, giống số liệu doanh thu trên dashboard.
+    """
+    cursor.execute(f"""
+        SELECT o.status, COUNT(*), COALESCE(SUM(o.total_amount), 0)
+        FROM Orders o
+        WHERE 1 = 1
+    """ + filter_sql + " GROUP BY o.status", list(params))
+    by_status = {}
+    for status, count, amount in cursor.fetchall():
+        by_status[status] = {'count': count, 'amount': float(amount or 0)}
+    return {
+        'count': sum(item['count'] for item in by_status.values()),
+        'revenue': by_status.get('delivered', {}).get('amount', 0.0),
+        'by_status': by_status
+    }
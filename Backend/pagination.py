@@ -0,0 +1,69 @@
+import base64
+import datetime
+import decimal
+import json
+
+# Phân trang keyset: cursor là chuỗi base64 (không cần client hiểu) chứa giá trị
+# khóa sắp xếp và id của dòng cuối cùng trong trang trước.
+
+
+class CursorError(ValueError):
+    """Cursor không hợp lệ hoặc không khớp kiểu sắp xếp hiện tại"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'dec': str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.datetime.fromisoformat(value['dt'])
+        if 'dec' in value:
+            return decimal.Decimal(value['dec'])
+    return value
+
+
+def encode_cursor(sort, value, row_id):
+    payload = json.dumps({'s': sort, 'v': _encode_value(value), 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Giải mã cursor, trả về (giá trị khóa sắp xếp, id)"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if data['s'] != sort:
+            raise CursorError('Cursor không khớp với kiểu sắp xếp')
+        return _decode_value(data['v']), data['id']
+    except CursorError:
+        raise
+    except Exception:
+        raise CursorError('Cursor không hợp lệ')
+
+
+def parse_limit(value, default, maximum):
+    """Đọc tham số limit, giới hạn trong [1, maximum]"""
+    if value in (None, ''):
+        return default
+    limit = int(value)
+    return max(1, min(limit, maximum))
+
+
+def keyset_condition(column, id_column, direction, value, row_id, nullable=False, value_param='?'):
+    """Điều kiện WHERE lấy các dòng đứng sau (value, row_id) theo thứ tự đã cho.
+
+    Cột nullable: NULL luôn đứng cuối khi sắp DESC (giống SQL Server và SQLite).
+    """
+    op = '<' if direction == 'DESC' else '>'
+    if nullable and value is None:
+        return f"({column} IS NULL AND {id_column} {op} ?)", [row_id]
+    condition = f"({column} {op} {value_param} OR ({column} = {value_param} AND {id_column} {op} ?)"
+    if nullable and direction == 'DESC':
+        condition += f" OR {column} IS NULL"
+    return condition + ")", [value, value, row_id]
@@ -0,0 +1,116 @@
+import sys
+
+# Tổng hợp đánh giá lưu ngay trên bảng Books:
+#   rating_sum, rating_count    -> rating = rating_sum / rating_count
+#   rating_1 .. rating_5        -> biểu đồ số sao
+# Mỗi review mới chỉ cộng dồn vào một dòng Books (O(1)), không quét lại Reviews.
+# Lệnh rebuild tính lại toàn bộ từ Reviews khi cần sửa dữ liệu lệch.
+
+RATING_BUCKETS = (1, 2, 3, 4, 5)
+
+# Cùng quy tắc làm tròn với rating_bucket(), dùng khi tính lại bằng SQL
+_BUCKET_SQL = ("CASE WHEN rating < 1.5 THEN 1 WHEN rating < 2.5 THEN 2 "
+               "WHEN rating < 3.5 THEN 3 WHEN rating < 4.5 THEN 4 ELSE 5 END")
+
+REBUILD_BATCH_SIZE = 500
+
+
+def parse_rating(value):
+    """Điểm đánh giá hợp lệ (1..5) hoặc None"""
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not RATING_BUCKETS[0] <= rating <= RATING_BUCKETS[-1]:
+        return None
+    return rating
+
+
+def rating_bucket(rating):
+    """Cột biểu đồ của một điểm đánh giá (làm tròn 0.5 lên)"""
+    return min(RATING_BUCKETS[-1], max(RATING_BUCKETS[0], int(rating + 0.5)))
+
+
+def apply_review(cursor, book_id, rating):
+    """Cộng một review vào tổng hợp của sách; trả về False nếu sách không tồn tại"""
+    column = f'rating_{rating_bucket(rating)}'
+    # Vế phải của SET đọc giá trị cũ nên rating tính được ngay trong cùng câu lệnh
+    cursor.execute(f"""
+        UPDATE Books
+        SET rating_sum = rating_sum + ?,
+            rating_count = rating_count + 1,
+            {column} = {column} + 1,
+            rating = (rating_sum + ?) / (rating_count + 1)
+        WHERE book_id = ?
+    """, (rating, rating, book_id))
+    return cursor.rowcount == 1
+
+
+def histogram(counts):
+    """{'1': n, ..., '5': n} từ các giá trị rating_1..rating_5 theo thứ tự"""
+    return {str(star): int(count or 0) for star, count in zip(RATING_BUCKETS, counts)}
+
+
+def rebuild(cursor, book_id=None, reset=True):
+    """Tính lại tổng hợp từ Reviews cho một sách hoặc toàn bộ; trả về số sách có review.
+
+    Một truy vấn GROUP BY cho mọi sách, sau đó ghi theo lô bằng executemany;
+    caller commit. reset=False chỉ ghi các sách có review, giữ nguyên rating của
+    sách chưa có review (dùng khi vừa thêm các cột tổng hợp).
+    """
+    where = " WHERE book_id = ?" if book_id is not None else ""
+    params = (book_id,) if book_id is not None else ()
+
+    if reset:
+        cursor.execute(f"""
+            UPDATE Books
+            SET rating = 0, rating_sum = 0, rating_count = 0,
+                {', '.join(f'rating_{star} = 0' for star in RATING_BUCKETS)}
+        """ + where, params)
+
+    bucket_sums = ', '.join(f"SUM(CASE WHEN bucket = {star} THEN 1 ELSE 0 END)" for star in RATING_BUCKETS)
+    cursor.execute(f"""
+        SELECT book_id, SUM(rating), COUNT(*), {bucket_sums}
+        FROM (SELECT book_id, rating, {_BUCKET_SQL} AS bucket FROM Reviews{where}) r
+        GROUP BY book_id
+    """, params)
+    rows = cursor.fetchall()
+
+    update_sql = f"""
+        UPDATE Books
+        SET rating = ?, rating_sum = ?, rating_count = ?,
+            {', '.join(f'rating_{star} = ?' for star in RATING_BUCKETS)}
+        WHERE book_id = ?
+    """
+    for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+        batch = []
+        for row in rows[start:start + REBUILD_BATCH_SIZE]:
+            total, count = float(row[1]), int(row[2])
+            batch.append((total / count, total, count, *[int(c) for c in row[3:]], row[0]))
+        cursor.executemany(update_sql, batch)
+    return len(rows)
+
+
+if __name__ == '__main__':
+    # python ratings.py rebuild [book_id]  -> tính lại rating từ bảng Reviews
+    from config import get_config
+    from storage import get_storage
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('Cách dùng: python ratings.py rebuild [book_id]')
+        sys.exit(1)
+
+    storage = get_storage(get_config())
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        storage.ensure_schema(conn)
+        count = rebuild(cursor, int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    print(f'Đã tính lại đánh giá cho {count} sách.')
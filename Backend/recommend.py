@@ -0,0 +1,224 @@
+import heapq
+import itertools
+import sys
+import threading
+
+import versions
+
+# "Khách hàng cũng mua": ma trận đồng mua sách x sách dạng thưa.
+#   CoPurchase(book_id, other_id, orders) = số đơn có cả hai sách (lưu cả hai chiều)
+# - Transaction đặt hàng chỉ thêm order_id vào CoPurchaseQueue (một INSERT, không
+#   đụng dòng cặp sách dùng chung nên các lần thanh toán không chờ nhau)
+# - fold_queue() đếm cặp của các đơn trong hàng đợi bằng count_pairs() rồi cộng vào
+#   CoPurchase (bảng là dữ liệu gốc, dùng chung cho mọi worker); chạy trước mỗi lần
+#   nạp lại bản sao hoặc định kỳ bằng python recommend.py fold
+# - Mỗi process giữ bản sao trong bộ nhớ kèm top-K hàng xóm tính sẵn cho từng sách,
+#   nên /api/books/<id>/also-bought chỉ tra một dict; đơn của chính worker được cộng
+#   ngay, bản sao được một thread nền của worker (app.py) gộp hàng đợi rồi nạp lại định kỳ
+#   để thấy đơn hàng từ worker khác; request đọc không bao giờ tự gộp/nạp
+# - Lệnh rebuild tính lại toàn bộ từ OrderDetails: với scipy là một phép nhân ma trận
+#   thưa B^T B (B: đơn x sách), không có scipy thì đếm cặp bằng Python
+# Đơn quá nhiều đầu sách (mua sỉ) cho tín hiệu yếu và sinh n^2 cặp nên bị bỏ qua.
+
+_scipy = None
+
+
+def _load_scipy():
+    # scipy là tùy chọn, chỉ import khi rebuild
+    global _scipy
+    if _scipy is None:
+        try:
+            import numpy
+            from scipy import sparse
+            _scipy = (numpy, sparse)
+        except ImportError:
+            _scipy = False
+    return _scipy
+
+
+def order_pairs(book_ids, max_lines):
+    """Các cặp (a, b), a != b, của một đơn; rỗng nếu đơn có ít hơn 2 hoặc quá max_lines sách"""
+    books = sorted(set(book_ids))
+    if len(books) < 2 or len(books) > max_lines:
+        return []
+    return list(itertools.permutations(books, 2))
+
+
+def record_order(cursor, order_id, book_ids, max_lines):
+    """Đưa đơn vào hàng đợi nếu nó sinh cặp sách; caller commit cùng transaction đặt hàng"""
+    if not order_pairs(book_ids, max_lines):
+        return False
+    cursor.execute("INSERT INTO CoPurchaseQueue (order_id) VALUES (?)", (order_id,))
+    return True
+
+
+def _order_books(cursor, order_ids, chunk_size=500):
+    """Các dòng (order_id, book_id) của order_ids"""
+    rows = []
+    for start in range(0, len(order_ids), chunk_size):
+        chunk = order_ids[start:start + chunk_size]
+        cursor.execute(f"SELECT order_id, book_id FROM OrderDetails "
+                       f"WHERE order_id IN ({', '.join('?' * len(chunk))})", chunk)
+        rows.extend(tuple(row) for row in cursor.fetchall())
+    return rows
+
+
+def _dequeue(cursor, order_ids, chunk_size=500):
+    for start in range(0, len(order_ids), chunk_size):
+        chunk = order_ids[start:start + chunk_size]
+        cursor.execute(f"DELETE FROM CoPurchaseQueue WHERE order_id IN ({', '.join('?' * len(chunk))})", chunk)
+
+
+def fold_queue(cursor, storage, max_lines, batch_size=1000):
+    """Cộng các đơn trong CoPurchaseQueue vào CoPurchase rồi xóa khỏi hàng đợi; trả về số đơn.
+
+    Cặp của cả lô được đếm trước (count_pairs) nên mỗi cặp chỉ một lần upsert.
+    Khóa dòng CatalogVersions('co_purchase') để hai worker không gộp một đơn hai lần;
+    caller commit.
+    """
+    versions.bump(cursor, 'co_purchase')
+    cursor.execute("SELECT order_id FROM CoPurchaseQueue")
+    order_ids = [row[0] for row in cursor.fetchall()]
+    if not order_ids:
+        return 0
+    rows = count_pairs(_order_books(cursor, order_ids), max_lines)
+    upsert_sql = storage.increment_sql('CoPurchase', ('book_id', 'other_id'), ('orders',))
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(upsert_sql, rows[start:start + batch_size])
+    _dequeue(cursor, order_ids)
+    return len(order_ids)
+
+
+def count_pairs(order_books, max_lines):
+    """[(a, b, số đơn)] từ các dòng (order_id, book_id)"""
+    lib = _load_scipy()
+    if lib:
+        return _count_pairs_sparse(order_books, max_lines, *lib)
+    counts = {}
+    for _, rows in itertools.groupby(sorted(order_books), key=lambda row: row[0]):
+        for pair in order_pairs([book_id for _, book_id in rows], max_lines):
+            counts[pair] = counts.get(pair, 0) + 1
+    return [(a, b, n) for (a, b), n in counts.items()]
+
+
+def _count_pairs_sparse(order_books, max_lines, np, sparse):
+    if not order_books:
+        return []
+    pairs = np.array(order_books, dtype=np.int64).reshape(-1, 2)
+    orders, order_index = np.unique(pairs[:, 0], return_inverse=True)
+    books, book_index = np.unique(pairs[:, 1], return_inverse=True)
+    incidence = sparse.csr_matrix((np.ones(len(pairs)), (order_index, book_index)),
+                                  shape=(len(orders), len(books)))
+    incidence.data[:] = 1  # một sách nhiều dòng trong cùng đơn vẫn tính một lần
+    sizes = incidence.getnnz(axis=1)
+    incidence = sparse.diags(((sizes >= 2) & (sizes <= max_lines)).astype(float)) @ incidence
+    co = (incidence.T @ incidence).tocoo()
+    mask = (co.row != co.col) & (co.data > 0)
+    return list(zip(books[co.row[mask]].tolist(), books[co.col[mask]].tolist(),
+                    co.data[mask].astype(np.int64).tolist()))
+
+
+def rebuild(cursor, max_lines, batch_size=1000):
+    """Tính lại toàn bộ CoPurchase từ OrderDetails; trả về số cặp. Caller commit"""
+    versions.bump(cursor, 'co_purchase')
+    cursor.execute("SELECT order_id, book_id FROM OrderDetails")
+    order_books = [tuple(row) for row in cursor.fetchall()]
+    # Đơn đã được đếm ở đây thì bỏ khỏi hàng đợi; đơn commit sau lần đọc trên vẫn chờ fold_queue()
+    counted = {order_id for order_id, _ in order_books}
+    cursor.execute("SELECT order_id FROM CoPurchaseQueue")
+    _dequeue(cursor, [row[0] for row in cursor.fetchall() if row[0] in counted])
+    rows = count_pairs(order_books, max_lines)
+    cursor.execute("DELETE FROM CoPurchase")
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany("INSERT INTO CoPurchase (book_id, other_id, orders) VALUES (?, ?, ?)",
+                           rows[start:start + batch_size])
+    return len(rows)
+
+
+class CoPurchaseIndex:
+    """Bản sao trong bộ nhớ của CoPurchase và top-K hàng xóm của từng sách"""
+
+    def __init__(self, top_k=20):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._counts = {}     # book_id -> {other_id: số đơn mua chung}
+        self._neighbors = {}  # book_id -> tuple other_id, nhiều đơn chung nhất trước
+        self.ready = False
+
+    def __len__(self):
+        return len(self._counts)
+
+    def build(self, rows):
+        """Xây lại từ các dòng (book_id, other_id, orders)"""
+        counts = {}
+        for book_id, other_id, orders in rows:
+            counts.setdefault(book_id, {})[other_id] = orders
+        neighbors = {book_id: self._top(row) for book_id, row in counts.items()}
+        with self._lock:
+            self._counts = counts
+            self._neighbors = neighbors
+            self.ready = True
+
+    def add_order(self, book_ids, max_lines):
+        """Cộng một đơn vừa commit; chỉ tính lại top-K của các sách trong đơn"""
+        pairs = order_pairs(book_ids, max_lines)
+        if not pairs:
+            return
+        with self._lock:
+            touched = set()
+            for a, b in pairs:
+                row = self._counts.setdefault(a, {})
+                row[b] = row.get(b, 0) + 1
+                touched.add(a)
+            for book_id in touched:
+                self._neighbors[book_id] = self._top(self._counts[book_id])
+
+    def neighbors(self, book_id):
+        """Top-K sách hay được mua cùng book_id (tuple tính sẵn, O(1))"""
+        return self._neighbors.get(book_id, ())
+
+    def _top(self, row):
+        # Hòa số đơn thì sách có id nhỏ hơn đứng trước để kết quả ổn định
+        return tuple(other for other, _ in heapq.nsmallest(self.top_k, row.items(),
+                                                           key=lambda item: (-item[1], item[0])))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'books': len(self._counts),
+                'pairs': sum(len(row) for row in self._counts.values()),
+                'top_k': self.top_k,
+            }
+
+
+if __name__ == '__main__':
+    # python recommend.py rebuild  -> tính lại CoPurchase từ OrderDetails
+    # python recommend.py fold     -> chỉ cộng các đơn đang chờ trong hàng đợi (chạy định kỳ, vd. cron)
+    from config import get_config
+    from storage import get_storage
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('rebuild', 'fold'):
+        print('Cách dùng: python recommend.py rebuild|fold')
+        sys.exit(1)
+
+    cfg = get_config()
+    storage = get_storage(cfg)
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        storage.ensure_schema(conn)
+        if sys.argv[1] == 'rebuild':
+            count = rebuild(cursor, cfg.RECOMMEND_MAX_ORDER_LINES)
+        else:
+            count = fold_queue(cursor, storage, cfg.RECOMMEND_MAX_ORDER_LINES)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    if sys.argv[1] == 'rebuild':
+        print(f'Đã tính lại ma trận đồng mua: {count} cặp sách.')
+    else:
+        print(f'Đã cộng {count} đơn trong hàng đợi vào ma trận đồng mua.')
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows (chỉ chạy dev một process): không khóa file
+    fcntl = None
+
+# Thu hồi JWT trước hạn (đăng xuất, khóa tài khoản) mà không thêm truy vấn DB
+# vào mỗi request:
+#   - token mang claim jti (định danh) và iat (thời điểm phát hành)
+#   - jti bị thu hồi nằm trong dict jti -> exp; mục hết hạn được dọn đi nên
+#     kích thước chỉ phụ thuộc số token bị thu hồi còn hạn, không phụ thuộc
+#     số token đã phát hành
+#   - khóa tài khoản ghi mốc revoked_before theo user: mọi token có iat sớm hơn
+#     hoặc bằng mốc đó bị từ chối. iat và mốc đều tính tới phần lẻ của giây để
+#     token đăng nhập ngay sau khi mở khóa (cùng giây với lúc khóa) vẫn hợp lệ
+# Snapshot ghi ra file JSON sau mỗi lần thu hồi; worker mới nạp khi khởi động,
+# các worker đang chạy tự nạp lại khi file thay đổi. Mỗi lần ghi giữ khóa file
+# (fcntl.flock) và gộp với snapshot hiện có nên các worker thu hồi đồng thời
+# không ghi đè mất của nhau.
+
+
+class RevocationList:
+    """Danh sách token bị thu hồi, dùng chung giữa các thread của một worker"""
+
+    def __init__(self, path=None, token_lifetime=24 * 3600, reload_interval=1.0):
+        self.path = path
+        self.token_lifetime = token_lifetime
+        self.reload_interval = reload_interval
+        self._jtis = {}           # jti -> exp (epoch giây)
+        self._users = {}          # user_id -> revoked_before (epoch giây, có phần lẻ)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_reload = 0.0
+
+    def is_revoked(self, payload):
+        """payload: claims đã giải mã của JWT"""
+        self._maybe_reload()
+        if payload.get('jti') in self._jtis:
+            return True
+        revoked_before = self._users.get(payload.get('user_id'))
+        return revoked_before is not None and payload.get('iat', 0) <= revoked_before
+
+    def revoke(self, jti, exp):
+        """Thu hồi một token cho tới khi nó tự hết hạn"""
+        with self._lock:
+            self._jtis[jti] = exp
+            self._prune()
+        self.save()
+
+    def revoke_user(self, user_id, before=None):
+        """Thu hồi mọi token của user được phát hành trước thời điểm before"""
+        with self._lock:
+            self._users[user_id] = float(before if before is not None else time.time())
+            self._prune()
+        self.save()
+
+    def _prune(self):
+        # Gọi khi đang giữ lock. Thay dict mới thay vì xóa tại chỗ để
+        # is_revoked() (không lấy lock) luôn thấy một dict nhất quán
+        now = time.time()
+        self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp >= now}
+        self._users = {user_id: ts for user_id, ts in self._users.items()
+                       if ts + self.token_lifetime >= now}
+
+    @contextmanager
+    def _file_lock(self):
+        """Khóa ghi snapshot giữa các process (file .lock riêng vì snapshot bị thay bằng os.replace)"""
+        if fcntl is None:
+            yield
+            return
+        with open(f'{self.path}.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_snapshot(self):
+        """(jtis, users) trong file, hoặc None nếu chưa có file"""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        return dict(data.get('jtis', {})), {int(k): v for k, v in data.get('users', {}).items()}
+
+    def _merge(self, snapshot):
+        # Gọi khi đang giữ lock: hợp của hai bên, mốc của user lấy giá trị muộn hơn
+        jtis, users = snapshot
+        jtis.update(self._jtis)
+        for user_id, revoked_before in self._users.items():
+            if revoked_before > users.get(user_id, 0):
+                users[user_id] = revoked_before
+        self._jtis = jtis
+        self._users = users
+        self._prune()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock, self._file_lock():
+            # Gộp với các thu hồi worker khác vừa ghi rồi mới ghi đè file
+            snapshot = self._read_snapshot()
+            if snapshot is not None:
+                self._merge(snapshot)
+            data = {'jtis': self._jtis, 'users': {str(k): v for k, v in self._users.items()}}
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)  # ghi nguyên tử, worker khác không đọc file dở
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def load(self):
+        """Nạp snapshot từ đĩa (gộp với các thu hồi đã có trong bộ nhớ); trả về False nếu chưa có file"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime_ns
+            snapshot = self._read_snapshot()
+            if snapshot is None:
+                return False
+            self._merge(snapshot)
+            self._mtime = mtime
+        return True
+
+    def _maybe_reload(self):
+        # Kiểm tra mtime tối đa một lần mỗi reload_interval giây
+        if not self.path:
+            return
+        now = time.monotonic()
+        if now < self._next_reload:
+            return
+        self._next_reload = now + self.reload_interval
+        try:
+            if os.stat(self.path).st_mtime_ns != self._mtime:
+                self.load()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Revocation reload error: {e}")
+
+    def stats(self):
+        return {
+            'revoked_tokens': len(self._jtis),
+            'revoked_users': len(self._users),
+        }
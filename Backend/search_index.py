@@ -0,0 +1,202 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+
+# Chỉ mục đảo ngược (inverted index) trong bộ nhớ cho tìm kiếm sách.
+# Token được bỏ dấu tiếng Việt nên "dac nhan tam" khớp "Đắc Nhân Tâm";
+# xếp hạng theo BM25 có trọng số theo trường.
+
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'author': 2.0,
+    'isbn': 3.0,
+    'publisher': 1.0,
+    'description': 0.5,
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    """Bỏ dấu và chuyển về chữ thường: 'Đắc Nhân Tâm' -> 'dac nhan tam'"""
+    if not text:
+        return ''
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn').lower()
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _field_tokens(field, value):
+    if value is None:
+        return []
+    value = str(value)
+    tokens = tokenize(value)
+    if field == 'isbn':
+        # Cho phép tìm ISBN cả khi gõ liền không có dấu gạch
+        compact = ''.join(tokens)
+        if compact and compact not in tokens:
+            tokens.append(compact)
+    return tokens
+
+
+class SearchIndex:
+    """Inverted index có thể cập nhật từng sách, an toàn đa luồng"""
+
+    def __init__(self, k1=1.2, b=0.75, prefix_expansions=50, prefix_weight=0.8):
+        self.k1 = k1
+        self.b = b
+        self.prefix_expansions = prefix_expansions
+        self.prefix_weight = prefix_weight
+
+        self._lock = threading.RLock()
+        self._postings = {}   # token -> {book_id: tf có trọng số}
+        self._doc_terms = {}  # book_id -> tập token của sách
+        self._doc_len = {}    # book_id -> độ dài có trọng số
+        self._total_len = 0.0
+        self._vocab = []      # danh sách token đã sắp xếp, dùng cho tìm theo tiền tố
+        self.ready = False
+        self.version = 0      # CatalogVersions('books') đã áp dụng vào chỉ mục (xem versions.py)
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    # ---------- xây dựng / cập nhật ----------
+
+    def build(self, books):
+        """Xây lại toàn bộ chỉ mục từ iterable các dict sách"""
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            self._doc_len = {}
+            self._total_len = 0.0
+            for book in books:
+                self._add_locked(book)
+            self._vocab = sorted(self._postings)
+            self.ready = True
+
+    def add(self, book):
+        """Thêm hoặc cập nhật một sách (dict có book_id và các trường văn bản)"""
+        with self._lock:
+            self._remove_locked(book['book_id'])
+            for token in self._add_locked(book):
+                index = bisect.bisect_left(self._vocab, token)
+                if index == len(self._vocab) or self._vocab[index] != token:
+                    self._vocab.insert(index, token)
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def _add_locked(self, book):
+        book_id = book['book_id']
+        frequencies = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in _field_tokens(field, book.get(field)):
+                frequencies[token] = frequencies.get(token, 0.0) + weight
+                length += weight
+
+        new_tokens = []
+        for token, tf in frequencies.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                new_tokens.append(token)
+            posting[book_id] = tf
+        self._doc_terms[book_id] = set(frequencies)
+        self._doc_len[book_id] = length
+        self._total_len += length
+        return new_tokens
+
+    def _remove_locked(self, book_id):
+        terms = self._doc_terms.pop(book_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(book_id, 0.0)
+        for token in terms:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(book_id, None)
+            if not posting:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocab, token)
+                if index < len(self._vocab) and self._vocab[index] == token:
+                    del self._vocab[index]
+
+    # ---------- tìm kiếm ----------
+
+    def match_ids(self, query):
+        """Tập book_id khớp mọi từ trong truy vấn, không chấm điểm và không giới hạn số lượng"""
+        terms = tokenize(query)
+        if not terms:
+            return set()
+
+        with self._lock:
+            matches = None
+            for term in dict.fromkeys(terms):
+                term_ids = set()
+                for token, _ in self._expand_locked(term):
+                    term_ids.update(self._postings[token])
+                matches = term_ids if matches is None else matches & term_ids
+                if not matches:
+                    return set()
+        return matches
+
+    def search(self, query, limit=1000):
+        """Trả về [(book_id, điểm)] giảm dần; sách phải khớp mọi từ trong truy vấn.
+        limit=None: trả về mọi sách khớp"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_len)
+            if doc_count == 0:
+                return []
+            avg_len = self._total_len / doc_count
+
+            scores = None
+            for term in dict.fromkeys(terms):
+                term_scores = {}
+                for token, weight in self._expand_locked(term):
+                    posting = self._postings[token]
+                    idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                    for book_id, tf in posting.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_len[book_id] / avg_len)
+                        score = weight * idf * tf * (self.k1 + 1) / (tf + norm)
+                        if score > term_scores.get(book_id, 0.0):
+                            term_scores[book_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {book_id: score + term_scores[book_id]
+                              for book_id, score in scores.items() if book_id in term_scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+    def _expand_locked(self, term):
+        """Token khớp chính xác (trọng số 1) và các token có cùng tiền tố"""
+        matches = []
+        if term in self._postings:
+            matches.append((term, 1.0))
+        index = bisect.bisect_left(self._vocab, term)
+        expansions = 0
+        while index < len(self._vocab) and expansions < self.prefix_expansions:
+            token = self._vocab[index]
+            if not token.startswith(term):
+                break
+            if token != term:
+                matches.append((token, self.prefix_weight))
+                expansions += 1
+            index += 1
+        return matches
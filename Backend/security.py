@@ -0,0 +1,7 @@
+import hashlib
+
+# Hàm bảo mật dùng chung cho app và các script (seed, import) - không phụ thuộc Flask
+
+
+def hash_password(password):
+    return hashlib.sha256(password.encode()).hexdigest()
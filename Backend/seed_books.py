@@ -1,9 +1,10 @@
-from app import get_db_connection, hash_password
+from database import open_connection
+from security import hash_password
+from import_catalog import import_records, find_seller_id
 
 # Script để chèn dữ liệu mẫu vào database. Chạy thủ công từ thư mục Backend.
 # LƯU Ý: Kiểm tra schema bảng trước khi chạy. Script này giả định các bảng: Users, Categories, Books, Orders, OrderDetails.
 
-SAMPLE_CATEGORIES = []
 SAMPLE_BOOKS = [
     dict(title='Đắc Nhân Tâm', author='Dale Carnegie', price=86000, old_price=120000, description='Kinh điển về giao tiếp', stock=50, rating=4.8, image_url='assets/images/book1.jpg', category_name='Kỹ Năng'),
     dict(title='Nhà Giả Kim', author='Paulo Coelho', price=79000, old_price=99000, description='Tiểu thuyết triết lý', stock=40, rating=4.9, image_url='assets/images/book2.jpg', category_name='Văn Học'),
@@ -17,67 +18,31 @@ DEFAULT_USERS = [
 ]
 
 
-def ensure_category(cursor, name):
-    cursor.execute("SELECT category_id FROM Categories WHERE category_name = ?", (name,))
-    row = cursor.fetchone()
-    if row:
-        return row[0]
-    cursor.execute("INSERT INTO Categories (category_name) VALUES (?)", (name,))
-    cursor.commit()
-    cursor.execute("SELECT category_id FROM Categories WHERE category_name = ?", (name,))
-    return cursor.fetchone()[0]
-
-
 def main():
-    conn = get_db_connection()
+    conn = open_connection()
     if not conn:
         print('Không thể kết nối database.')
         return
     cursor = conn.cursor()
 
     # Create default users
+    cursor.execute("SELECT email FROM Users")
+    existing = {row[0] for row in cursor.fetchall()}
     for u in DEFAULT_USERS:
-        cursor.execute("SELECT user_id FROM Users WHERE email = ?", (u['email'],))
-        if cursor.fetchone():
+        if u['email'] in existing:
             print('User exists:', u['email'])
             continue
         hashed = hash_password(u['password']) if u.get('password') else ''
         cursor.execute("INSERT INTO Users (fullname, email, phone, password, role, status, created_at) VALUES (?, ?, ?, ?, ?, 'active', GETDATE())",
                        (u['fullname'], u['email'], u['phone'], hashed, u['role']))
-        conn.commit()
         print('Created user', u['email'])
+    conn.commit()
+    cursor.close()
 
-    # Ensure categories
-    cat_map = {}
-    for c in SAMPLE_CATEGORIES:
-        cursor.execute("SELECT category_id FROM Categories WHERE category_name = ?", (c,))
-        r = cursor.fetchone()
-        if r:
-            cat_map[c] = r[0]
-        else:
-            cursor.execute("INSERT INTO Categories (category_name) VALUES (?)", (c,))
-            conn.commit()
-            cursor.execute("SELECT category_id FROM Categories WHERE category_name = ?", (c,))
-            cat_map[c] = cursor.fetchone()[0]
-
-    # Find seller id
-    cursor.execute("SELECT user_id FROM Users WHERE email = ?", ('seller@local',))
-    seller_row = cursor.fetchone()
-    seller_id = seller_row[0] if seller_row else None
-
-    # Insert sample books
-    for b in SAMPLE_BOOKS:
-        cursor.execute("SELECT book_id FROM Books WHERE title = ?", (b['title'],))
-        if cursor.fetchone():
-            print('Book exists:', b['title'])
-            continue
-        category_id = cat_map.get(b['category_name'])
-        cursor.execute("INSERT INTO Books (title, author, price, old_price, description, stock, rating, image_url, category_id, seller_id, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'approved', GETDATE())",
-                       (b['title'], b['author'], b['price'], b['old_price'], b['description'], b['stock'], b['rating'], b['image_url'], category_id, seller_id))
-        conn.commit()
-        print('Inserted book', b['title'])
+    # Sách mẫu đi qua cùng đường nhập lô với import_catalog.py (thể loại tạo theo tên, bỏ qua sách trùng)
+    importer = import_records(conn, SAMPLE_BOOKS, seller_id=find_seller_id(conn, 'seller@local'))
+    print(f'Inserted {importer.inserted} books, {importer.skipped} already existed')
 
-    cursor.close()
     conn.close()
     print('Seed completed.')
 
@@ -1,4 +1,5 @@
-from app import get_db_connection, hash_password
+from database import open_connection
+from import_catalog import import_records, find_seller_id
 
 # Script để thêm 10 quyển sách kinh dị vào database
 
@@ -156,68 +157,17 @@ HORROR_BOOKS = [
 ]
 
 def main():
-    conn = get_db_connection()
+    conn = open_connection()
     if not conn:
         print('Không thể kết nối database.')
         return
     
-    cursor = conn.cursor()
-    
-    # Tạo category "Kinh dị" nếu chưa có
-    cursor.execute("SELECT category_id FROM Categories WHERE category_name = ?", ('kinhdi',))
-    category = cursor.fetchone()
-    
-    if not category:
-        cursor.execute("INSERT INTO Categories (category_name) VALUES (?)", ('Kinh Dị',))
-        conn.commit()
-        cursor.execute("SELECT category_id FROM Categories WHERE category_name = ?", ('Kinh Dị',))
-        category = cursor.fetchone()
-    
-    category_id = category[0]
-    
-    # Tìm seller_id (có thể dùng admin hoặc seller mặc định)
-    cursor.execute("SELECT user_id FROM Users WHERE role = 'seller' OR role = 'admin' ORDER BY user_id")
-    seller = cursor.fetchone()
-    seller_id = seller[0] if seller else 1
-    
-    # Thêm sách kinh dị
-    for book in HORROR_BOOKS:
-        # Kiểm tra ISBN đã tồn tại chưa
-        cursor.execute("SELECT book_id FROM Books WHERE isbn = ?", (book['isbn'],))
-        if cursor.fetchone():
-            print(f"Sách '{book['title']}' đã tồn tại (ISBN: {book['isbn']})")
-            continue
-        
-        try:
-            cursor.execute("""
-                INSERT INTO Books 
-                (title, author, price, old_price, description, stock, rating, image_url, 
-                 category_id, seller_id, isbn, condition, publisher, publish_year, status, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'approved', GETDATE())
-            """, (
-                book['title'],
-                book['author'],
-                book['price'],
-                book['old_price'],
-                book['description'],
-                book['stock'],
-                book['rating'],
-                book['image_url'],
-                category_id,
-                seller_id,
-                book['isbn'],
-                book['condition'],
-                book['publisher'],
-                book['publish_year']
-            ))
-            conn.commit()
-            print(f"✅ Đã thêm: {book['title']}")
-        except Exception as e:
-            print(f"❌ Lỗi khi thêm {book['title']}: {e}")
-    
-    cursor.close()
+    # Thể loại "Kinh Dị" được tạo nếu chưa có; sách trùng ISBN được bỏ qua.
+    # Người bán: seller/admin đầu tiên
+    importer = import_records(conn, HORROR_BOOKS, seller_id=find_seller_id(conn))
     conn.close()
+    print(f'Đã thêm {importer.inserted} sách, {importer.skipped} sách đã tồn tại.')
     print('\n🎉 Hoàn tất thêm sách kinh dị!')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
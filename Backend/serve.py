@@ -0,0 +1,73 @@
+import multiprocessing
+import sys
+
+from config import get_config
+
+# Chạy backend ở chế độ production bằng gunicorn (Linux/macOS):
+#   python serve.py
+# Chọn cấu hình bằng FLASK_CONFIG (mặc định 'default'); số worker/thread qua
+# WEB_BIND, WEB_WORKERS, WEB_THREADS... (xem config.py).
+#
+# - App được import một lần trong process cha (preload) rồi mới fork worker:
+#   chỉ mục tìm kiếm xây một lần, các worker dùng chung theo copy-on-write
+# - Mỗi worker có pool kết nối riêng và tự làm nóng pool/cache ngay sau fork
+# - Reload không gián đoạn: kill -HUP <pid master> khởi động worker mới rồi
+#   mới cho worker cũ dừng êm (xử lý nốt request trong WEB_GRACEFUL_TIMEOUT giây).
+#   HUP không nạp lại code đã preload; khi deploy code mới dùng USR2 (khởi động
+#   master mới) rồi gửi TERM cho master cũ.
+# app.run() trong app.py vẫn dùng cho môi trường dev.
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    print('Chưa cài gunicorn (pip install gunicorn). Trên Windows hãy dùng "python app.py" cho môi trường dev.')
+    sys.exit(1)
+
+
+def default_workers():
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    init_worker(server.app.wsgi())
+
+
+class BookstoreServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import create_app, warm_up
+        app = create_app()
+        warm_up()
+        return app
+
+
+def main():
+    cfg = get_config()
+    options = {
+        'bind': cfg.WEB_BIND,
+        'workers': cfg.WEB_WORKERS or default_workers(),
+        'threads': cfg.WEB_THREADS,
+        'worker_class': 'gthread',
+        'timeout': cfg.WEB_TIMEOUT,
+        'graceful_timeout': cfg.WEB_GRACEFUL_TIMEOUT,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'accesslog': '-',
+    }
+    if cfg.WEB_MAX_REQUESTS > 0:
+        # Jitter để các worker không tái tạo cùng lúc
+        options['max_requests'] = cfg.WEB_MAX_REQUESTS
+        options['max_requests_jitter'] = max(1, cfg.WEB_MAX_REQUESTS // 10)
+    BookstoreServer(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,324 @@
+import heapq
+import math
+import sys
+import threading
+
+import versions
+from search_index import tokenize
+
+# "Sách tương tự" theo nội dung: vector TF-IDF (token đã bỏ dấu, có trọng số theo trường)
+# của tên sách, tác giả, thể loại, NXB và mô tả; độ tương tự là cosine.
+#   BookSimilar(book_id, other_id, score) = top-K sách gần nhất của từng sách, tính sẵn
+# - /api/books/<id>/similar chỉ đọc bảng này (một truy vấn theo khóa chính)
+# - Lệnh rebuild tính lại toàn bộ: với scipy là các phép nhân ma trận thưa X[lô] @ X^T
+#   theo từng lô dòng, không có scipy thì tính từng sách qua chỉ mục đảo ngược
+# - Khi một sách được duyệt/sửa/ẩn, update_book chỉ ghi lại dòng của sách đó và của
+#   các sách mà danh sách top-K bị ảnh hưởng
+# - Model của mỗi worker được xây một lần (khởi động hoặc rebuild) rồi theo kịp sách
+#   được duyệt/ẩn/nhập ở bất kỳ worker nào qua Books.change_seq (versions.py)
+# IDF cố định từ lần build gần nhất; token mới xuất hiện sau đó dùng IDF của token hiếm.
+
+FIELD_WEIGHTS = {
+    'title': 2.0,
+    'author': 2.0,
+    'category': 1.5,
+    'publisher': 1.0,
+    'description': 1.0,
+}
+
+DOCUMENT_SQL = """
+    SELECT b.book_id, b.title, b.author, b.publisher, b.description, c.category_name, b.status
+    FROM Books b
+    LEFT JOIN Categories c ON b.category_id = c.category_id
+"""
+
+_scipy = None
+
+
+def _load_scipy():
+    # scipy là tùy chọn, chỉ import khi rebuild
+    global _scipy
+    if _scipy is None:
+        try:
+            import numpy
+            from scipy import sparse
+            _scipy = (numpy, sparse)
+        except ImportError:
+            _scipy = False
+    return _scipy
+
+
+def book_document(row):
+    """Dòng DOCUMENT_SQL -> dict sách"""
+    return {
+        'book_id': row[0], 'title': row[1], 'author': row[2],
+        'publisher': row[3], 'description': row[4], 'category': row[5],
+    }
+
+
+def load_documents(cursor):
+    cursor.execute(DOCUMENT_SQL + " WHERE b.status = 'approved'")
+    return [book_document(row) for row in cursor.fetchall()]
+
+
+def load(cursor, model):
+    """Xây model từ sách đang bán và ghi nhận phiên bản 'books' tương ứng"""
+    # Đọc phiên bản trước: thay đổi commit trong lúc xây sẽ được áp dụng lại ở lần catch_up sau
+    version = versions.current(cursor, 'books')
+    model.build(load_documents(cursor))
+    model.version = version
+
+
+def catch_up(cursor, model):
+    """Áp dụng các sách đã đổi (change_seq) sau phiên bản của model; trả về số sách đã áp dụng"""
+    version = versions.current(cursor, 'books')
+    if version <= model.version:
+        return 0
+    cursor.execute(DOCUMENT_SQL + " WHERE b.change_seq > ?", (model.version,))
+    rows = cursor.fetchall()
+    for row in rows:
+        if row[6] == 'approved':
+            model.add(book_document(row))
+        else:
+            model.remove(row[0])
+    model.version = version
+    return len(rows)
+
+
+def document_terms(book):
+    """Tần suất có trọng số theo trường của các token (bỏ token một ký tự)"""
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = book.get(field)
+        if value is None:
+            continue
+        for token in tokenize(str(value)):
+            if len(token) > 1:
+                terms[token] = terms.get(token, 0.0) + weight
+    return terms
+
+
+class SimilarityModel:
+    """Vector TF-IDF đã chuẩn hóa của các sách đang bán, cập nhật được từng sách"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._idf = {}
+        self._rare_idf = 1.0
+        self._vectors = {}   # book_id -> {token: trọng số, chuẩn L2 = 1}
+        self._postings = {}  # token -> {book_id: trọng số}
+        self.version = 0     # phiên bản 'books' đã áp dụng
+        self.ready = False
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def __contains__(self, book_id):
+        return book_id in self._vectors
+
+    def build(self, books):
+        """Xây lại từ iterable các dict sách; tính lại IDF"""
+        documents = {book['book_id']: document_terms(book) for book in books}
+        doc_freq = {}
+        for terms in documents.values():
+            for token in terms:
+                doc_freq[token] = doc_freq.get(token, 0) + 1
+        count = len(documents)
+        idf = {token: math.log((1 + count) / (1 + df)) + 1 for token, df in doc_freq.items()}
+        rare_idf = math.log((1 + count) / 2) + 1
+
+        vectors = {book_id: self._vector(terms, idf, rare_idf) for book_id, terms in documents.items()}
+        postings = {}
+        for book_id, vector in vectors.items():
+            for token, weight in vector.items():
+                postings.setdefault(token, {})[book_id] = weight
+        with self._lock:
+            self._idf = idf
+            self._rare_idf = rare_idf
+            self._vectors = vectors
+            self._postings = postings
+            self.ready = True
+
+    @staticmethod
+    def _vector(terms, idf, rare_idf):
+        weights = {token: tf * idf.get(token, rare_idf) for token, tf in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        return {token: weight / norm for token, weight in weights.items()} if norm else {}
+
+    def add(self, book):
+        """Thêm hoặc cập nhật một sách với IDF hiện có"""
+        with self._lock:
+            self._remove_locked(book['book_id'])
+            vector = self._vector(document_terms(book), self._idf, self._rare_idf)
+            self._vectors[book['book_id']] = vector
+            for token, weight in vector.items():
+                self._postings.setdefault(token, {})[book['book_id']] = weight
+
+    def remove(self, book_id):
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def _remove_locked(self, book_id):
+        for token in self._vectors.pop(book_id, ()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(book_id, None)
+                if not posting:
+                    del self._postings[token]
+
+    def similarities(self, book_id, min_score=0.0):
+        """{other_id: cosine} của các sách có chung token với book_id, bỏ điểm dưới min_score"""
+        scores = {}
+        with self._lock:
+            for token, weight in self._vectors.get(book_id, {}).items():
+                for other_id, other_weight in self._postings[token].items():
+                    scores[other_id] = scores.get(other_id, 0.0) + weight * other_weight
+        scores.pop(book_id, None)
+        return {other_id: score for other_id, score in scores.items() if score >= min_score}
+
+    def neighbors(self, book_id, top_k, min_score=0.0):
+        """[(other_id, score)] gần nhất trước; hòa điểm thì id nhỏ hơn trước"""
+        return heapq.nsmallest(top_k, self.similarities(book_id, min_score).items(),
+                               key=lambda item: (-item[1], item[0]))
+
+    def all_neighbors(self, top_k, min_score=0.0, batch_size=256):
+        """Các dòng (book_id, other_id, score) top-K của mọi sách"""
+        lib = _load_scipy()
+        with self._lock:
+            if lib:
+                return self._all_neighbors_sparse(top_k, min_score, batch_size, *lib)
+            return [(book_id, other_id, score) for book_id in sorted(self._vectors)
+                    for other_id, score in self.neighbors(book_id, top_k, min_score)]
+
+    def _all_neighbors_sparse(self, top_k, min_score, batch_size, np, sparse):
+        # Cột sắp theo id tăng dần nên lexsort cho cùng thứ tự hòa điểm như neighbors()
+        ids = sorted(self._vectors)
+        if not ids:
+            return []
+        columns = {token: i for i, token in enumerate(self._postings)}
+        indptr = [0]
+        indices = []
+        data = []
+        for book_id in ids:
+            for token, weight in self._vectors[book_id].items():
+                indices.append(columns[token])
+                data.append(weight)
+            indptr.append(len(indices))
+        matrix = sparse.csr_matrix((np.asarray(data), np.asarray(indices), np.asarray(indptr)),
+                                   shape=(len(ids), len(columns)))
+        transposed = matrix.T.tocsr()
+        id_array = np.asarray(ids)
+
+        rows = []
+        # Mỗi lô chỉ giữ một khối batch_size x số sách, không bao giờ cả ma trận sách x sách
+        for start in range(0, len(ids), batch_size):
+            block = (matrix[start:start + batch_size] @ transposed).tocsr()
+            for offset in range(block.shape[0]):
+                lo, hi = block.indptr[offset], block.indptr[offset + 1]
+                cols = block.indices[lo:hi]
+                scores = block.data[lo:hi]
+                keep = (cols != start + offset) & (scores >= min_score)
+                cols, scores = cols[keep], scores[keep]
+                best = np.lexsort((cols, -scores))[:top_k]
+                book_id = ids[start + offset]
+                rows.extend(zip([book_id] * len(best), id_array[cols[best]].tolist(), scores[best].tolist()))
+        return rows
+
+    def stats(self):
+        with self._lock:
+            return {
+                'books': len(self._vectors),
+                'terms': len(self._postings),
+                'ready': self.ready,
+            }
+
+
+def _insert_rows(cursor, rows, batch_size=1000):
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany("INSERT INTO BookSimilar (book_id, other_id, score) VALUES (?, ?, ?)",
+                           rows[start:start + batch_size])
+
+
+def rebuild(cursor, model, top_k, min_score, batch_size=256):
+    """Xây lại model từ sách đang bán và ghi lại toàn bộ BookSimilar; trả về số dòng. Caller commit"""
+    load(cursor, model)
+    rows = model.all_neighbors(top_k, min_score, batch_size)
+    cursor.execute("DELETE FROM BookSimilar")
+    _insert_rows(cursor, rows)
+    return len(rows)
+
+
+def _list_floors(cursor, book_ids, chunk_size=500):
+    """{book_id: (số hàng xóm, điểm thấp nhất)} trong BookSimilar"""
+    floors = {}
+    for start in range(0, len(book_ids), chunk_size):
+        chunk = book_ids[start:start + chunk_size]
+        cursor.execute(f"""
+            SELECT book_id, COUNT(*), MIN(score) FROM BookSimilar
+            WHERE book_id IN ({', '.join('?' * len(chunk))})
+            GROUP BY book_id
+        """, chunk)
+        for book_id, count, floor in cursor.fetchall():
+            floors[book_id] = (count, floor)
+    return floors
+
+
+def update_book(cursor, model, book_id, top_k, min_score):
+    """Ghi lại các dòng BookSimilar bị ảnh hưởng sau khi book_id được thêm/sửa hoặc bị ẩn
+    (model đã catch_up tới thay đổi đó). Trả về số sách có danh sách được ghi lại. Caller commit.
+
+    Bị ảnh hưởng: chính sách đó, các sách đang liệt kê nó (điểm cũ không còn đúng) và các sách
+    có điểm với nó vượt điểm thấp nhất trong top-K hiện tại của chúng.
+    """
+    cursor.execute("SELECT book_id FROM BookSimilar WHERE other_id = ?", (book_id,))
+    listed_by = {row[0] for row in cursor.fetchall()}
+    cursor.execute("DELETE FROM BookSimilar WHERE book_id = ? OR other_id = ?", (book_id, book_id))
+
+    scores = model.similarities(book_id, min_score) if book_id in model else {}
+    _insert_rows(cursor, [(book_id, other_id, score)
+                          for other_id, score in model.neighbors(book_id, top_k, min_score)])
+
+    recompute = {other_id for other_id in listed_by if other_id in model}
+    appended = []
+    candidates = [other_id for other_id in scores if other_id not in recompute]
+    floors = _list_floors(cursor, candidates)
+    for other_id in candidates:
+        count, floor = floors.get(other_id, (0, 0.0))
+        if count < top_k:
+            appended.append((other_id, book_id, scores[other_id]))
+        elif scores[other_id] > floor:
+            recompute.add(other_id)
+    _insert_rows(cursor, appended)
+
+    for other_id in recompute:
+        cursor.execute("DELETE FROM BookSimilar WHERE book_id = ?", (other_id,))
+        _insert_rows(cursor, [(other_id, neighbor_id, score)
+                              for neighbor_id, score in model.neighbors(other_id, top_k, min_score)])
+    return 1 + len(appended) + len(recompute)
+
+
+if __name__ == '__main__':
+    # python similar.py rebuild  -> tính lại BookSimilar từ sách đang bán
+    from config import get_config
+    from storage import get_storage
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('Cách dùng: python similar.py rebuild')
+        sys.exit(1)
+
+    cfg = get_config()
+    storage = get_storage(cfg)
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        storage.ensure_schema(conn)
+        count = rebuild(cursor, SimilarityModel(), cfg.SIMILAR_TOP_K, cfg.SIMILAR_MIN_SCORE,
+                        cfg.SIMILAR_BATCH_SIZE)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+    print(f'Đã tính lại sách tương tự: {count} cặp sách.')
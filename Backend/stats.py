@@ -0,0 +1,68 @@
+import datetime
+import os
+import threading
+
+# Số liệu tổng quan cho dashboard admin, giữ sẵn trong bộ nhớ:
+#   - các route ghi (đăng ký, đặt hàng...) cộng dồn ngay sau khi commit
+#   - một thread nền định kỳ tính lại từ DB để sửa sai lệch (dữ liệu sửa ngoài
+#     app, nhiều worker mỗi worker một bản sao...)
+# Đọc snapshot là O(1), không chạm DB.
+
+
+class StatsSnapshot:
+    """Bộ đếm cộng dồn + đối chiếu định kỳ bằng loader() trả về dict số liệu"""
+
+    def __init__(self, loader, interval=300.0):
+        self._loader = loader
+        self.interval = interval
+        self._values = None
+        self._computed_at = None
+        self._lock = threading.Lock()
+        self._reconcile_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+
+    def reconcile(self):
+        """Tính lại toàn bộ số liệu từ DB (chạy bởi thread nền hoặc lần đọc đầu tiên)"""
+        with self._reconcile_lock:
+            values = self._loader()
+            with self._lock:
+                self._values = dict(values)
+                self._computed_at = datetime.datetime.now()
+
+    def add(self, name, delta=1):
+        """Cộng dồn sau một thao tác ghi đã commit; bỏ qua nếu chưa có snapshot"""
+        with self._lock:
+            if self._values is not None:
+                self._values[name] = self._values.get(name, 0) + delta
+
+    def get(self):
+        self._ensure_thread()
+        if self._values is None:
+            self.reconcile()
+        with self._lock:
+            data = dict(self._values)
+            data['computed_at'] = self._computed_at.strftime('%Y-%m-%d %H:%M:%S')
+        return data
+
+    def _ensure_thread(self):
+        # Thread không sống qua fork(): mỗi worker tự khởi động thread của mình
+        if self.interval <= 0 or (self._thread is not None and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='stats-reconcile', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reconcile()
+            except Exception as e:
+                print(f"Stats reconcile error: {e}")
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,486 @@
+import datetime
+import decimal
+import re
+import sqlite3
+import sys
+import threading
+
+import ratings
+from versions import NAMESPACES
+
+# Lớp lưu trữ: cùng một giao diện cho SQL Server (production) và SQLite
+# (chạy/benchmark trên máy Linux bình thường). Câu SQL trong app giữ nguyên
+# hình dạng; mỗi backend chỉ lo phần khác biệt về phương ngữ.
+
+# (tên, bảng, cột) - chỉ mục dùng chung cho cả hai backend
+INDEXES = [
+    # Phân trang keyset cho /api/books theo từng kiểu sắp xếp
+    ('IX_Books_status_created', 'Books', 'status, created_at, book_id'),
+    ('IX_Books_status_price', 'Books', 'status, price, book_id'),
+    ('IX_Books_status_title', 'Books', 'status, title, book_id'),
+    ('IX_Books_status_rating', 'Books', 'status, rating, book_id'),
+    # Review mới nhất của một sách (chi tiết sách, phân trang /api/books/<id>/reviews)
+    ('IX_Reviews_book_created', 'Reviews', 'book_id, created_at, review_id'),
+    # Lịch sử đơn hàng của buyer và chi tiết theo đơn
+    ('IX_Orders_buyer_created', 'Orders', 'buyer_id, created_at, order_id'),
+    ('IX_OrderDetails_order', 'OrderDetails', 'order_id'),
+    # Hàng đợi đơn hàng của admin: theo thời gian và theo trạng thái
+    ('IX_Orders_created', 'Orders', 'created_at, order_id'),
+    ('IX_Orders_status_created', 'Orders', 'status, created_at, order_id'),
+    # Báo cáo doanh số: mọi khóa của một chiều trong một khoảng ngày
+    ('IX_SalesDaily_dimension_date', 'SalesDaily', 'dimension, sale_date'),
+    # Các worker theo kịp sách đã đổi (change_seq > phiên bản đã áp dụng), xem versions.py
+    ('IX_Books_change_seq', 'Books', 'change_seq'),
+    ('IX_Reviews_change_seq', 'Reviews', 'change_seq'),
+    # Sách liệt kê một sách trong top-K tương tự (cập nhật khi sách đó đổi/bị ẩn)
+    ('IX_BookSimilar_other', 'BookSimilar', 'other_id'),
+]
+
+# (bảng, cột, kiểu chung) - cột bổ sung cho bảng đã có sẵn, thêm nếu còn thiếu
+COLUMNS = [
+    # Tổng hợp đánh giá cập nhật dần theo từng review (xem ratings.py)
+    ('Books', 'rating_sum', 'FLOAT NOT NULL DEFAULT 0'),
+    ('Books', 'rating_count', 'INT NOT NULL DEFAULT 0'),
+    ('Books', 'rating_1', 'INT NOT NULL DEFAULT 0'),
+    ('Books', 'rating_2', 'INT NOT NULL DEFAULT 0'),
+    ('Books', 'rating_3', 'INT NOT NULL DEFAULT 0'),
+    ('Books', 'rating_4', 'INT NOT NULL DEFAULT 0'),
+    ('Books', 'rating_5', 'INT NOT NULL DEFAULT 0'),
+    # Phiên bản CatalogVersions('books') của lần ghi gần nhất vào sách (xem versions.py)
+    ('Books', 'change_seq', 'INT NULL'),
+    # Phiên bản CatalogVersions('reviews') lúc review được thêm
+    ('Reviews', 'change_seq', 'INT NULL'),
+]
+
+class Storage:
+    """Giao diện chung của các backend lưu trữ"""
+
+    name = None
+
+    def connect(self):
+        """Mở một kết nối DB-API mới (paramstyle '?', autocommit tắt)"""
+        raise NotImplementedError
+
+    def ensure_schema(self, conn):
+        """Tạo các bảng và chỉ mục còn thiếu"""
+        cursor = conn.cursor()
+        try:
+            for statement in self.schema_statements():
+                cursor.execute(statement)
+            added = [(table, column) for table, column, definition in COLUMNS
+                     if self.add_column(cursor, table, column, definition)]
+            if ('Books', 'rating_count') in added:
+                # Cột tổng hợp đánh giá vừa thêm đều bằng 0: tính từ các review có sẵn,
+                # nếu không review mới đầu tiên sẽ ghi đè điểm trung bình cũ
+                ratings.rebuild(cursor, reset=False)
+            for name, table, columns in INDEXES:
+                cursor.execute(self.index_statement(name, table, columns))
+            for namespace in NAMESPACES:
+                cursor.execute("INSERT INTO CatalogVersions (namespace, version) SELECT ?, 0 "
+                               "WHERE NOT EXISTS (SELECT 1 FROM CatalogVersions WHERE namespace = ?)",
+                               (namespace, namespace))
+            conn.commit()
+        finally:
+            cursor.close()
+
+    def schema_statements(self):
+        raise NotImplementedError
+
+    def index_statement(self, name, table, columns):
+        raise NotImplementedError
+
+    def add_column(self, cursor, table, column, definition):
+        """Thêm cột vào bảng nếu chưa có; trả về True nếu vừa thêm"""
+        raise NotImplementedError
+
+    def insert_returning_id(self, cursor, sql, params, id_column):
+        """Chạy câu INSERT ... VALUES (...) và trả về khóa vừa sinh"""
+        raise NotImplementedError
+
+    def limit_clause(self):
+        """Mệnh đề giới hạn số dòng, đặt sau ORDER BY, nhận một tham số '?'"""
+        raise NotImplementedError
+
+    def datetime_param(self):
+        """Placeholder cho tham số datetime so sánh bằng với cột DATETIME"""
+        return '?'
+
+    def date_sql(self, column):
+        """Biểu thức SQL lấy phần ngày của cột DATETIME"""
+        raise NotImplementedError
+
+    def increment_sql(self, table, key_columns, value_columns):
+        """Câu upsert cộng dồn: thêm dòng mới hoặc cộng value_columns vào dòng có cùng khóa.
+
+        Tham số theo thứ tự key_columns rồi value_columns.
+        """
+        raise NotImplementedError
+
+
+# ==================== SQL SERVER ====================
+
+class SqlServerStorage(Storage):
+    name = 'sqlserver'
+
+    def __init__(self, connection_string):
+        self.connection_string = connection_string
+
+    def connect(self):
+        import pyodbc
+        conn = pyodbc.connect(self.connection_string)
+        conn.autocommit = False # Tắt autocommit để quản lý transaction
+        return conn
+
+    def schema_statements(self):
+        return [
+            """IF OBJECT_ID('Users') IS NULL CREATE TABLE Users (
+                user_id INT IDENTITY(1,1) PRIMARY KEY,
+                fullname NVARCHAR(100) NOT NULL,
+                email NVARCHAR(100) NOT NULL UNIQUE,
+                phone NVARCHAR(20),
+                password NVARCHAR(255) NOT NULL,
+                role NVARCHAR(20) NOT NULL DEFAULT 'buyer',
+                status NVARCHAR(20) NOT NULL DEFAULT 'active',
+                created_at DATETIME NOT NULL DEFAULT GETDATE()
+            )""",
+            """IF OBJECT_ID('Categories') IS NULL CREATE TABLE Categories (
+                category_id INT IDENTITY(1,1) PRIMARY KEY,
+                category_name NVARCHAR(100) NOT NULL,
+                description NVARCHAR(1000),
+                created_at DATETIME DEFAULT GETDATE()
+            )""",
+            """IF OBJECT_ID('Books') IS NULL CREATE TABLE Books (
+                book_id INT IDENTITY(1,1) PRIMARY KEY,
+                title NVARCHAR(255) NOT NULL,
+                author NVARCHAR(255),
+                price DECIMAL(18,2) NOT NULL DEFAULT 0,
+                old_price DECIMAL(18,2),
+                description NVARCHAR(MAX),
+                stock INT NOT NULL DEFAULT 0,
+                rating FLOAT DEFAULT 0,
+                image_url NVARCHAR(500),
+                category_id INT REFERENCES Categories(category_id),
+                seller_id INT REFERENCES Users(user_id),
+                isbn NVARCHAR(20),
+                condition NVARCHAR(20) DEFAULT 'new',
+                publisher NVARCHAR(255),
+                publish_year INT,
+                status NVARCHAR(20) NOT NULL DEFAULT 'pending',
+                created_at DATETIME NOT NULL DEFAULT GETDATE()
+            )""",
+            """IF OBJECT_ID('Reviews') IS NULL CREATE TABLE Reviews (
+                review_id INT IDENTITY(1,1) PRIMARY KEY,
+                book_id INT NOT NULL REFERENCES Books(book_id),
+                user_id INT REFERENCES Users(user_id),
+                rating FLOAT NOT NULL,
+                comment NVARCHAR(MAX),
+                created_at DATETIME NOT NULL DEFAULT GETDATE()
+            )""",
+            """IF OBJECT_ID('Orders') IS NULL CREATE TABLE Orders (
+                order_id INT IDENTITY(1,1) PRIMARY KEY,
+                buyer_id INT NOT NULL REFERENCES Users(user_id),
+                total_amount DECIMAL(18,2) NOT NULL DEFAULT 0,
+                status NVARCHAR(20) NOT NULL DEFAULT 'pending',
+                shipping_address NVARCHAR(500),
+                phone NVARCHAR(20),
+                payment_method NVARCHAR(20),
+                notes NVARCHAR(1000),
+                created_at DATETIME NOT NULL DEFAULT GETDATE()
+            )""",
+            """IF OBJECT_ID('OrderDetails') IS NULL CREATE TABLE OrderDetails (
+                order_detail_id INT IDENTITY(1,1) PRIMARY KEY,
+                order_id INT NOT NULL REFERENCES Orders(order_id),
+                book_id INT NOT NULL REFERENCES Books(book_id),
+                quantity INT NOT NULL,
+                price DECIMAL(18,2) NOT NULL
+            )""",
+            """IF OBJECT_ID('SalesDaily') IS NULL CREATE TABLE SalesDaily (
+                sale_date DATE NOT NULL,
+                dimension NVARCHAR(10) NOT NULL,
+                dim_id INT NOT NULL,
+                units INT NOT NULL DEFAULT 0,
+                revenue DECIMAL(18,2) NOT NULL DEFAULT 0,
+                orders INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, dim_id, sale_date)
+            )""",
+            """IF OBJECT_ID('CoPurchase') IS NULL CREATE TABLE CoPurchase (
+                book_id INT NOT NULL,
+                other_id INT NOT NULL,
+                orders INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (book_id, other_id)
+            )""",
+            """IF OBJECT_ID('CoPurchaseQueue') IS NULL CREATE TABLE CoPurchaseQueue (
+                order_id INT NOT NULL PRIMARY KEY
+            )""",
+            """IF OBJECT_ID('CatalogVersions') IS NULL CREATE TABLE CatalogVersions (
+                namespace NVARCHAR(20) NOT NULL PRIMARY KEY,
+                version INT NOT NULL DEFAULT 0
+            )""",
+            """IF OBJECT_ID('BookSimilar') IS NULL CREATE TABLE BookSimilar (
+                book_id INT NOT NULL,
+                other_id INT NOT NULL,
+                score FLOAT NOT NULL,
+                PRIMARY KEY (book_id, other_id)
+            )""",
+        ]
+
+    def index_statement(self, name, table, columns):
+        return (f"IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = '{name}') "
+                f"CREATE INDEX {name} ON {table} ({columns})")
+
+    def add_column(self, cursor, table, column, definition):
+        cursor.execute("SELECT COL_LENGTH(?, ?)", (table, column))
+        if cursor.fetchone()[0] is not None:
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD {column} {definition}")
+        return True
+
+    def insert_returning_id(self, cursor, sql, params, id_column):
+        sql = re.sub(r'\bVALUES\b', f'OUTPUT INSERTED.{id_column} VALUES', sql, count=1, flags=re.IGNORECASE)
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0]
+
+    def limit_clause(self):
+        return ' OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY'
+
+    def datetime_param(self):
+        # DATETIME làm tròn theo 1/300 giây; ép kiểu để so sánh bằng khớp lại đúng giá trị đã đọc
+        return 'CAST(? AS DATETIME)'
+
+    def date_sql(self, column):
+        return f'CAST({column} AS DATE)'
+
+    def increment_sql(self, table, key_columns, value_columns):
+        columns = list(key_columns) + list(value_columns)
+        # HOLDLOCK: hai transaction cùng chèn một khóa mới không đụng nhau ở nhánh INSERT
+        return (f"MERGE {table} WITH (HOLDLOCK) AS t "
+                f"USING (SELECT {', '.join(f'? AS {c}' for c in columns)}) AS s "
+                f"ON {' AND '.join(f't.{c} = s.{c}' for c in key_columns)} "
+                f"WHEN MATCHED THEN UPDATE SET {', '.join(f't.{c} = t.{c} + s.{c}' for c in value_columns)} "
+                f"WHEN NOT MATCHED THEN INSERT ({', '.join(columns)}) "
+                f"VALUES ({', '.join(f's.{c}' for c in columns)});")
+
+
+# ==================== SQLITE ====================
+
+def _now():
+    return datetime.datetime.now().isoformat(' ', timespec='microseconds')
+
+def _parse_datetime(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(' ', timespec='microseconds'))
+sqlite3.register_adapter(decimal.Decimal, float)
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_converter('DATETIME', _parse_datetime)
+sqlite3.register_converter('DATE', lambda value: datetime.date.fromisoformat(value.decode()))
+
+
+# DEFAULT của cột DATETIME cùng định dạng với adapter và GETDATE() ('YYYY-MM-DD HH:MM:SS.ffffff'):
+# cột được so sánh như chuỗi nên mọi dòng phải cùng định dạng thì keyset mới đúng
+_SQLITE_NOW = "(strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime') || '000')"
+_DATETIME_TABLES = ('Users', 'Categories', 'Books', 'Reviews', 'Orders')
+
+
+def _normalize_created_at(conn):
+    # Dòng do DEFAULT CURRENT_TIMESTAMP cũ ghi ('YYYY-MM-DD HH:MM:SS'): đưa về định dạng đầy đủ
+    for table in _DATETIME_TABLES:
+        conn.execute(f"UPDATE {table} SET created_at = created_at || '.000000' WHERE length(created_at) = 19")
+
+
+# Migration dữ liệu của file SQLite, đánh số theo PRAGMA user_version: mỗi hàm chạy đúng
+# một lần cho mỗi file DB
+_SQLITE_MIGRATIONS = [
+    _normalize_created_at,
+]
+
+
+class _SqliteConnection(sqlite3.Connection):
+    # Các route kiểm tra conn.autocommit giống như với pyodbc
+    autocommit = False
+
+
+class SqliteStorage(Storage):
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            factory=_SqliteConnection,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,  # kết nối được pool chuyển giữa các thread
+            timeout=30,
+        )
+        # Hàm của SQL Server mà câu SQL trong app đang dùng
+        # (ISNULL là từ khóa của SQLite nên app dùng COALESCE cho cả hai backend)
+        conn.create_function('GETDATE', 0, _now)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    self.ensure_schema(conn)
+                    self._schema_ready = True
+        return conn
+
+    def ensure_schema(self, conn):
+        super().ensure_schema(conn)
+        applied = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, migration in enumerate(_SQLITE_MIGRATIONS[applied:], applied + 1):
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+            conn.commit()
+
+    def schema_statements(self):
+        return [
+            f"""CREATE TABLE IF NOT EXISTS Users (
+                user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fullname TEXT NOT NULL,
+                email TEXT NOT NULL UNIQUE,
+                phone TEXT,
+                password TEXT NOT NULL,
+                role TEXT NOT NULL DEFAULT 'buyer',
+                status TEXT NOT NULL DEFAULT 'active',
+                created_at DATETIME NOT NULL DEFAULT {_SQLITE_NOW}
+            )""",
+            f"""CREATE TABLE IF NOT EXISTS Categories (
+                category_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category_name TEXT NOT NULL,
+                description TEXT,
+                created_at DATETIME DEFAULT {_SQLITE_NOW}
+            )""",
+            f"""CREATE TABLE IF NOT EXISTS Books (
+                book_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT,
+                price REAL NOT NULL DEFAULT 0,
+                old_price REAL,
+                description TEXT,
+                stock INTEGER NOT NULL DEFAULT 0,
+                rating REAL DEFAULT 0,
+                image_url TEXT,
+                category_id INTEGER REFERENCES Categories(category_id),
+                seller_id INTEGER REFERENCES Users(user_id),
+                isbn TEXT,
+                condition TEXT DEFAULT 'new',
+                publisher TEXT,
+                publish_year INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at DATETIME NOT NULL DEFAULT {_SQLITE_NOW}
+            )""",
+            f"""CREATE TABLE IF NOT EXISTS Reviews (
+                review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                book_id INTEGER NOT NULL REFERENCES Books(book_id),
+                user_id INTEGER REFERENCES Users(user_id),
+                rating REAL NOT NULL,
+                comment TEXT,
+                created_at DATETIME NOT NULL DEFAULT {_SQLITE_NOW}
+            )""",
+            f"""CREATE TABLE IF NOT EXISTS Orders (
+                order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                buyer_id INTEGER NOT NULL REFERENCES Users(user_id),
+                total_amount REAL NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                shipping_address TEXT,
+                phone TEXT,
+                payment_method TEXT,
+                notes TEXT,
+                created_at DATETIME NOT NULL DEFAULT {_SQLITE_NOW}
+            )""",
+            """CREATE TABLE IF NOT EXISTS OrderDetails (
+                order_detail_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER NOT NULL REFERENCES Orders(order_id),
+                book_id INTEGER NOT NULL REFERENCES Books(book_id),
+                quantity INTEGER NOT NULL,
+                price REAL NOT NULL
+            )""",
+            """CREATE TABLE IF NOT EXISTS SalesDaily (
+                sale_date DATE NOT NULL,
+                dimension TEXT NOT NULL,
+                dim_id INTEGER NOT NULL,
+                units INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                orders INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, dim_id, sale_date)
+            )""",
+            """CREATE TABLE IF NOT EXISTS CoPurchase (
+                book_id INTEGER NOT NULL,
+                other_id INTEGER NOT NULL,
+                orders INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (book_id, other_id)
+            )""",
+            """CREATE TABLE IF NOT EXISTS CoPurchaseQueue (
+                order_id INTEGER NOT NULL PRIMARY KEY
+            )""",
+            """CREATE TABLE IF NOT EXISTS CatalogVersions (
+                namespace TEXT NOT NULL PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )""",
+            """CREATE TABLE IF NOT EXISTS BookSimilar (
+                book_id INTEGER NOT NULL,
+                other_id INTEGER NOT NULL,
+                score REAL NOT NULL,
+                PRIMARY KEY (book_id, other_id)
+            )""",
+        ]
+
+    def index_statement(self, name, table, columns):
+        return f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+
+    def add_column(self, cursor, table, column, definition):
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column in {row[1] for row in cursor.fetchall()}:
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+
+    def insert_returning_id(self, cursor, sql, params, id_column):
+        cursor.execute(sql, params)
+        return cursor.lastrowid
+
+    def limit_clause(self):
+        return ' LIMIT ?'
+
+    def date_sql(self, column):
+        return f'date({column})'
+
+    def increment_sql(self, table, key_columns, value_columns):
+        columns = list(key_columns) + list(value_columns)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET "
+                + ', '.join(f'{c} = {c} + excluded.{c}' for c in value_columns))
+
+
+# ==================== FACTORY ====================
+
+def get_storage(config):
+    """Chọn backend theo config.DB_BACKEND ('sqlserver' hoặc 'sqlite')"""
+    backend = (config.DB_BACKEND or 'sqlserver').lower()
+    if backend == 'sqlite':
+        return SqliteStorage(config.SQLITE_PATH)
+    if backend == 'sqlserver':
+        return SqlServerStorage(config.get_connection_string())
+    raise ValueError(f'DB_BACKEND không hợp lệ: {config.DB_BACKEND}')
+
+
+if __name__ == '__main__':
+    # python storage.py init  -> tạo các bảng còn thiếu trên backend đang cấu hình
+    from config import get_config
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'init':
+        print('Cách dùng: python storage.py init')
+        sys.exit(1)
+
+    storage = get_storage(get_config())
+    conn = storage.connect()
+    try:
+        storage.ensure_schema(conn)
+    finally:
+        conn.close()
+    print(f'Đã khởi tạo schema ({storage.name}).')
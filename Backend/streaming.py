@@ -0,0 +1,63 @@
+import json
+
+from flask import Response, stream_with_context
+
+# Trả danh sách lớn theo kiểu streaming: đọc cursor theo lô fetchmany() và
+# gửi dần từng mảnh JSON, bộ nhớ mỗi request không phụ thuộc số dòng.
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def _dumps(obj):
+    # default=str: datetime/Decimal giống cách jsonify đang trả về
+    return json.dumps(obj, ensure_ascii=False, default=str, separators=(',', ':'))
+
+
+def iter_rows(cursor, batch_size):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def wants_ndjson(request):
+    """?format=ndjson hoặc header Accept: application/x-ndjson"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def stream_rows(cursor, key, row_to_dict, batch_size=500, ndjson=False, extra=None):
+    """Response streaming từ cursor đã execute.
+
+    JSON: {"<key>": [...], **extra} - cùng hình dạng với phản hồi jsonify cũ.
+    NDJSON: mỗi dòng một object. Cursor được đóng khi stream kết thúc.
+    """
+    def generate_json():
+        yield '{"' + key + '":['
+        first = True
+        for row in iter_rows(cursor, batch_size):
+            item = _dumps(row_to_dict(row))
+            yield item if first else ',' + item
+            first = False
+        yield ']'
+        for name, value in (extra or {}).items():
+            yield ',' + _dumps(name) + ':' + _dumps(value)
+        yield '}'
+
+    def generate_ndjson():
+        for row in iter_rows(cursor, batch_size):
+            yield _dumps(row_to_dict(row)) + '\n'
+
+    def generate():
+        try:
+            yield from (generate_ndjson() if ndjson else generate_json())
+        except Exception as e:
+            # Header đã gửi đi nên không đổi được status; cắt stream và ghi log
+            print(f"Stream {key} error: {e}")
+        finally:
+            cursor.close()
+
+    mimetype = NDJSON_MIMETYPE if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
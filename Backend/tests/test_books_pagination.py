@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# Chạy trên SQLite tạm: python -m pytest Backend/tests (hoặc python -m unittest từ Backend)
+_db_dir = tempfile.mkdtemp()
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(_db_dir, 'test.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as bookstore  # noqa: E402
+import seed_books  # noqa: E402
+
+
+class NewestFirstPaginationTest(unittest.TestCase):
+    """Duyệt hết /api/books theo created_at giảm dần qua next_cursor"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = bookstore.create_app('testing')
+        seed_books.main()
+        conn = bookstore.db_pool.acquire()
+        try:
+            # Sách không ghi created_at (dùng DEFAULT của cột) lẫn với sách ghi GETDATE(),
+            # nhiều sách trùng cùng một giây
+            conn.executemany("INSERT INTO Books (title, price, status) VALUES (?, 1, 'approved')",
+                             [(f'Default {i}',) for i in range(30)])
+            conn.executemany("INSERT INTO Books (title, price, status, created_at) VALUES (?, 1, 'approved', GETDATE())",
+                             [(f'Explicit {i}',) for i in range(30)])
+            conn.commit()
+            cls.approved_ids = {row[0] for row in conn.execute("SELECT book_id FROM Books WHERE status = 'approved'")}
+        finally:
+            conn.close()
+
+    def test_every_book_exactly_once(self):
+        client = self.app.test_client()
+        seen = []
+        url = '/api/books?sort_by=created_at&limit=7'
+        for _ in range(len(self.approved_ids)):
+            data = client.get(url).get_json()
+            seen.extend(book['id'] for book in data['books'])
+            if not data['next_cursor']:
+                break
+            url = f"/api/books?sort_by=created_at&limit=7&cursor={data['next_cursor']}"
+        else:
+            self.fail('Phân trang không kết thúc')
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), self.approved_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+# Chạy trên SQLite tạm: python -m pytest Backend/tests (hoặc python -m unittest từ Backend)
+_db_dir = tempfile.mkdtemp()
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(_db_dir, 'test.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as bookstore  # noqa: E402
+import seed_books  # noqa: E402
+import versions  # noqa: E402
+
+
+class SalesRollupRefreshTest(unittest.TestCase):
+    """Hủy một đơn mới hơn lần tính lại gần nhất không làm các ngày ở giữa bị bỏ sót"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = bookstore.create_app('testing')
+        seed_books.main()
+        bookstore.settings.ANALYTICS_REFRESH_INTERVAL = 0
+        client = cls.app.test_client()
+        token = client.post('/api/auth/login', json={'email': 'admin@local', 'password': 'adminpass'}).get_json()['token']
+        cls.headers = {'Authorization': f'Bearer {token}'}
+        cls.today = datetime.date.today()
+
+    def _day(self, offset):
+        return self.today + datetime.timedelta(days=offset)
+
+    def _insert_order(self, conn, offset):
+        created_at = datetime.datetime.combine(self._day(offset), datetime.time(12))
+        buyer_id = conn.execute("SELECT user_id FROM Users WHERE email = 'buyer@local'").fetchone()[0]
+        order_id = conn.execute("INSERT INTO Orders (buyer_id, total_amount, status, created_at) "
+                                "VALUES (?, 10, 'pending', ?)", (buyer_id, created_at)).lastrowid
+        conn.execute("INSERT INTO OrderDetails (order_id, book_id, quantity, price) VALUES (?, 1, 1, 10)",
+                     (order_id,))
+        return order_id
+
+    def _report(self, client):
+        url = f'/api/admin/analytics?date_from={self._day(-12)}&date_to={self._day(-1)}'
+        response = client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_cancel_after_last_refresh_keeps_days_in_between(self):
+        client = self.app.test_client()
+        conn = bookstore.db_pool.acquire()
+        try:
+            self._insert_order(conn, -10)
+            conn.commit()
+            self.assertEqual(self._report(client)['totals']['orders'], 1)
+
+            # Lần tính lại gần nhất là ngày -10; các đơn sau đó chưa được tổng hợp
+            versions.store(conn.cursor(), 'sales_rollup', self._day(-10).toordinal())
+            for offset in (-8, -7):
+                self._insert_order(conn, offset)
+            cancelled = self._insert_order(conn, -5)
+            conn.commit()
+        finally:
+            conn.close()
+
+        response = client.post(f'/api/admin/orders/{cancelled}/status', json={'status': 'cancelled'},
+                               headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        report = self._report(client)
+        self.assertEqual(report['totals']['orders'], 3)
+        by_day = {item['period']: item['orders'] for item in report['series']}
+        self.assertEqual([by_day[self._day(offset).isoformat()] for offset in (-10, -8, -7, -5)], [1, 1, 1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
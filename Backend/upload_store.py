@@ -0,0 +1,83 @@
+import hashlib
+import os
+import re
+import uuid
+
+# Lưu ảnh tải lên theo nội dung: tên file = sha256 của nội dung + đuôi file.
+# - Ghi từng khối ra file tạm đồng thời tính hash, không giữ cả file trong RAM
+# - Hai ảnh giống hệt nhau dùng chung một file (khử trùng lặp)
+# - Nội dung của một tên file không bao giờ đổi, nên có thể cache vĩnh viễn
+#   (Cache-Control: immutable)
+
+CHUNK_SIZE = 64 * 1024
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+# Chữ ký đầu file của các định dạng được phép (đuôi file chỉ là gợi ý của client)
+MAGIC_NUMBERS = {
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+}
+CANONICAL_EXTENSIONS = {'jpeg': 'jpg'}
+
+
+class UploadError(ValueError):
+    """File tải lên không hợp lệ; status là mã HTTP trả về"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def is_hashed_name(filename):
+    return bool(HASHED_NAME_RE.match(filename))
+
+
+def sniff_extension(head, allowed):
+    """Đuôi file theo chữ ký đầu file, hoặc None nếu không thuộc danh sách cho phép"""
+    for ext in sorted(allowed):
+        if any(head.startswith(magic) for magic in MAGIC_NUMBERS.get(ext, ())):
+            return CANONICAL_EXTENSIONS.get(ext, ext)
+    return None
+
+
+def store_stream(stream, directory, allowed_extensions, max_bytes):
+    """Ghi stream vào directory theo hash nội dung.
+
+    Trả về (tên file, số byte, đã_tồn_tại). Ném UploadError nếu file rỗng,
+    quá lớn hoặc không phải định dạng ảnh cho phép.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    tmp_path = os.path.join(directory, f'.upload-{uuid.uuid4().hex}.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = sniff_extension(chunk, allowed_extensions)
+                    if ext is None:
+                        raise UploadError('Định dạng ảnh không được hỗ trợ!', 415)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError('File quá lớn!', 413)
+                digest.update(chunk)
+                f.write(chunk)
+
+        if size == 0:
+            raise UploadError('File rỗng!')
+
+        filename = f'{digest.hexdigest()}.{ext}'
+        final_path = os.path.join(directory, filename)
+        if os.path.exists(final_path):
+            return filename, size, True
+        os.replace(tmp_path, final_path)
+        return filename, size, False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
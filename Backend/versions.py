@@ -0,0 +1,44 @@
+# Phiên bản dữ liệu danh mục dùng chung cho mọi worker, lưu trong bảng
+# CatalogVersions(namespace, version) (mỗi namespace một dòng, tạo sẵn bởi ensure_schema).
+# - Route ghi tăng version trong cùng transaction với thay đổi; sách vừa đổi được gắn
+#   Books.change_seq = version mới
+# - Dòng version bị khóa tới khi commit nên các transaction ghi commit đúng theo thứ tự
+#   version: worker đã áp dụng tới V chỉ cần đọc các sách có change_seq > V để theo kịp
+#   thay đổi do worker khác ghi
+# Đánh giá dùng dòng 'reviews' riêng (Reviews.change_seq) để không tranh khóa với dòng
+# 'books' và chỉ làm cũ cache của đúng sách được đánh giá.
+# Dòng 'sales' và 'co_purchase' chỉ dùng làm khóa cho việc tính lại SalesDaily
+# (analytics.py) và gộp hàng đợi đồng mua (recommend.py); dòng 'sales_rollup' giữ
+# ngày (date.toordinal()) của lần tính lại SalesDaily gần nhất.
+
+NAMESPACES = ('books', 'categories', 'reviews', 'sales', 'sales_rollup', 'co_purchase')
+
+
+def current(cursor, namespace):
+    cursor.execute("SELECT version FROM CatalogVersions WHERE namespace = ?", (namespace,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def bump(cursor, namespace):
+    """Tăng version của namespace và trả về giá trị mới; caller commit"""
+    cursor.execute("UPDATE CatalogVersions SET version = version + 1 WHERE namespace = ?", (namespace,))
+    return current(cursor, namespace)
+
+
+def store(cursor, namespace, value):
+    """Ghi đè giá trị của namespace (tạo dòng nếu chưa có); caller commit"""
+    cursor.execute("UPDATE CatalogVersions SET version = ? WHERE namespace = ?", (value, namespace))
+    if cursor.rowcount == 0:
+        cursor.execute("INSERT INTO CatalogVersions (namespace, version) VALUES (?, ?)", (namespace, value))
+
+
+def mark_books(cursor, book_ids, chunk_size=500):
+    """Tăng version 'books' và gắn nó vào các sách đã đổi; caller commit"""
+    version = bump(cursor, 'books')
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), chunk_size):
+        chunk = book_ids[start:start + chunk_size]
+        cursor.execute(f"UPDATE Books SET change_seq = ? WHERE book_id IN ({', '.join('?' * len(chunk))})",
+                       [version] + chunk)
+    return version
@@ -1,4 +1,7 @@
 const API_BASE = 'http://localhost:5000/api'; // Backend API base
+const ADMIN_PAGE_SIZE = 50;
+let adminBooksCursor = null;
+let adminOrdersCursor = null;
 
 // ======================= HÀM TIỆN ÍCH CHUNG =======================
 
@@ -27,7 +30,7 @@ function formatPrice(price) {
 
 function resolveBookImage(url){
     if (!url || url.startsWith('http://') || url.startsWith('https://')) return url || '../assets/images/book1.jpg';
-    return `${API_BASE}/uploads/${url.trim()}`; 
+    return `${API_BASE}/uploads/${url.trim()}?size=admin&format=auto`; 
 }
 
 function getOrderStatusName(status) {
@@ -61,6 +64,22 @@ document.addEventListener('DOMContentLoaded', () => {
     
     loadDashboard(); 
     
+    const reportFilters = document.getElementById('reportFilters');
+    if (reportFilters) {
+        reportFilters.addEventListener('submit', function(e) {
+            e.preventDefault();
+            loadReportsAdmin();
+        });
+    }
+    
+    const orderFilters = document.getElementById('orderFilters');
+    if (orderFilters) {
+        orderFilters.addEventListener('submit', function(e) {
+            e.preventDefault();
+            loadOrdersAdmin();
+        });
+    }
+    
     // Đăng ký event listener cho form tạo thể loại
     const createCategoryForm = document.getElementById('createCategoryForm');
     if (createCategoryForm) {
@@ -92,6 +111,7 @@ function setupNav(){
         if(view === 'users') loadUsersAdmin();
         if(view === 'orders') loadOrdersAdmin();
         if(view === 'categories') loadCategoriesAdmin(); 
+        if(view === 'reports') loadReportsAdmin();
     }))
 }
 
@@ -190,6 +210,7 @@ async function loadDashboard(){
         
         if(statsRes.ok){
             document.getElementById('stat-users').textContent = statsData.users || 0;
+            document.getElementById('stat-books').textContent = statsData.books || 0;
             document.getElementById('stat-orders').textContent = statsData.orders || 0;
             document.getElementById('stat-revenue').textContent = formatPrice(statsData.revenue);
         } else {
@@ -205,11 +226,9 @@ async function loadDashboard(){
     
     // Tải sách chờ duyệt
     try {
-        const booksRes = await fetch(`${API_BASE}/books`);
+        const booksRes = await fetch(`${API_BASE}/books?limit=4`);
         if (booksRes.ok){
             const booksData = await booksRes.json();
-            const count = Array.isArray(booksData.books) ? booksData.books.length : 0;
-            document.getElementById('stat-books').textContent = count;
             
             const pending = (booksData.books || []).filter(b => b.status === 'pending' || b.status === 'waiting' || b.status === 'chờ duyệt');
             renderPendingBooks(pending.length ? pending : (booksData.books || []).slice(0,4));
@@ -251,17 +270,23 @@ function renderPendingBooks(list){
     })
 }
 
-async function loadBooksAdmin(){
+async function loadBooksAdmin(append = false){
     const el = document.getElementById('books-table');
-    el.innerHTML = 'Đang tải...';
+    if(!append){ el.innerHTML = 'Đang tải...'; adminBooksCursor = null; }
     try{
-        const res = await fetch(`${API_BASE}/books`);
+        let url = `${API_BASE}/books?limit=${ADMIN_PAGE_SIZE}`;
+        if(append && adminBooksCursor) url += `&cursor=${encodeURIComponent(adminBooksCursor)}`;
+        const res = await fetch(url);
         if(!res.ok) { el.innerHTML = '<div class="notice">Không thể lấy danh sách sách từ API.</div>'; return; }
         const data = await res.json();
         const books = data.books || [];
-        if(books.length === 0) { el.innerHTML = '<div class="notice">Không có sách.</div>'; return; }
-        const head = document.createElement('div'); head.className='table-head'; head.innerHTML = '<div style="width:140px">Ảnh</div><div>Thông tin</div><div style="width:220px">Hành động</div>';
-        el.innerHTML=''; el.appendChild(head);
+        adminBooksCursor = data.next_cursor || null;
+        const oldMore = document.getElementById('books-load-more'); if(oldMore) oldMore.remove();
+        if(books.length === 0 && !append) { el.innerHTML = '<div class="notice">Không có sách.</div>'; return; }
+        if(!append){
+            const head = document.createElement('div'); head.className='table-head'; head.innerHTML = '<div style="width:140px">Ảnh</div><div>Thông tin</div><div style="width:220px">Hành động</div>';
+            el.innerHTML=''; el.appendChild(head);
+        }
         books.forEach(b=>{
             const row = document.createElement('div'); row.className='book-row';
             const img = document.createElement('img'); img.src = resolveBookImage(b.image_url); img.onerror = function(){ this.src=resolveBookImage('') };
@@ -273,6 +298,11 @@ async function loadBooksAdmin(){
             row.appendChild(img); row.appendChild(meta); row.appendChild(actions);
             el.appendChild(row);
         })
+        if(adminBooksCursor){
+            const more = document.createElement('button'); more.id='books-load-more'; more.className='btn secondary'; more.textContent='Xem thêm';
+            more.onclick = ()=>loadBooksAdmin(true);
+            el.appendChild(more);
+        }
     }catch(e){ el.innerHTML = '<div class="notice">Lỗi khi gọi API sách: '+e.message+'</div>' }
 }
 
@@ -307,17 +337,51 @@ async function loadUsersAdmin(){
     }catch(e){ el.innerHTML = '<div class="notice">Lỗi khi gọi API người dùng: '+e.message+'</div>' }
 }
 
-async function loadOrdersAdmin(){
+// Bộ lọc đơn hàng gửi lên server (query string, bỏ ô trống)
+function orderFilterQuery(){
+    const params = new URLSearchParams();
+    const form = document.getElementById('orderFilters');
+    if(form){
+        new FormData(form).forEach((value, name)=>{ if(String(value).trim() !== '') params.append(name, String(value).trim()); });
+    }
+    return params;
+}
+
+function renderOrdersSummary(summary){
+    const el = document.getElementById('orders-summary');
+    if(!el || !summary) return;
+    const current = orderFilterQuery().get('status') || '';
+    const chip = (status, label, count, amount)=>`<div class="summary-chip${status === current ? ' active' : ''}" data-status="${status}">${label}: <strong>${count}</strong> · ${formatPrice(amount)}</div>`;
+    let total = 0;
+    Object.values(summary.by_status).forEach(s=>{ total += s.amount; });
+    el.innerHTML = chip('', 'Tất cả', summary.count, total)
+        + Object.entries(summary.by_status).map(([status, s])=>chip(status, getOrderStatusName(status), s.count, s.amount)).join('')
+        + `<div class="summary-chip">Doanh thu: <strong>${formatPrice(summary.revenue)}</strong></div>`;
+    el.querySelectorAll('.summary-chip[data-status]').forEach(c=>c.onclick = ()=>{
+        document.querySelector('#orderFilters [name=status]').value = c.dataset.status;
+        loadOrdersAdmin();
+    });
+}
+
+async function loadOrdersAdmin(append = false){
     const el = document.getElementById('orders-table');
-    el.innerHTML = 'Đang tải...';
+    if(!append){ el.innerHTML = 'Đang tải...'; adminOrdersCursor = null; }
     try{
-        const res = await fetch(`${API_BASE}/admin/orders`, { headers: { 'Authorization':'Bearer '+localStorage.getItem('token') } });
+        const params = orderFilterQuery();
+        params.set('limit', ADMIN_PAGE_SIZE);
+        if(append && adminOrdersCursor) params.set('cursor', adminOrdersCursor);
+        const res = await fetch(`${API_BASE}/admin/orders?${params}`, { headers: { 'Authorization':'Bearer '+localStorage.getItem('token') } });
         if(!res.ok){ el.innerHTML = `<div class="notice">Không thể lấy danh sách đơn hàng từ API. Mã: ${res.status}</div>`; return; }
         const data = await res.json();
         const orders = data.orders || [];
-        if(orders.length === 0){ el.innerHTML = '<div class="notice">Không có đơn hàng.</div>'; return; }
-        const head = document.createElement('div'); head.className='table-head'; head.innerHTML = '<div>Order ID</div><div>Thông tin</div><div style="width:100px">Trạng thái</div><div style="width:150px">Hành động</div>'; 
-        el.innerHTML = ''; el.appendChild(head);
+        adminOrdersCursor = data.next_cursor || null;
+        if(!append) renderOrdersSummary(data.summary);
+        const oldMore = document.getElementById('orders-load-more'); if(oldMore) oldMore.remove();
+        if(orders.length === 0 && !append){ el.innerHTML = '<div class="notice">Không có đơn hàng.</div>'; return; }
+        if(!append){
+            const head = document.createElement('div'); head.className='table-head'; head.innerHTML = '<div>Order ID</div><div>Thông tin</div><div style="width:100px">Trạng thái</div><div style="width:150px">Hành động</div>'; 
+            el.innerHTML = ''; el.appendChild(head);
+        }
         
         orders.forEach(o=>{
             const row = document.createElement('div'); row.className='order-row';
@@ -344,9 +408,16 @@ async function loadOrdersAdmin(){
             row.appendChild(actions); 
             el.appendChild(row);
         })
+        
+        if(adminOrdersCursor){
+            const more = document.createElement('button'); more.id='orders-load-more'; more.className='btn secondary'; more.textContent='Xem thêm';
+            more.onclick = ()=>loadOrdersAdmin(true);
+            el.appendChild(more);
+        }
     }catch(e){ el.innerHTML = '<div class="notice">Lỗi khi gọi API đơn hàng: '+e.message+'</div>' }
 }
 
+
 async function approveBook(bookId){
     const token = localStorage.getItem('token');
     if(!confirm('Bạn có chắc muốn duyệt sách này?')) return;
@@ -385,4 +456,33 @@ async function hideBook(bookId){
     }catch(e){ 
         showNotification('Không thể gọi endpoint ẩn sách.', 'error'); 
     }
-}
\ No newline at end of file
+}
+
+// ======================= BÁO CÁO DOANH SỐ =======================
+
+async function loadReportsAdmin(){
+    const el = document.getElementById('reports-area');
+    el.innerHTML = 'Đang tải...';
+    try{
+        const params = new URLSearchParams();
+        new FormData(document.getElementById('reportFilters')).forEach((value, name)=>{ if(String(value).trim() !== '') params.append(name, String(value).trim()); });
+        const res = await fetch(`${API_BASE}/admin/analytics?${params}`, { headers: { 'Authorization':'Bearer '+localStorage.getItem('token') } });
+        const data = await res.json();
+        if(!res.ok){ el.innerHTML = `<div class="notice">${data.message || 'Không thể lấy báo cáo. Mã: ' + res.status}</div>`; return; }
+        
+        const maxRevenue = Math.max(1, ...data.series.map(p=>p.revenue));
+        let html = `<h3>Doanh số ${data.date_from} → ${data.date_to}</h3>
+            <p>Tổng: <strong>${data.totals.orders}</strong> đơn · <strong>${data.totals.units}</strong> cuốn · <strong>${formatPrice(data.totals.revenue)}</strong></p>
+            <table class="report-table"><tr><th>Kỳ</th><th>Đơn</th><th>Số cuốn</th><th>Doanh thu</th><th></th></tr>`;
+        html += data.series.map(p=>`<tr><td>${p.period}</td><td>${p.orders}</td><td>${p.units}</td><td>${formatPrice(p.revenue)}</td>
+            <td style="width:30%"><span class="report-bar" style="width:${(p.revenue * 100 / maxRevenue).toFixed(1)}%"></span></td></tr>`).join('');
+        html += '</table>';
+        
+        if(data.top){
+            html += `<h3>Doanh thu cao nhất</h3><table class="report-table"><tr><th>Tên</th><th>Đơn</th><th>Số cuốn</th><th>Doanh thu</th></tr>`;
+            html += data.top.map(t=>`<tr><td>${t.name || ('#' + t.id)}</td><td>${t.orders}</td><td>${t.units}</td><td>${formatPrice(t.revenue)}</td></tr>`).join('');
+            html += '</table>';
+        }
+        el.innerHTML = html;
+    }catch(e){ el.innerHTML = '<div class="notice">Lỗi khi gọi API báo cáo: '+e.message+'</div>' }
+}
@@ -3,6 +3,9 @@ const API_BASE_URL = 'http://localhost:5000/api';
 
 // Global variables
 let books = [];
+let nextBooksCursor = null;
+let bookFacets = null; // số sách theo thể loại/tình trạng cho bộ lọc hiện tại
+const BOOKS_PAGE_SIZE = 24;
 let cart = [];
 let currentCategory = 'all';
 let currentUser = null;
@@ -11,17 +14,20 @@ let currentFilters = {
     minPrice: null,
     maxPrice: null,
     condition: null,
+    search: '',
     sortBy: 'created_at'
 };
 
 // ==================== UTILITY FUNCTIONS ====================
 
-function getAbsoluteImageUrl(imageUrl) {
+// size: 'grid' | 'detail' - server trả về bản thu nhỏ (WebP nếu trình duyệt hỗ trợ)
+function getAbsoluteImageUrl(imageUrl, size) {
     if (imageUrl && (imageUrl.startsWith('http') || imageUrl.startsWith('assets/'))) {
         return imageUrl;
     }
     if (imageUrl) {
-        return `${API_BASE_URL}/uploads/${imageUrl}`;
+        const query = size ? `?size=${size}&format=auto` : '';
+        return `${API_BASE_URL}/uploads/${imageUrl}${query}`;
     }
     return 'assets/images/book1.jpg'; 
 }
@@ -209,7 +215,19 @@ async function handleRegister(event) {
     }
 }
 
-function logout() {
+async function logout() {
+    // Thu hồi token phía server để nó không dùng lại được sau khi đăng xuất
+    const token = localStorage.getItem('token');
+    if (token) {
+        try {
+            await fetch(`${API_BASE_URL}/auth/logout`, {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${token}` }
+            });
+        } catch (error) {
+            console.error('Logout error:', error);
+        }
+    }
     localStorage.removeItem('token');
     localStorage.removeItem('user');
     currentUser = null;
@@ -278,16 +296,58 @@ function renderCategoryButtons(categories) {
     
     // Luôn thêm nút "Tất cả"
     categoriesContainer.innerHTML = `
-        <button class="category-btn active" onclick="filterCategory('all', event)">Tất cả</button>
+        <button class="category-btn active" data-category="all" onclick="filterCategory('all', event)">Tất cả</button>
     `;
     
     categories.forEach(cat => {
         const btn = document.createElement('button');
         btn.className = 'category-btn';
         btn.textContent = cat.name;
+        btn.dataset.category = cat.name;
         btn.onclick = (event) => filterCategory(cat.name, event);
         categoriesContainer.appendChild(btn);
     });
+    updateFacetCounts();
+}
+
+// ==================== FACETS ====================
+
+async function loadFacets() {
+    try {
+        const response = await fetch(`${API_BASE_URL}/books/facets?${buildBookFilterQuery()}`);
+        if (!response.ok) return;
+        bookFacets = await response.json();
+        updateFacetCounts();
+    } catch (error) {
+        console.error('Error loading facets:', error);
+    }
+}
+
+function updateFacetCounts() {
+    if (!bookFacets) return;
+    const counts = {};
+    let allCount = 0;
+    bookFacets.facets.category.forEach(facet => {
+        counts[facet.value] = facet.count;
+        allCount += facet.count;
+    });
+    counts.all = allCount;
+    
+    document.querySelectorAll('.category-btn[data-category]').forEach(btn => {
+        let badge = btn.querySelector('.facet-count');
+        if (!badge) {
+            badge = document.createElement('span');
+            badge.className = 'facet-count';
+            btn.appendChild(badge);
+        }
+        badge.textContent = ` (${counts[btn.dataset.category] || 0})`;
+    });
+}
+
+function conditionFacetCount(condition) {
+    if (!bookFacets) return '';
+    const facet = bookFacets.facets.condition.find(f => f.value === condition);
+    return ` (${facet ? facet.count : 0})`;
 }
 
 function filterCategory(category, event) {
@@ -309,29 +369,50 @@ function filterCategory(category, event) {
 
 // ==================== BOOKS (SỬA LỖI LỌC & HIỂN THỊ ẢNH MẪU) ====================
 
-async function loadBooks() {
+// Query string bộ lọc dùng chung cho /books và /books/facets (kết thúc bằng '&')
+function buildBookFilterQuery() {
+    let query = '';
+    if (currentFilters.category !== 'all') {
+        query += `category=${encodeURIComponent(currentFilters.category)}&`;
+    }
+    if (currentFilters.minPrice) {
+        query += `min_price=${currentFilters.minPrice}&`;
+    }
+    if (currentFilters.maxPrice) {
+        query += `max_price=${currentFilters.maxPrice}&`;
+    }
+    if (currentFilters.condition) {
+        query += `condition=${currentFilters.condition}&`;
+    }
+    if (currentFilters.search) {
+        query += `search=${encodeURIComponent(currentFilters.search)}&`;
+    }
+    return query;
+}
+
+async function loadBooks(append = false) {
     try {
-        let url = `${API_BASE_URL}/books?`;
-        
-        if (currentFilters.category !== 'all') {
-            url += `category=${encodeURIComponent(currentFilters.category)}&`;
-        }
-        if (currentFilters.minPrice) {
-            url += `min_price=${currentFilters.minPrice}&`;
-        }
-        if (currentFilters.maxPrice) {
-            url += `max_price=${currentFilters.maxPrice}&`;
-        }
-        if (currentFilters.condition) {
-            url += `condition=${currentFilters.condition}&`;
+        let url = `${API_BASE_URL}/books?limit=${BOOKS_PAGE_SIZE}&`;
+        if (append && nextBooksCursor) {
+            url += `cursor=${encodeURIComponent(nextBooksCursor)}&`;
+        } else {
+            loadFacets();
         }
-        url += `sort_by=${currentFilters.sortBy}`;
+        url += buildBookFilterQuery();
+        // Khi tìm kiếm mà chưa chọn cách sắp xếp khác thì xếp theo độ liên quan
+        const sortBy = currentFilters.search && currentFilters.sortBy === 'created_at' ? 'relevance' : currentFilters.sortBy;
+        url += `sort_by=${sortBy}`;
         
         const response = await fetch(url);
         const data = await response.json();
         
         if (response.ok) {
-            if (Array.isArray(data.books) && data.books.length > 0) {
+            nextBooksCursor = data.next_cursor || null;
+            updateLoadMoreButton();
+            if (append && Array.isArray(data.books)) {
+                books = books.concat(data.books);
+                displayBooks(data.books, true);
+            } else if (Array.isArray(data.books) && data.books.length > 0) {
                 books = data.books;
                 displayBooks(books);
             } else {
@@ -355,13 +436,34 @@ async function loadBooks() {
     }
 }
 
-function displayBooks(booksToShow) {
+function updateLoadMoreButton() {
+    const bookGrid = document.getElementById('bookGrid');
+    if (!bookGrid) return;
+
+    let loadMoreBtn = document.getElementById('loadMoreBooks');
+    if (!loadMoreBtn) {
+        loadMoreBtn = document.createElement('button');
+        loadMoreBtn.id = 'loadMoreBooks';
+        loadMoreBtn.className = 'form-btn';
+        loadMoreBtn.style.maxWidth = '300px';
+        loadMoreBtn.style.margin = '20px auto';
+        loadMoreBtn.style.display = 'none';
+        loadMoreBtn.textContent = 'Xem thêm';
+        loadMoreBtn.onclick = () => loadBooks(true);
+        bookGrid.insertAdjacentElement('afterend', loadMoreBtn);
+    }
+    loadMoreBtn.style.display = nextBooksCursor ? 'block' : 'none';
+}
+
+function displayBooks(booksToShow, append = false) {
     const bookGrid = document.getElementById('bookGrid');
     if (!bookGrid) return;
     
-    bookGrid.innerHTML = '';
+    if (!append) {
+        bookGrid.innerHTML = '';
+    }
 
-    if (booksToShow.length === 0) {
+    if (booksToShow.length === 0 && !append) {
         bookGrid.innerHTML = '<p style="grid-column: 1/-1; text-align: center; padding: 50px; color: #7f8c8d;">Không tìm thấy sách nào!</p>';
         return;
     }
@@ -371,7 +473,7 @@ function displayBooks(booksToShow) {
         bookCard.className = 'book-card';
         bookCard.onclick = () => viewBookDetail(book.id);
         
-        const finalImgSrc = getAbsoluteImageUrl(book.image_url);
+        const finalImgSrc = getAbsoluteImageUrl(book.image_url, 'grid');
         const conditionBadge = book.condition === 'used' ? '<span class="condition-badge">Cũ</span>' : '<span class="condition-badge new">Mới</span>';
         
         bookCard.innerHTML = `
@@ -426,20 +528,15 @@ function showBookDetailModal(book) {
     modal.className = 'modal';
     modal.style.display = 'flex';
     
-    const reviewsHTML = book.reviews && book.reviews.length > 0 
-        ? book.reviews.map(review => `
-            <div class="review-item">
-                <div class="review-header">
-                    <strong>${review.user_name}</strong>
-                    <span class="review-rating">⭐ ${review.rating}/5</span>
-                </div>
-                <p class="review-comment">${review.comment || 'Không có nhận xét'}</p>
-                <small class="review-date">${new Date(review.created_at).toLocaleDateString('vi-VN')}</small>
-            </div>
-        `).join('')
+    const summary = book.review_summary || { count: 0, histogram: {}, latest: [] };
+    const reviewsHTML = summary.latest.length > 0 
+        ? summary.latest.map(renderReviewItem).join('')
         : '<p style="text-align: center; color: #7f8c8d;">Chưa có đánh giá nào</p>';
+    const moreReviewsButton = summary.count > summary.latest.length
+        ? `<button class="load-more-inline" onclick="loadMoreReviews(${book.id}, this)">Xem tất cả ${summary.count} đánh giá</button>`
+        : '';
     
-    const detailImgSrc = getAbsoluteImageUrl(book.image_url);
+    const detailImgSrc = getAbsoluteImageUrl(book.image_url, 'detail');
 
     modal.innerHTML = `
         <div class="modal-content book-detail-modal">
@@ -461,8 +558,9 @@ function showBookDetailModal(book) {
                     <p class="book-detail-author">Tác giả: ${book.author}</p>
                     <div class="book-detail-rating">
                         <span class="rating-stars">⭐⭐⭐⭐⭐</span>
-                        <span>${book.rating}/5.0 (${book.reviews ? book.reviews.length : 0} đánh giá)</span>
+                        <span>${Number(book.rating).toFixed(1)}/5.0 (${summary.count} đánh giá)</span>
                     </div>
+                    ${renderRatingHistogram(summary)}
                     <div class="book-detail-price">
                         <span class="current-price">${formatPrice(book.price)}</span>
                         ${book.old_price ? `<span class="old-price">${formatPrice(book.old_price)}</span>` : ''}
@@ -498,13 +596,115 @@ function showBookDetailModal(book) {
                         <div class="reviews-list">
                             ${reviewsHTML}
                         </div>
+                        ${moreReviewsButton}
                     </div>
                 </div>
             </div>
+            <div class="related-books" id="alsoBought" style="display: none;"></div>
+            <div class="related-books" id="similarBooks" style="display: none;"></div>
         </div>
     `;
     
     document.body.appendChild(modal);
+    loadRelatedBooks(modal.querySelector('#alsoBought'), `${API_BASE_URL}/books/${book.id}/also-bought`, 'Khách hàng cũng mua');
+    loadRelatedBooks(modal.querySelector('#similarBooks'), `${API_BASE_URL}/books/${book.id}/similar`, 'Sách tương tự');
+}
+
+// Danh sách sách liên quan dưới chi tiết sách, tải sau khi modal đã hiện;
+// không có kết quả hoặc lỗi thì giữ ẩn
+async function loadRelatedBooks(container, url, title) {
+    try {
+        const response = await fetch(url);
+        if (!response.ok) return;
+        const data = await response.json();
+        if (!data.books || data.books.length === 0) return;
+        
+        container.innerHTML = `
+            <h3>${title}</h3>
+            <div class="related-books-list">
+                ${data.books.map(book => `
+                    <div class="related-book" onclick="this.closest('.modal').remove(); viewBookDetail(${book.id});">
+                        <img src="${getAbsoluteImageUrl(book.image_url, 'admin')}" alt="${book.title}"
+                             onerror="this.src='${getAbsoluteImageUrl('book1.jpg')}'">
+                        <p class="related-book-title">${book.title}</p>
+                        <p class="related-book-price">${formatPrice(book.price)}</p>
+                    </div>
+                `).join('')}
+            </div>
+        `;
+        container.style.display = 'block';
+    } catch (error) {
+        console.error('Error loading related books:', error);
+    }
+}
+
+function renderReviewItem(review) {
+    return `
+        <div class="review-item">
+            <div class="review-header">
+                <strong>${review.user_name}</strong>
+                <span class="review-rating">⭐ ${review.rating}/5</span>
+            </div>
+            <p class="review-comment">${review.comment || 'Không có nhận xét'}</p>
+            <small class="review-date">${new Date(review.created_at).toLocaleDateString('vi-VN')}</small>
+        </div>
+    `;
+}
+
+function renderRatingHistogram(summary) {
+    if (!summary.count) return '';
+    return `
+        <div class="rating-histogram">
+            ${[5, 4, 3, 2, 1].map(star => {
+                const count = summary.histogram[star] || 0;
+                return `
+                    <div class="histogram-row">
+                        <span>${star} ⭐</span>
+                        <div class="histogram-bar"><div style="width: ${(count * 100 / summary.count).toFixed(1)}%"></div></div>
+                        <span>${count}</span>
+                    </div>
+                `;
+            }).join('')}
+        </div>
+    `;
+}
+
+// Phân trang đánh giá: lần bấm đầu tiên thay vài review mới nhất bằng trang đầu,
+// các lần sau nối thêm trang tiếp theo theo next_cursor
+async function loadMoreReviews(bookId, button) {
+    const list = button.parentElement.querySelector('.reviews-list');
+    const cursor = button.dataset.cursor;
+    let url = `${API_BASE_URL}/books/${bookId}/reviews?limit=10`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    
+    button.disabled = true;
+    try {
+        const response = await fetch(url);
+        const data = await response.json();
+        if (!response.ok) {
+            showNotification(data.message || 'Không thể tải đánh giá!', 'error');
+            return;
+        }
+        
+        const html = data.reviews.map(renderReviewItem).join('');
+        if (cursor) {
+            list.insertAdjacentHTML('beforeend', html);
+        } else {
+            list.innerHTML = html;
+        }
+        
+        if (data.next_cursor) {
+            button.dataset.cursor = data.next_cursor;
+            button.textContent = 'Xem thêm đánh giá';
+        } else {
+            button.remove();
+        }
+    } catch (error) {
+        console.error('Error loading reviews:', error);
+        showNotification('Có lỗi xảy ra khi tải đánh giá!', 'error');
+    } finally {
+        button.disabled = false;
+    }
 }
 
 async function submitReview(bookId) {
@@ -544,20 +744,9 @@ async function submitReview(bookId) {
 // ==================== SEARCH & FILTER ====================
 
 function searchBooks() {
-    const searchTerm = document.getElementById('searchInput').value.toLowerCase().trim();
-    
-    if (searchTerm === '') {
-        loadBooks();
-        return;
-    }
-    
-    const filtered = books.filter(book => 
-        book.title.toLowerCase().includes(searchTerm) ||
-        book.author.toLowerCase().includes(searchTerm) ||
-        (book.isbn && book.isbn.toLowerCase().includes(searchTerm))
-    );
-    
-    displayBooks(filtered);
+    // Tìm kiếm trên server (chỉ mục bỏ dấu: "dac nhan tam" khớp "Đắc Nhân Tâm")
+    currentFilters.search = document.getElementById('searchInput').value.trim();
+    loadBooks();
 }
 
 function openAdvancedSearch() {
@@ -581,8 +770,8 @@ function openAdvancedSearch() {
                     <label>Tình trạng</label>
                     <select id="conditionFilter">
                         <option value="">Tất cả</option>
-                        <option value="new">Mới</option>
-                        <option value="used">Cũ</option>
+                        <option value="new">Mới${conditionFacetCount('new')}</option>
+                        <option value="used">Cũ${conditionFacetCount('used')}</option>
                     </select>
                 </div>
                 <div class="form-group">
@@ -621,6 +810,55 @@ function loadCart() {
     if (savedCart) {
         cart = JSON.parse(savedCart);
         updateCartCount();
+        refreshCart();
+    }
+}
+
+// Lấy giá/tồn kho hiện tại của cả giỏ hàng trong một request.
+// Trả về danh sách thông báo thay đổi (rỗng nếu giỏ hàng không đổi).
+async function refreshCart() {
+    if (cart.length === 0) return [];
+    try {
+        const ids = cart.map(item => item.id).join(',');
+        const response = await fetch(`${API_BASE_URL}/books/batch?ids=${ids}`);
+        if (!response.ok) return [];
+        const data = await response.json();
+        
+        const changes = [];
+        const latest = new Map(data.books.map(book => [book.id, book]));
+        cart = cart.filter(item => {
+            const book = latest.get(item.id);
+            if (!book) {
+                changes.push(`"${item.title}" không còn được bán`);
+                return false;
+            }
+            if (book.price !== item.price) {
+                changes.push(`"${item.title}" đổi giá ${formatPrice(item.price)} → ${formatPrice(book.price)}`);
+            }
+            Object.assign(item, book);
+            if (book.stock <= 0) {
+                changes.push(`"${item.title}" đã hết hàng`);
+                return false;
+            }
+            if (item.quantity > book.stock) {
+                changes.push(`"${item.title}" chỉ còn ${book.stock} cuốn`);
+                item.quantity = book.stock;
+            }
+            return true;
+        });
+        
+        saveCart();
+        updateCartCount();
+        return changes;
+    } catch (error) {
+        console.error('Error refreshing cart:', error);
+        return [];
+    }
+}
+
+function notifyCartChanges(changes) {
+    if (changes.length > 0) {
+        showNotification('Giỏ hàng đã được cập nhật: ' + changes.join('; '), 'info');
     }
 }
 
@@ -656,13 +894,18 @@ function removeFromCart(bookId) {
     cart = cart.filter(item => item.id !== bookId);
     updateCartCount();
     saveCart();
-    viewCart();
+    viewCart(false);
 }
 
 function updateQuantity(bookId, change) {
     const item = cart.find(item => item.id === bookId);
     if (!item) return;
 
+    if (change > 0 && item.stock !== undefined && item.quantity + change > item.stock) {
+        showNotification(`Chỉ còn ${item.stock} cuốn "${item.title}"!`, 'error');
+        return;
+    }
+
     item.quantity += change;
     
     if (item.quantity <= 0) {
@@ -670,7 +913,7 @@ function updateQuantity(bookId, change) {
     } else {
         updateCartCount();
         saveCart();
-        viewCart();
+        viewCart(false);
     }
 }
 
@@ -682,7 +925,11 @@ function updateCartCount() {
     }
 }
 
-function viewCart() {
+async function viewCart(refresh = true) {
+    if (refresh) {
+        notifyCartChanges(await refreshCart());
+    }
+
     if (cart.length === 0) {
         showNotification('Giỏ hàng của bạn đang trống!', 'info');
         return;
@@ -748,12 +995,15 @@ function buyNow(bookId) {
 
 // ==================== CHECKOUT ====================
 
-function checkout() {
+async function checkout() {
     if (!currentUser) {
         showNotification('Vui lòng đăng nhập để thanh toán!', 'error');
         return;
     }
 
+    // Kiểm tra lại giá/tồn kho trước khi hiện form đặt hàng
+    notifyCartChanges(await refreshCart());
+
     if (cart.length === 0) {
         showNotification('Giỏ hàng trống!', 'error');
         return;
@@ -866,6 +1116,14 @@ async function handleCheckout(event) {
                 showOrderConfirmation(data.order_id, orderData);
             }, 500);
         } else {
+            // Server trả về giá hiện tại nếu giá trong giỏ đã cũ: cập nhật lại giỏ hàng
+            if (Array.isArray(data.price_changed)) {
+                data.price_changed.forEach(change => {
+                    const item = cart.find(i => i.id === change.book_id);
+                    if (item) item.price = change.price;
+                });
+                saveCart();
+            }
             showNotification(data.message || 'Đặt hàng thất bại!', 'error');
         }
     } catch (error) {
@@ -915,6 +1173,20 @@ function getPaymentMethodName(method) {
 
 // ==================== VIEW ORDERS ====================
 
+// Một trang đơn hàng kèm chi tiết (include=items: server trả về trong một truy vấn)
+async function fetchOrdersPage(cursor) {
+    let url = `${API_BASE_URL}/orders/user?include=items&limit=10`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    const response = await fetch(url, {
+        headers: {
+            'Authorization': `Bearer ${localStorage.getItem('token')}`
+        }
+    });
+    const data = await response.json();
+    if (!response.ok) throw new Error(data.message || 'Không thể tải đơn hàng!');
+    return data;
+}
+
 async function viewOrders() {
     if (!currentUser) {
         showNotification('Vui lòng đăng nhập!', 'error');
@@ -922,45 +1194,65 @@ async function viewOrders() {
     }
     
     try {
-        const response = await fetch(`${API_BASE_URL}/orders/user`, {
-            headers: {
-                'Authorization': `Bearer ${localStorage.getItem('token')}`
-            }
-        });
-        
-        const data = await response.json();
-        
-        if (response.ok) {
-            showOrdersModal(data.orders);
+        const data = await fetchOrdersPage(null);
+        showOrdersModal(data.orders, data.next_cursor);
+    } catch (error) {
+        console.error('View orders error:', error);
+        showNotification(error.message || 'Có lỗi xảy ra!', 'error');
+    }
+}
+
+async function loadMoreOrders(button) {
+    button.disabled = true;
+    try {
+        const data = await fetchOrdersPage(button.dataset.cursor);
+        button.parentElement.querySelector('.orders-list')
+            .insertAdjacentHTML('beforeend', data.orders.map(renderOrderCard).join(''));
+        if (data.next_cursor) {
+            button.dataset.cursor = data.next_cursor;
         } else {
-            showNotification(data.message || 'Không thể tải đơn hàng!', 'error');
+            button.remove();
         }
     } catch (error) {
-        console.error('View orders error:', error);
-        showNotification('Có lỗi xảy ra!', 'error');
+        console.error('Load more orders error:', error);
+        showNotification(error.message || 'Có lỗi xảy ra!', 'error');
+    } finally {
+        button.disabled = false;
     }
 }
 
-function showOrdersModal(orders) {
+function renderOrderCard(order) {
+    const itemsHTML = (order.items || []).map(item => `
+        <div class="order-item">
+            <span>${item.title || 'Sách #' + item.book_id} x ${item.quantity}</span>
+            <span>${formatPrice(item.price * item.quantity)}</span>
+        </div>
+    `).join('');
+    
+    return `
+        <div class="order-card">
+            <div class="order-header">
+                <h3>Đơn hàng #${order.order_id}</h3>
+                <span class="order-status status-${order.status}">${getOrderStatusName(order.status)}</span>
+            </div>
+            <div class="order-info">
+                <p><strong>Tổng tiền:</strong> ${formatPrice(order.total_amount)}</p>
+                <p><strong>Phương thức:</strong> ${getPaymentMethodName(order.payment_method)}</p>
+                <p><strong>Ngày đặt:</strong> ${new Date(order.created_at).toLocaleString('vi-VN')}</p>
+                <p><strong>Địa chỉ:</strong> ${order.shipping_address}</p>
+            </div>
+            ${itemsHTML ? `<div class="order-items">${itemsHTML}</div>` : ''}
+        </div>
+    `;
+}
+
+function showOrdersModal(orders, nextCursor) {
     const modal = document.createElement('div');
     modal.className = 'modal';
     modal.style.display = 'flex';
     
     const ordersHTML = orders.length > 0 
-        ? orders.map(order => `
-            <div class="order-card">
-                <div class="order-header">
-                    <h3>Đơn hàng #${order.order_id}</h3>
-                    <span class="order-status status-${order.status}">${getOrderStatusName(order.status)}</span>
-                </div>
-                <div class="order-info">
-                    <p><strong>Tổng tiền:</strong> ${formatPrice(order.total_amount)}</p>
-                    <p><strong>Phương thức:</strong> ${getPaymentMethodName(order.payment_method)}</p>
-                    <p><strong>Ngày đặt:</strong> ${new Date(order.created_at).toLocaleString('vi-VN')}</p>
-                    <p><strong>Địa chỉ:</strong> ${order.shipping_address}</p>
-                </div>
-            </div>
-        `).join('')
+        ? orders.map(renderOrderCard).join('')
         : '<p style="text-align: center; color: #7f8c8d; padding: 40px;">Bạn chưa có đơn hàng nào</p>';
     
     modal.innerHTML = `
@@ -970,6 +1262,7 @@ function showOrdersModal(orders) {
             <div class="orders-list">
                 ${ordersHTML}
             </div>
+            ${nextCursor ? `<button class="load-more-inline" data-cursor="${nextCursor}" onclick="loadMoreOrders(this)">Xem thêm đơn hàng</button>` : ''}
         </div>
     `;
     